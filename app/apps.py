@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search(sender, using, **kwargs):
+    from django.db import connections
+
+    from app.search import install_machine_search
+    install_machine_search(connections[using])
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        post_migrate.connect(install_search, sender=self)
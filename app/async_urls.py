@@ -0,0 +1,13 @@
+from django.urls import path
+
+from app.async_views import (AsyncConnections, AsyncMachineDetailView,
+                             AsyncMachinesView, AsyncResiduesView)
+
+# Read-heavy endpoints served by async views on the ASGI entry point. They
+# take precedence over the same paths in app.urls; see project.asgi_urls.
+urlpatterns = [
+    path('machines/', AsyncMachinesView.as_view(), name='machines'),
+    path('machines/<int:pk>', AsyncMachineDetailView.as_view(), name='machine'),
+    path('residues/', AsyncResiduesView.as_view(), name='residues'),
+    path('connections/', AsyncConnections.as_view(), name='connections'),
+]
@@ -0,0 +1,145 @@
+import asyncio
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.views import View
+from rest_framework.response import Response
+
+from app.conditional import etag_matches, not_modified
+from app.models import Connection, User
+from app.serializers import UserSerializer
+from app.views import Connections, MachineDetailView, MachinesView, ResiduesView
+
+
+async def in_thread(request, func, *args, **kwargs):
+    """
+    Run blocking ORM code from an async view in a worker thread.
+
+    Django 3.2 runs every sync view and `sync_to_async` call on one shared
+    thread-sensitive thread, so under ASGI all requests queue behind each
+    other. Calls made here use the default executor instead and run in
+    parallel, both across requests and within one request under
+    asyncio.gather. Queries are recorded for QueryInstrumentationMiddleware
+    and the thread's connections are closed or kept per CONN_MAX_AGE, as at
+    the end of a request.
+    """
+    recorder = getattr(request, 'query_recorder', None)
+
+    def run():
+        try:
+            with ExitStack() as stack:
+                if recorder is not None:
+                    recorder.install(stack)
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+def connection_peers(user, source, roles):
+    """Ids of the users `user` is connected to through orders of one source, in any of `roles`."""
+    return list(Connection.objects.filter(user=user, source=source, role__in=roles).values_list('peer', flat=True))
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of the DRF view in `view_class`, served by the ASGI
+    entry point. GET and HEAD requests go to the async `get`, which receives
+    the DRF view after its authentication, permission and throttle checks
+    and awaits each of its ORM steps through in_thread. Exceptions and
+    rendering are handled by the DRF view, so responses are the same as
+    under WSGI. Other methods run the DRF view whole in one in_thread call.
+    """
+    view_class = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.sync_view = staticmethod(cls.view_class.as_view())
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Django 3.2 only awaits views that look like coroutine functions.
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        # The DRF view does its own CSRF checks for session authentication.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            def respond():
+                return self.sync_view(request, *args, **kwargs).render()
+            return await in_thread(request, respond)
+
+        view = self.view_class()
+        view.args, view.kwargs = args, kwargs
+        drf_request = view.initialize_request(request, *args, **kwargs)
+        view.request = drf_request
+        view.headers = view.default_response_headers
+        try:
+            await in_thread(request, view.initial, drf_request, *args, **kwargs)
+            response = await self.get(view, drf_request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        response = view.finalize_response(drf_request, response, *args, **kwargs)
+        return await in_thread(request, response.render)
+
+    async def get(self, view, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def conditional_list(self, view, request):
+        """ConditionalGetMixin.list with the page and its rendering awaited, and 304s answered on the loop."""
+        objects, paginated, etag = await in_thread(request, view.load_list)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return await in_thread(request, view.render_list, objects, paginated, etag)
+
+
+class AsyncMachinesView(AsyncAPIView):
+    view_class = MachinesView
+    query_budgets = MachinesView.query_budgets
+
+    async def get(self, view, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            # The shared catalog cache, which builds a missing page at most once
+            return await in_thread(request, view.list, request, *args, **kwargs)
+        return await self.conditional_list(view, request)
+
+
+class AsyncMachineDetailView(AsyncAPIView):
+    view_class = MachineDetailView
+
+    async def get(self, view, request, *args, **kwargs):
+        return await in_thread(request, view.retrieve, request, *args, **kwargs)
+
+
+class AsyncResiduesView(AsyncAPIView):
+    view_class = ResiduesView
+    query_budgets = ResiduesView.query_budgets
+
+    async def get(self, view, request, *args, **kwargs):
+        return await self.conditional_list(view, request)
+
+
+class AsyncConnections(AsyncAPIView):
+    view_class = Connections
+    # Authentication, the order, rent order and residue order edges read
+    # concurrently, and the peers
+    query_budgets = {'GET': 5}
+
+    async def get(self, view, request, *args, **kwargs):
+        user = request.user
+        edges = Connection.INDUSTRY_EDGES if user.is_industry else Connection.FARMER_EDGES
+        roles = defaultdict(list)
+        for source, role in edges:
+            roles[source].append(role)
+
+        peer_ids = await asyncio.gather(*(
+            in_thread(request, connection_peers, user, source, source_roles)
+            for source, source_roles in roles.items()))
+
+        peers = await in_thread(request, list, User.objects.filter(pk__in=set().union(*peer_ids)))
+        return Response(UserSerializer(peers, many=True).data)
@@ -0,0 +1,114 @@
+import copy
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication)
+
+from app.replicas import authenticated, primary
+
+
+def _option(name, default):
+    return getattr(settings, 'AUTH_CACHE', {}).get(name, default)
+
+
+class AuthCache:
+    """
+    Thread-safe in-process LRU of successful authentications with a TTL.
+    Entries are indexed by user so every credential of a user can be dropped
+    at once. Other processes only see an invalidation once the TTL expires.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, _, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, user_id, value):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + _option('TTL', 60), user_id, value)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > _option('MAX_SIZE', 10000):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user[entry[1]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_user[entry[1]]
+
+
+auth_cache = AuthCache()
+
+
+def token_cache_key(key):
+    return f'token:{key}'
+
+
+def basic_cache_key(userid, password):
+    # Only a keyed digest of the credentials is kept in memory.
+    digest = hmac.new(settings.SECRET_KEY.encode(), f'{userid}\0{password}'.encode(), hashlib.sha256)
+    return f'basic:{digest.hexdigest()}'
+
+
+def _cached(key, authenticate):
+    result = auth_cache.get(key)
+    if result is None:
+        # Credentials may be moments old, as after registering or changing a password.
+        with primary():
+            result = authenticate()
+        auth_cache.set(key, result[0].pk, result)
+    user, auth = result
+    authenticated(user.pk)
+    # Requests get their own copy so views never share a mutable user between threads.
+    return copy.copy(user), auth
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the token and user lookup for recently seen tokens."""
+
+    def authenticate_credentials(self, key):
+        return _cached(token_cache_key(key), lambda: super(CachedTokenAuthentication, self).authenticate_credentials(key))
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """BasicAuthentication that skips the password hash for recently verified credentials."""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        return _cached(
+            basic_cache_key(userid, password),
+            lambda: super(CachedBasicAuthentication, self).authenticate_credentials(userid, password, request))
@@ -0,0 +1,213 @@
+import bisect
+import copy
+import datetime
+import itertools
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+
+from app.models import Machine, RentOrder
+
+MAX_RENTAL_DAYS = 365
+# Longest date window availability queries may cover
+MAX_WINDOW_DAYS = 366
+
+
+def _option(name, default):
+    return getattr(settings, 'RENTAL_AVAILABILITY', {}).get(name, default)
+
+
+class Schedule:
+    """
+    Units of a machine booked over time, as a step function: `levels[i]`
+    units are booked from `points[i]` up to `points[i + 1]`, and none before
+    the first point or after the last. A sparse table of range maximums over
+    `levels` answers "most units booked between two dates" with two binary
+    searches and one lookup, so overlap checks are O(log n) in the number
+    of bookings. Intervals are (start, end) date pairs with an exclusive end.
+    """
+
+    def __init__(self, intervals):
+        deltas = {}
+        for start, end in intervals:
+            deltas[start] = deltas.get(start, 0) + 1
+            deltas[end] = deltas.get(end, 0) - 1
+        points = sorted(deltas)
+        self._set_steps(points, list(itertools.accumulate(deltas[point] for point in points)))
+
+    def _set_steps(self, points, levels):
+        self.points = points
+        self.levels = levels
+
+        # _maximums[k][i] is the largest of levels[i:i + 2 ** k].
+        self._maximums = [self.levels]
+        width = 1
+        while 2 * width <= len(self.levels):
+            previous = self._maximums[-1]
+            self._maximums.append([max(previous[i], previous[i + width]) for i in range(len(previous) - width)])
+            width *= 2
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, start, end, units=1):
+        """Book `units` more units in [start, end), without going back to the bookings."""
+        points, levels = list(self.points), list(self.levels)
+        for day in (start, end):
+            index = bisect.bisect_left(points, day)
+            if index == len(points) or points[index] != day:
+                points.insert(index, day)
+                levels.insert(index, levels[index - 1] if index else 0)
+        for index in range(bisect.bisect_left(points, start), bisect.bisect_left(points, end)):
+            levels[index] += units
+        self._set_steps(points, levels)
+
+    def booked(self, start, end):
+        """Most units booked on any day in [start, end)."""
+        first = max(bisect.bisect_right(self.points, start) - 1, 0)
+        last = bisect.bisect_left(self.points, end) - 1
+        if last < first:
+            return 0
+        k = (last - first + 1).bit_length() - 1
+        return max(self._maximums[k][first], self._maximums[k][last - (1 << k) + 1])
+
+    def is_free(self, start, end, capacity, units=1):
+        return self.booked(start, end) + units <= capacity
+
+    def free_periods(self, start, end, capacity, units=1):
+        """Maximal (start, end) periods within [start, end) when `units` more units can be booked."""
+        periods = []
+        period_start = None
+        day = start
+        index = bisect.bisect_right(self.points, start) - 1
+        while day < end:
+            level = self.levels[index] if index >= 0 else 0
+            step_end = min(self.points[index + 1], end) if index + 1 < len(self.points) else end
+            if level + units <= capacity:
+                if period_start is None:
+                    period_start = day
+            elif period_start is not None:
+                periods.append((period_start, day))
+                period_start = None
+            day = step_end
+            index += 1
+        if period_start is not None:
+            periods.append((period_start, end))
+        return periods
+
+    def next_free(self, start, days, capacity, units=1):
+        """First date from `start` on with `units` free for `days` days, or None if the machine has too few."""
+        if units > capacity:
+            return None
+        length = datetime.timedelta(days=days)
+        candidate = start
+        index = max(bisect.bisect_right(self.points, start) - 1, 0)
+        while index < len(self.points) and self.points[index] < candidate + length:
+            if self.levels[index] + units > capacity:
+                # The last level is always 0, so a busy step has an end.
+                candidate = max(candidate, self.points[index + 1])
+            index += 1
+        return candidate
+
+
+class ScheduleCache:
+    """
+    Thread-safe in-process LRU of machine schedules, each stored with the
+    Machine.rental_version it was built at. A lookup only hits when the
+    caller's version matches, so every process sees new bookings at once.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, machine_id, version):
+        with self._lock:
+            entry = self._entries.get(machine_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(machine_id)
+            return entry[1]
+
+    def set(self, machine_id, version, schedule):
+        with self._lock:
+            self._entries[machine_id] = (version, schedule)
+            self._entries.move_to_end(machine_id)
+            while len(self._entries) > _option('MAX_CACHED_SCHEDULES', 1000):
+                self._entries.popitem(last=False)
+
+    def add_booking(self, machine_id, version, start, end, units=1):
+        """
+        Move the schedule cached at `version` to the next version by adding
+        one booking. Readers may still hold the old schedule, so the booking
+        goes into a copy.
+        """
+        with self._lock:
+            entry = self._entries.get(machine_id)
+            if entry is None or entry[0] != version:
+                return
+            schedule = copy.copy(entry[1])
+            schedule.add(start, end, units)
+            self._entries[machine_id] = (version + 1, schedule)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+schedule_cache = ScheduleCache()
+
+
+def active_rentals():
+    return RentOrder.objects.filter(status__in=RentOrder.ACTIVE_STATUSES)
+
+
+def load_schedule(machine_id, version):
+    """
+    Schedule of the machine at `version`, which the caller has read before
+    calling. Bookings that ended before today are left out.
+    """
+    schedule = schedule_cache.get(machine_id, version)
+    if schedule is None:
+        intervals = active_rentals().filter(machine_id=machine_id, end_date__gt=timezone.localdate())
+        schedule = Schedule(intervals.values_list('start_date', 'end_date'))
+        schedule_cache.set(machine_id, version, schedule)
+    return schedule
+
+
+def reserve_rental(machine_id, start_date, end_date, units=1):
+    """
+    Check that `units` of the machine are free in [start_date, end_date),
+    raising a ValidationError if not. Call it in the transaction that saves
+    the booking: locking the machine's bookings holds concurrent bookings
+    back until the transaction ends, so they are checked in turn. Saving the
+    booking bumps the rental version once, and once it commits the cached
+    schedule moves to that version with the booking added.
+    """
+    Machine.lock_rentals(machine_id)
+    capacity, version = Machine.objects.values_list('quantity', 'rental_version').get(pk=machine_id)
+    schedule = load_schedule(machine_id, version)
+    if not schedule.is_free(start_date, end_date, capacity, units):
+        raise ValidationError({'machine': ['The machine is already booked for these dates.']})
+    transaction.on_commit(
+        lambda: schedule_cache.add_booking(machine_id, version, start_date, end_date, units))
+
+
+def sync_rental(rent_order, new_status):
+    """Check the machine is still free before a rejected rent order becomes active again."""
+    if rent_order.status not in rent_order.ACTIVE_STATUSES and new_status in rent_order.ACTIVE_STATUSES:
+        reserve_rental(rent_order.machine_id, rent_order.start_date, rent_order.end_date)
+
+
+def bulk_booked(machine_ids, start_date, end_date):
+    """Most units booked in [start_date, end_date) per machine, from one query of the overlapping bookings."""
+    intervals = {machine_id: [] for machine_id in machine_ids}
+    overlapping = active_rentals().filter(machine_id__in=machine_ids, start_date__lt=end_date, end_date__gt=start_date)
+    for machine_id, start, end in overlapping.values_list('machine_id', 'start_date', 'end_date'):
+        intervals[machine_id].append((start, end))
+    return {machine_id: Schedule(machine_intervals).booked(start_date, end_date)
+            for machine_id, machine_intervals in intervals.items()}
@@ -0,0 +1,86 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'machine-catalog:version'
+
+
+def _option(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page. Called whenever a machine changes."""
+    cache.add(CATALOG_VERSION_KEY, 1, None)
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # The key was evicted between add() and incr(); any new value invalidates.
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def catalog_key(request):
+    """
+    Cache key for a catalog request, independent of the order of its query
+    params. The host is part of the key because pagination links are absolute.
+    """
+    params = request.query_params
+    normalized = sorted((key, sorted(params.getlist(key))) for key in params)
+    raw = repr((request.get_host(), request.path, normalized))
+    return 'machine-catalog:page:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_or_build_catalog(request, build):
+    """
+    Return the value `build` produces for `request`, calling it at most once per key
+    at a time. Entries are tagged with the catalog version: an entry from an
+    older version, or older than TIMEOUT, is stale. The first request to see
+    a stale entry rebuilds it while concurrent requests keep serving the
+    stale copy; when there is no copy at all they wait for the rebuild for
+    up to WAIT_TIMEOUT seconds.
+    """
+    key = catalog_key(request)
+    lock_key = key + ':lock'
+    timeout = _option('TIMEOUT', 300)
+    version = get_catalog_version()
+
+    entry = cache.get(key)
+    if entry and entry['version'] == version and time.time() - entry['built_at'] < timeout:
+        return entry['value']
+
+    locked = cache.add(lock_key, 1, _option('LOCK_TIMEOUT', 10))
+    if not locked:
+        if entry:
+            return entry['value']
+        entry = _wait_for_entry(key, version)
+        if entry:
+            return entry['value']
+
+    try:
+        value = build()
+        entry = {'version': version, 'built_at': time.time(), 'value': value}
+        cache.set(key, entry, timeout + _option('STALE_TIMEOUT', 3600))
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def _wait_for_entry(key, version):
+    deadline = time.monotonic() + _option('WAIT_TIMEOUT', 2)
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry and entry['version'] == version:
+            return entry
+    return None
@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import mimetypes
+import os
+import shutil
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import DatabaseError, transaction
+from django.db.models import Max
+from rest_framework import serializers
+
+from app.cache import bump_catalog_version
+from app.images import schedule_variants
+from app.models import Machine
+from app.serializers import MachineSerializer
+
+FORMATS = ['csv', 'ndjson']
+# Errors beyond this many are counted but not reported row by row.
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield (line number, row, parse errors) for every record of a binary CSV
+    or NDJSON stream, reading it one line at a time. CSV cells that are empty
+    are left out so model defaults apply, and the `details` column holds JSON.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            row = {key: value for key, value in row.items() if key and value not in ('', None)}
+            try:
+                if 'details' in row:
+                    row['details'] = json.loads(row['details'])
+            except ValueError:
+                yield reader.line_num, None, {'details': ['Value must be valid JSON.']}
+                continue
+            yield reader.line_num, row, None
+    else:
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, {'non_field_errors': ['Line is not valid JSON.']}
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, {'non_field_errors': ['Expected a JSON object.']}
+                continue
+            yield line_number, row, None
+
+
+class CatalogImport:
+    """
+    Import machines for an industry seller from a CSV or NDJSON stream.
+
+    Rows are validated one by one with MachineSerializer and inserted with
+    bulk_create in chunks of `chunk_size`, each chunk in its own atomic block
+    (a savepoint when the caller already holds a transaction). Invalid rows
+    are reported with their line number and skipped; if a chunk fails to
+    insert, its rows are retried one at a time. The `image` column names a
+    file in the `images` zip archive, which is extracted to a temporary
+    file only while its row is pending, so memory stays flat however large
+    the import is. Members stored by an earlier chunk are reused instead of
+    being stored again.
+    """
+
+    def __init__(self, owner, images=None, chunk_size=500):
+        self.owner = owner
+        self.archive = zipfile.ZipFile(images) if images else None
+        self.chunk_size = chunk_size
+        self.validator = MachineSerializer()
+        self.stored_images = {}
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, stream, file_format):
+        pending = []
+        try:
+            for line_number, row, errors in iter_rows(stream, file_format):
+                if errors is not None:
+                    self.add_error(line_number, errors)
+                    continue
+
+                item = self.build(line_number, row)
+                if item is not None:
+                    pending.append(item)
+                if len(pending) >= self.chunk_size:
+                    self.insert(pending)
+                    pending = []
+            if pending:
+                self.insert(pending)
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def build(self, line_number, row):
+        """Validate a row, returning (line number, archive member, unsaved Machine, image) or None."""
+        member = row.pop('image', None)
+        image = None
+        if member is not None:
+            image = self.open_image(member)
+            if image is None:
+                self.add_error(line_number, {'image': [f'{member} is not in the image archive.']})
+                return None
+
+        try:
+            data = self.validator.run_validation({**row, 'image': image} if image else row)
+        except serializers.ValidationError as error:
+            self.add_error(line_number, error.detail)
+            if image is not None:
+                image.close()
+            return None
+
+        if member in self.stored_images:
+            image.close()
+            image = None
+            data['image'] = self.stored_images[member]
+        return line_number, member, Machine(owner=self.owner, **data), image
+
+    def open_image(self, member):
+        if member in self.stored_images:
+            return default_storage.open(self.stored_images[member])
+        if self.archive is None:
+            return None
+
+        try:
+            info = self.archive.getinfo(member)
+        except KeyError:
+            return None
+
+        name = os.path.basename(member)
+        image = TemporaryUploadedFile(name, mimetypes.guess_type(name)[0], info.file_size, None)
+        with self.archive.open(info) as source:
+            shutil.copyfileobj(source, image)
+        image.seek(0)
+        return image
+
+    def insert(self, pending):
+        # bulk_create does not set primary keys on every backend; new rows are found above this one.
+        last_pk = Machine.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+        try:
+            with transaction.atomic():
+                Machine.objects.bulk_create([machine for _, _, machine, _ in pending])
+            inserted = pending
+        except DatabaseError:
+            inserted = []
+            for item in pending:
+                line_number, _, machine, image = item
+                try:
+                    with transaction.atomic():
+                        Machine.objects.bulk_create([machine])
+                    inserted.append(item)
+                except DatabaseError as error:
+                    self.add_error(line_number, {'non_field_errors': [str(error)]})
+                    if image is not None:
+                        # Stored by the failed bulk insert and referenced by nothing.
+                        default_storage.delete(machine.image.name)
+
+        for _, _, _, image in pending:
+            if image is not None:
+                image.close()
+        for _, member, machine, _ in inserted:
+            if member is not None:
+                self.stored_images.setdefault(member, machine.image.name)
+        self.created += len(inserted)
+
+        # bulk_create sends no post_save, so do what the Machine receivers would.
+        if inserted:
+            bump_catalog_version()
+            machines = Machine.objects.filter(owner=self.owner, pk__gt=last_pk)
+            schedule_variants(*machines.values_list('pk', flat=True))
+
+    def add_error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'errors': errors})
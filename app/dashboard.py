@@ -0,0 +1,158 @@
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+
+def order_totals(instance):
+    """
+    (source, counted user id, units, revenue) one order adds to the counter
+    of its status, at the current prices: quantity × discounted sell price
+    for orders, days × rent price for rent orders and the lot's quantity and
+    value for residue orders. Revenue is in hundredths of the price unit.
+    """
+    from app.models import Connection, RentOrder, ResidueOrder
+
+    if isinstance(instance, ResidueOrder):
+        residue = instance.residue
+        return Connection.RESIDUE_ORDER, instance.customer_id, residue.quantity, residue.price * residue.quantity * 100
+    machine = instance.machine
+    if isinstance(instance, RentOrder):
+        return Connection.RENT_ORDER, machine.owner_id, instance.num_of_days, machine.rent_price * instance.num_of_days * 100
+    return Connection.ORDER, machine.owner_id, instance.quantity, \
+        machine.sell_price * (100 - machine.discount) * instance.quantity
+
+
+def count_order(instance, old_status, new_status):
+    """Move an order from its old status's counter to its new one; None stands for not existing."""
+    from app.models import OrderCounter
+
+    source, user_id, units, revenue = order_totals(instance)
+    with transaction.atomic():
+        if old_status is not None:
+            OrderCounter.shift(user_id, source, old_status, -1, -units, -revenue)
+        if new_status is not None:
+            OrderCounter.shift(user_id, source, new_status, 1, units, revenue)
+
+
+def count_new_orders(orders):
+    """Count orders created with bulk_create, which sends no signals, with one shift per counter."""
+    from app.models import OrderCounter
+
+    totals = {}
+    for order in orders:
+        source, user_id, units, revenue = order_totals(order)
+        key = (user_id, source, order.status)
+        count, units_sum, revenue_sum = totals.get(key, (0, 0, 0))
+        totals[key] = (count + 1, units_sum + units, revenue_sum + revenue)
+
+    with transaction.atomic():
+        for (user_id, source, status), (count, units, revenue) in totals.items():
+            OrderCounter.shift(user_id, source, status, count, units, revenue)
+
+
+def reprice_machine(machine, old_prices):
+    """Revalue the counted orders and rent orders of a machine whose prices changed from `old_prices`."""
+    from app.models import Connection, Order, OrderCounter, RentOrder
+
+    old_sell_price, old_rent_price, old_discount = old_prices
+    sources = [
+        (Connection.ORDER, Order, 'quantity',
+         machine.sell_price * (100 - machine.discount) - old_sell_price * (100 - old_discount)),
+        (Connection.RENT_ORDER, RentOrder, 'num_of_days', (machine.rent_price - old_rent_price) * 100),
+    ]
+    with transaction.atomic():
+        for source, model, units_field, unit_delta in sources:
+            if not unit_delta:
+                continue
+            units = model.objects.filter(machine=machine).values_list('status').annotate(Sum(units_field)).order_by()
+            for status, status_units in units:
+                OrderCounter.shift(machine.owner_id, source, status, revenue=unit_delta * status_units)
+
+
+def reprice_residue(residue, old_terms):
+    """Revalue the counted orders of a residue lot whose (price, quantity) changed from `old_terms`."""
+    from app.models import Connection, OrderCounter, ResidueOrder
+
+    old_price, old_quantity = old_terms
+    units_delta = residue.quantity - old_quantity
+    revenue_delta = (residue.price * residue.quantity - old_price * old_quantity) * 100
+    orders = ResidueOrder.objects.filter(residue=residue).values_list('customer_id', 'status').annotate(Count('id'))
+    with transaction.atomic():
+        for customer_id, status, count in orders.order_by():
+            OrderCounter.shift(customer_id, Connection.RESIDUE_ORDER, status, units=units_delta * count,
+                               revenue=revenue_delta * count)
+
+
+def dashboard(user):
+    """
+    A user's order counts, units and revenue by source and status, and the
+    stock left across their machines, in two queries.
+    """
+    from app.models import Connection, Machine, Order
+
+    counters = {
+        source: {status: {'count': 0, 'units': 0, 'revenue': 0} for status, _ in Order.STATUS_CHOICES}
+        for source, _ in Connection.SOURCE_CHOICES
+    }
+    for counter in user.order_counters.all():
+        counters[counter.source][counter.status] = {
+            'count': counter.count, 'units': counter.units, 'revenue': counter.revenue / 100}
+    stock = Machine.objects.filter(owner=user).aggregate(stock=Sum('quantity'))['stock']
+    return {**counters, 'stock': stock or 0}
+
+
+def expected_counters(apps=None):
+    """
+    {(user id, source, status): (count, units, revenue)} computed from the
+    orders themselves. Migrations pass their `apps` to use the models as of
+    that migration.
+    """
+    from app.models import Connection
+
+    apps = apps or django_apps
+    Order, RentOrder, ResidueOrder = (apps.get_model('app', name) for name in ('Order', 'RentOrder', 'ResidueOrder'))
+    sources = [
+        (Connection.ORDER, Order, 'machine__owner', F('quantity'),
+         F('quantity') * F('machine__sell_price') * (100 - F('machine__discount'))),
+        (Connection.RENT_ORDER, RentOrder, 'machine__owner', F('num_of_days'),
+         F('num_of_days') * F('machine__rent_price') * 100),
+        (Connection.RESIDUE_ORDER, ResidueOrder, 'customer', F('residue__quantity'),
+         F('residue__quantity') * F('residue__price') * 100),
+    ]
+    expected = {}
+    for source, model, user, units, revenue in sources:
+        rows = model.objects.values_list(user, 'status').order_by() \
+            .annotate(count=Count('id'), units=Sum(units), revenue=Sum(revenue))
+        for user_id, status, count, units_sum, revenue_sum in rows.iterator():
+            expected[(user_id, source, status)] = (count, units_sum, revenue_sum)
+    return expected
+
+
+def reconcile(fix=False):
+    """
+    Compare every OrderCounter with totals computed from the orders, and
+    return the ones that drifted as ((user id, source, status), stored,
+    expected) tuples. With `fix` the drifted counters are overwritten. The
+    counters are locked before the orders are read, so an order written
+    meanwhile shifts the corrected value rather than being lost.
+    """
+    from app.models import OrderCounter
+
+    with transaction.atomic():
+        counters = OrderCounter.objects.all()
+        if fix:
+            counters = counters.select_for_update()
+        stored = {(counter.user_id, counter.source, counter.status): (counter.count, counter.units, counter.revenue)
+                  for counter in counters}
+        expected = expected_counters()
+
+        empty = (0, 0, 0)
+        drifts = [(key, stored.get(key, empty), expected.get(key, empty))
+                  for key in sorted(stored.keys() | expected.keys())
+                  if stored.get(key, empty) != expected.get(key, empty)]
+        if fix:
+            for (user_id, source, status), _, (count, units, revenue) in drifts:
+                OrderCounter.objects.update_or_create(
+                    user_id=user_id, source=source, status=status,
+                    defaults={'count': count, 'units': units, 'revenue': revenue})
+    return drifts
@@ -0,0 +1,125 @@
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+from django.db import models
+
+# Offline gazetteer of district headquarters: name, state, latitude, longitude and '|'-separated aliases.
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'districts.csv')
+
+# Users are bucketed into a fixed grid of CELL_DEGREES x CELL_DEGREES cells
+# (about 28 km at the equator); radius queries turn into an indexed IN over
+# the cells overlapping the bounding box.
+CELL_DEGREES = 0.25
+CELLS_PER_ROW = int(360 / CELL_DEGREES)
+ROWS = int(180 / CELL_DEGREES)
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 300
+
+# near_key packs the distance in metres and the row id into one sortable integer.
+DISTANCE_KEY_SCALE = 10 ** 12
+
+
+def _normalize(text):
+    return ' ' + re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip() + ' '
+
+
+@lru_cache(maxsize=None)
+def load_gazetteer():
+    """Return (normalized name, (latitude, longitude), state) entries, longest names first."""
+    entries = []
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            point = (float(row['latitude']), float(row['longitude']))
+            names = [row['name']] + [alias for alias in row['aliases'].split('|') if alias]
+            entries.extend((_normalize(name), point, row['state']) for name in names)
+    return sorted(entries, key=lambda entry: len(entry[0]), reverse=True)
+
+
+def _lookup(location):
+    padded = _normalize(location or '')
+    for entry in load_gazetteer():
+        if entry[0] in padded:
+            return entry
+    return None
+
+
+def geocode(location):
+    """Return the (latitude, longitude) of the first district named in `location`, or None."""
+    entry = _lookup(location)
+    return entry[1] if entry else None
+
+
+def geocode_region(location):
+    """Return the state of the first district named in `location`, or None."""
+    entry = _lookup(location)
+    return entry[2] if entry else None
+
+
+def grid_cell(latitude, longitude):
+    row = min(int((latitude + 90) // CELL_DEGREES), ROWS - 1)
+    column = int((longitude + 180) // CELL_DEGREES) % CELLS_PER_ROW
+    return row * CELLS_PER_ROW + column
+
+
+def cells_within(latitude, longitude, radius_km):
+    """Grid cells overlapping the bounding box of a circle."""
+    latitude_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    longitude_delta = min(latitude_delta / max(math.cos(math.radians(latitude)), 0.01), 180)
+
+    first_row = max(int((latitude - latitude_delta + 90) // CELL_DEGREES), 0)
+    last_row = min(int((latitude + latitude_delta + 90) // CELL_DEGREES), ROWS - 1)
+    first_column = int((longitude - longitude_delta + 180) // CELL_DEGREES)
+    last_column = int((longitude + longitude_delta + 180) // CELL_DEGREES)
+    columns = {column % CELLS_PER_ROW for column in range(first_column, last_column + 1)}
+
+    return [row * CELLS_PER_ROW + column for row in range(first_row, last_row + 1) for column in columns]
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearest_first(queryset, point, radius_km, owner_field='owner'):
+    """
+    Restrict `queryset` to rows whose owner lives within `radius_km` of
+    `point`, annotated with a unique `near_key` that sorts nearest first.
+    Owners are geocoded to district points, so the grid cells around `point`
+    hold a few distinct locations however many owners they hold. Distances
+    are computed once per location, read from the (grid_cell, latitude,
+    longitude) index, and the rows are matched on their owner's location.
+    """
+    latitude, longitude = point
+    owner_model = queryset.model._meta.get_field(owner_field).related_model
+    locations = owner_model.objects.filter(grid_cell__in=cells_within(latitude, longitude, radius_km)) \
+        .values_list('grid_cell', 'latitude', 'longitude').distinct()
+
+    distances = {}
+    for cell, owner_latitude, owner_longitude in locations:
+        distance = haversine_km(latitude, longitude, owner_latitude, owner_longitude)
+        if distance <= radius_km:
+            distances[(cell, owner_latitude, owner_longitude)] = distance
+
+    if not distances:
+        return queryset.none()
+
+    distance_key = models.Case(
+        *[models.When(**{f'{owner_field}__grid_cell': cell, f'{owner_field}__latitude': owner_latitude,
+                         f'{owner_field}__longitude': owner_longitude},
+                      then=models.Value(round(distance * 1000) * DISTANCE_KEY_SCALE))
+          for (cell, owner_latitude, owner_longitude), distance in distances.items()],
+        output_field=models.BigIntegerField(),
+    )
+    # Locations in the same cells but outside the radius get no distance.
+    cells = sorted({cell for cell, _, _ in distances})
+    return queryset.filter(**{f'{owner_field}__grid_cell__in': cells}) \
+        .annotate(near_distance=distance_key).filter(near_distance__isnull=False) \
+        .annotate(near_key=models.F('near_distance') + models.F('id'))
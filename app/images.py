@@ -0,0 +1,114 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, features
+
+from app.media import content_hash, hashed_name
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _option(name, default):
+    return getattr(settings, 'IMAGE_VARIANTS', {}).get(name, default)
+
+
+def variant_formats():
+    formats = ['jpeg']
+    if features.check('webp'):
+        formats.append('webp')
+    return formats
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_option('WORKERS', 2), thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(*machine_ids):
+    """
+    Generate the variants of machines' images in the worker pool once the
+    current transaction commits. The machines of one call make a single job.
+    """
+    if _option('WORKERS', 2) == 0:
+        transaction.on_commit(lambda: _generate_in_worker(machine_ids))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_worker, machine_ids))
+
+
+def _generate_in_worker(machine_ids):
+    close_old_connections()
+    try:
+        for machine_id in machine_ids:
+            try:
+                generate_variants(machine_id)
+            except Exception:
+                logger.exception('Could not generate image variants for machine %s', machine_id)
+    finally:
+        close_old_connections()
+
+
+def render_variant(image, width, image_format):
+    """Resize `image` to at most `width` pixels wide and encode it, returning the bytes."""
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+    output = BytesIO()
+    if image_format == 'jpeg':
+        image.convert('RGB').save(output, 'JPEG', quality=_option('QUALITY', 80), optimize=True, progressive=True)
+    else:
+        image.save(output, 'WEBP', quality=_option('QUALITY', 80), method=4)
+    return output.getvalue()
+
+
+def generate_variants(machine_id):
+    """
+    Write every configured width and format of a machine's image to storage
+    and record their names in Machine.image_variants, replacing the files of
+    a previous image.
+    """
+    from app.cache import bump_catalog_version
+    from app.models import Machine
+
+    machine = Machine.objects.filter(pk=machine_id).only('image', 'image_variants').first()
+    if machine is None or not machine.image:
+        return
+
+    with machine.image.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+
+    directory, filename = os.path.split(machine.image.name)
+    stem = os.path.splitext(filename)[0]
+    variants = {}
+    for width in _option('WIDTHS', [320, 640, 1280]):
+        for image_format in variant_formats():
+            data = render_variant(image, width, image_format)
+            name = hashed_name(f'{directory}/variants/{stem}_{width}w.{image_format}', content_hash([data]))
+            variants.setdefault(str(width), {})[image_format] = default_storage.save(name, ContentFile(data))
+
+    # Only record the variants if the image was not replaced in the meantime.
+    updated = Machine.objects.filter(pk=machine_id, image=machine.image.name).update(
+        image_variants=variants, updated_at=timezone.now())
+    if updated:
+        obsolete = _variant_names(machine.image_variants) - _variant_names(variants)
+        bump_catalog_version()
+    else:
+        obsolete = _variant_names(variants)
+
+    for name in obsolete:
+        default_storage.delete(name)
+
+
+def _variant_names(variants):
+    return {name for names in (variants or {}).values() for name in names.values()}
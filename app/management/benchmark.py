@@ -0,0 +1,73 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base class for benchmark commands. The benchmark runs against a throwaway
+    test database so seeding never touches the configured one. Commands that
+    use several threads set `threaded` so SQLite gets a file instead of a
+    shared-cache in-memory database.
+    """
+    threaded = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        if self.threaded and connection.vendor == 'sqlite':
+            name = f'benchmark_{os.getpid()}.sqlite3'
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), name)
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.benchmark(*args, **options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def benchmark(self, *args, **options):
+        raise NotImplementedError
+
+    def report(self, label, **values):
+        columns = '  '.join(f'{key}={value}' for key, value in values.items())
+        self.stdout.write(f'{label:<30} {columns}')
+
+
+def measure(func, repeat=20):
+    """Return (median seconds, queries issued by one call) for `func`."""
+    # Once the bounded query log is full its length stops changing, and the
+    # context would count nothing.
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(queries)
+
+
+def call_view(view, path='/', method='get', user=None, data=None, view_kwargs=None, **extra):
+    factory = APIRequestFactory()
+    if method == 'get':
+        request = factory.get(path, data, **extra)
+    else:
+        request = getattr(factory, method)(path, data, format='json', **extra)
+    if user is not None:
+        force_authenticate(request, user=user)
+    response = view(request, **(view_kwargs or {}))
+    if not response.streaming:
+        response.render()
+    return response
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import itertools
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.backends.signals import connection_created
+
+from app.management.benchmark import BenchmarkCommand
+from app.models import Connection, Machine, Residue, User
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def wsgi_request(application, path, token):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_AUTHORIZATION': f'Token {token}', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    statuses = []
+    body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    return int(statuses[0].split()[0]), body
+
+
+async def asgi_request(application, path, token):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return messages[0]['status'], body
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare p50/p99 latency and throughput of the hot read endpoints under WSGI, '
+            'ASGI with the sync views and ASGI with the async views.')
+    threaded = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Add a network round trip to every query, as with a database server.')
+
+    def benchmark(self, *args, **options):
+        from project.asgi import StreamingASGIHandler
+        from project.asgi import application as async_views_application
+        from project.wsgi import application as wsgi_application
+
+        requests = self.seed(options['rows'])[:options['requests']]
+        concurrency = options['concurrency']
+
+        latency = options['db_latency_ms'] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(add_latency)
+
+        if latency:
+            connection_created.connect(install_latency, weak=False)
+
+        self.report_run('wsgi (threads)', self.run_wsgi(wsgi_application, requests, concurrency))
+        self.report_run('asgi sync views', asyncio.run(self.run_asgi(StreamingASGIHandler(), requests, concurrency)))
+        self.report_run('asgi async views', asyncio.run(self.run_asgi(async_views_application, requests, concurrency)))
+
+    def seed(self, rows):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password', location='Pune')
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='A reliable machine',
+                    details={'hp': 45}, quantity=10) for i in range(rows))
+        Residue.objects.bulk_create(Residue(owner=farmer, price=i) for i in range(rows))
+        Connection.objects.create(user=farmer, peer=industry, source=Connection.ORDER, role=Connection.BUYER)
+        Connection.objects.create(user=industry, peer=farmer, source=Connection.ORDER, role=Connection.SELLER)
+        machine = Machine.objects.first()
+
+        endpoints = [
+            ('/api/machines/', farmer.auth_token.key),
+            (f'/api/machines/{machine.pk}', farmer.auth_token.key),
+            ('/api/residues/', industry.auth_token.key),
+            ('/api/connections/', farmer.auth_token.key),
+        ]
+        return list(itertools.islice(itertools.cycle(endpoints), 100000))
+
+    def run_wsgi(self, application, requests, concurrency):
+        def timed(request):
+            start = time.perf_counter()
+            status, _ = wsgi_request(application, *request)
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(timed, requests))
+        return results, time.perf_counter() - start
+
+    async def run_asgi(self, application, requests, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(request):
+            async with semaphore:
+                start = time.perf_counter()
+                status, _ = await asgi_request(application, *request)
+                return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed(request) for request in requests))
+        return results, time.perf_counter() - start
+
+    def report_run(self, label, run):
+        results, elapsed = run
+        timings = [seconds for _, seconds in results]
+        errors = sum(1 for status, _ in results if status != 200)
+        self.report(label, p50_ms=f'{statistics.median(timings) * 1000:.2f}',
+                    p99_ms=f'{percentile(timings, 0.99) * 1000:.2f}',
+                    requests_per_s=f'{len(results) / elapsed:.0f}', errors=errors)
@@ -0,0 +1,33 @@
+import base64
+
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication)
+from rest_framework.test import APIRequestFactory
+
+from app.authentication import (CachedBasicAuthentication,
+                                CachedTokenAuthentication, auth_cache)
+from app.management.benchmark import BenchmarkCommand, measure
+from app.models import User
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare the per-request cost of plain and cached token and Basic authentication.'
+
+    def benchmark(self, *args, **options):
+        user = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        credentials = base64.b64encode(b'farmer:password').decode()
+        factory = APIRequestFactory()
+        token_request = factory.get('/', HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        basic_request = factory.get('/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+        cases = [
+            ('token', TokenAuthentication(), token_request),
+            ('token cached', CachedTokenAuthentication(), token_request),
+            ('basic', BasicAuthentication(), basic_request),
+            ('basic cached', CachedBasicAuthentication(), basic_request),
+        ]
+        auth_cache.clear()
+        for label, authentication, request in cases:
+            authentication.authenticate(request)
+            seconds, queries = measure(lambda: authentication.authenticate(request), options['repeat'])
+            self.report(label, us=f'{seconds * 1e6:.1f}', queries=queries)
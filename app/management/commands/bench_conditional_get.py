@@ -0,0 +1,40 @@
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Machine, Residue, User
+from app.views import MachineDetailView, MachinesView, ResiduesView
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare full and If-None-Match repeat fetches of catalog, detail and listing endpoints.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def benchmark(self, *args, **options):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='A reliable machine ' * 10,
+                    details={'hp': 45, 'fuel': 'diesel'}) for i in range(options['rows']))
+        Residue.objects.bulk_create(Residue(owner=farmer, price=i) for i in range(options['rows']))
+        machine = Machine.objects.first()
+
+        params = {'page_size': options['page_size']}
+        endpoints = [
+            ('machines list', MachinesView.as_view(), farmer, params, {}),
+            ('machine detail', MachineDetailView.as_view(), farmer, None, {'pk': machine.pk}),
+            ('residues list', ResiduesView.as_view(), industry, params, {}),
+        ]
+        for name, view, user, data, kwargs in endpoints:
+            full = call_view(view, user=user, data=data, view_kwargs=kwargs)
+            etag = full['ETag']
+
+            full_seconds, _ = measure(lambda: call_view(view, user=user, data=data, view_kwargs=kwargs), options['repeat'])
+            repeat_seconds, _ = measure(
+                lambda: call_view(view, user=user, data=data, view_kwargs=kwargs, HTTP_IF_NONE_MATCH=etag), options['repeat'])
+            repeat = call_view(view, user=user, data=data, view_kwargs=kwargs, HTTP_IF_NONE_MATCH=etag)
+
+            self.report(name, full_bytes=len(full.content), repeat_status=repeat.status_code,
+                        repeat_bytes=len(repeat.content), full_ms=f'{full_seconds * 1000:.2f}',
+                        repeat_ms=f'{repeat_seconds * 1000:.2f}')
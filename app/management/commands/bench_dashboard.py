@@ -0,0 +1,76 @@
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from app.dashboard import reconcile
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Machine, Order, RentOrder, Residue, ResidueOrder, User
+from app.views import DashboardView, OrdersView, RentOrdersView, ResidueOrdersView
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare the counter-backed dashboard with paging through every order list per status as history grows.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+
+    def benchmark(self, *args, **options):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(20)]
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='', details={}, quantity=100,
+                    sell_price=1000 + i, discount=i % 20, rent_price=50 + i, for_rent=i % 2 == 0) for i in range(50))
+        machines = list(Machine.objects.all())
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+
+        def list_everything():
+            # What the landing screen did: every order list, once per status filter, page by page.
+            for view in (OrdersView.as_view(), RentOrdersView.as_view(), ResidueOrdersView.as_view()):
+                for status in statuses:
+                    data = {'page_size': 200, 'status': status}
+                    response = call_view(view, user=industry, data=data)
+                    while response.data['next']:
+                        query = parse_qs(urlsplit(response.data['next']).query)
+                        response = call_view(view, user=industry, data={**data, 'cursor': query['cursor'][0]})
+
+        seeded = 0
+        for size in sorted(options['sizes']):
+            self.seed(industry, farmers, machines, statuses, seeded, size)
+            seeded = size
+
+            start = time.perf_counter()
+            drifts = reconcile(fix=True)
+            self.report(f'{size} orders, reconcile', seconds=f'{time.perf_counter() - start:.2f}',
+                        corrected=len(drifts))
+
+            seconds, queries = measure(lambda: call_view(DashboardView.as_view(), user=industry), options['repeat'])
+            self.report(f'{size} orders, dashboard', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+            seconds, queries = measure(list_everything, max(1, options['repeat'] // 10))
+            self.report(f'{size} orders, order lists', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+
+            order = Order.objects.filter(machine__owner=industry).last()
+
+            def toggle():
+                order.status = Order.ACCEPTED if order.status != Order.ACCEPTED else Order.PENDING
+                order.save()
+
+            seconds, queries = measure(toggle, options['repeat'])
+            self.report(f'{size} orders, status change', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+            if reconcile():
+                self.stderr.write('Order counters drifted from the orders.')
+
+    def seed(self, industry, farmers, machines, statuses, start, end):
+        # bulk_create skips the receivers; reconcile(fix=True) fills the counters in afterwards.
+        Residue.objects.bulk_create(
+            Residue(owner=farmers[i % len(farmers)], price=100 + i % 50, quantity=1 + i % 9) for i in range(start, end))
+        residues = Residue.objects.order_by('-pk').values_list('pk', flat=True)[:end - start]
+        Order.objects.bulk_create(
+            (Order(customer=farmers[i % len(farmers)], machine=machines[i % len(machines)], quantity=1 + i % 3,
+                   status=statuses[i % len(statuses)]) for i in range(start, end)), batch_size=5000)
+        RentOrder.objects.bulk_create(
+            (RentOrder(customer=farmers[i % len(farmers)], machine=machines[i % len(machines)], num_of_days=1 + i % 7,
+                       start_date='2026-01-01', end_date='2026-01-08', status=statuses[i % len(statuses)])
+             for i in range(start, end)), batch_size=5000)
+        ResidueOrder.objects.bulk_create(
+            (ResidueOrder(customer=industry, residue_id=residue_id, status=statuses[i % len(statuses)])
+             for i, residue_id in enumerate(residues)), batch_size=5000)
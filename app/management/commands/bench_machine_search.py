@@ -0,0 +1,73 @@
+import random
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Machine, User
+from app.views import MachinesView
+
+KINDS = ['tractor', 'harvester', 'plough', 'seeder', 'sprayer', 'tiller', 'baler', 'thresher', 'cultivator', 'rotavator']
+BRANDS = ['Mahindra', 'Sonalika', 'Swaraj', 'Kubota', 'John Deere', 'Eicher', 'Escorts', 'New Holland']
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Measure ?q= full-text search latency on MachinesView as the catalog grows, for the whole request and '
+        'for its SQL alone.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', nargs='+', default=['tractor', 'kubota', 'rotav', 'mahindra tiller', 'word123'])
+
+    def benchmark(self, *args, **options):
+        owner = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        # Signed in, so the searches are not answered from the anonymous catalog cache.
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        vocabulary = [f'word{i}' for i in range(5000)]
+        rng = random.Random(0)
+
+        view = MachinesView.as_view()
+        seeded = 0
+        for size in sorted(options['sizes']):
+            self.seed(owner, rng, vocabulary, size - seeded)
+            seeded = size
+
+            for query in options['queries']:
+                def search():
+                    return call_view(view, '/api/machines/', user=farmer, data={'q': query})
+
+                seconds, queries = measure(search, options['repeat'])
+                sql_seconds = self.time_statements(search, options['repeat'])
+                self.report(f'{size} machines q={query!r}', request_ms=f'{seconds * 1000:.2f}',
+                            sql_ms=f'{sql_seconds * 1000:.2f}', queries=queries)
+
+    def time_statements(self, func, repeat):
+        """Median seconds of the statements `func` issues, run again on their own."""
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        statements = [query['sql'] for query in queries.captured_queries]
+
+        def run():
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+                    cursor.fetchall()
+
+        seconds, _ = measure(run, repeat)
+        return seconds
+
+    def seed(self, owner, rng, vocabulary, count, batch_size=5000):
+        while count > 0:
+            batch = min(count, batch_size)
+            Machine.objects.bulk_create(
+                Machine(
+                    owner=owner,
+                    name=f'{rng.choice(BRANDS)} {rng.choice(KINDS)}',
+                    description=' '.join(rng.sample(vocabulary, 8)),
+                    details={'brand': rng.choice(BRANDS), 'hp': rng.randint(20, 90)},
+                ) for _ in range(batch))
+            count -= batch
@@ -0,0 +1,59 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views import static
+
+from app.media import serve_media
+
+
+def consume(response):
+    """Read the whole body like the WSGI server would, returning its size."""
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+class Command(BaseCommand):
+    help = 'Compare how long a worker is occupied serving a large media file in each serving mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--size-mb', type=int, default=50)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with tempfile.TemporaryDirectory() as media_root:
+            name = 'machine_images/tractor.0123456789ab.jpg'
+            os.makedirs(os.path.join(media_root, 'machine_images'))
+            with open(os.path.join(media_root, name), 'wb') as file:
+                file.write(os.urandom(options['size_mb'] * 1024 * 1024))
+
+            cases = [
+                ('django.views.static.serve', 'django', {},
+                 lambda request: static.serve(request, name, document_root=media_root)),
+                ('serve_media', 'django', {}, lambda request: serve_media(request, name)),
+                ('serve_media range 1 MB', 'django', {'HTTP_RANGE': 'bytes=0-1048575'},
+                 lambda request: serve_media(request, name)),
+                ('serve_media x-accel-redirect', 'x-accel-redirect', {},
+                 lambda request: serve_media(request, name)),
+            ]
+            for label, mode, headers, view in cases:
+                with override_settings(MEDIA_ROOT=media_root, MEDIA_SERVING={'MODE': mode}):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        request = factory.get(f'/media/{name}', **headers)
+                        start = time.perf_counter()
+                        response = view(request)
+                        size = consume(response)
+                        timings.append(time.perf_counter() - start)
+
+                self.stdout.write(f'{label:<30} status={response.status_code}  bytes={size}  '
+                                  f'worker_ms={statistics.median(timings) * 1000:.2f}  '
+                                  f'cache_control={response.get("Cache-Control", "-")}')
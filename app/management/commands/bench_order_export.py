@@ -0,0 +1,57 @@
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlsplit
+
+from app.management.benchmark import BenchmarkCommand, call_view
+from app.models import Machine, Order, User
+from app.views import OrdersExportView, OrdersView
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare the paginated order listing with the streaming export for a full order history.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--orders', type=int, default=100000)
+
+    def benchmark(self, *args, **options):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(20)]
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='', details={}) for i in range(50))
+        machines = list(Machine.objects.all())
+        Order.objects.bulk_create(
+            (Order(customer=farmers[i % len(farmers)], machine=machines[i % len(machines)], quantity=1 + i % 3)
+             for i in range(options['orders'])), batch_size=5000)
+
+        def list_all_pages():
+            view, data = OrdersView.as_view(), {'page_size': 200}
+            response = call_view(view, user=industry, data=data)
+            first_byte = time.perf_counter()
+            while response.data['next']:
+                query = parse_qs(urlsplit(response.data['next']).query)
+                response = call_view(view, user=industry, data={**data, 'cursor': query['cursor'][0]})
+            return first_byte
+
+        def export(file_format):
+            def run():
+                response = call_view(OrdersExportView.as_view(), user=industry,
+                                     view_kwargs={'file_format': file_format})
+                chunks = iter(response.streaming_content)
+                next(chunks)
+                first_byte = time.perf_counter()
+                for _ in chunks:
+                    pass
+                return first_byte
+            return run
+
+        for label, run in [('paginated list (200/page)', list_all_pages),
+                           ('export csv', export('csv')), ('export ndjson', export('ndjson'))]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            first_byte = run()
+            total = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.report(label, first_byte_ms=f'{(first_byte - start) * 1000:.1f}', total_s=f'{total:.2f}',
+                        peak_mb=f'{peak / 2 ** 20:.1f}')
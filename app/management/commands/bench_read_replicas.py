@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from app.management.benchmark import BenchmarkCommand
+from app.models import Machine, Order, User
+from app.replicas import replica_lag, replicate
+from app.sqlite import is_locked
+
+REPLICA = 'replica'
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+    return client
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Check read/write routing and read-your-writes against a primary SQLite file and a replica file kept in '
+        'sync by app.replicas.replicate, then run order readers and writers with and without the replica, '
+        'reporting throughput and replica lag.'
+    )
+    threaded = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds between copies to the replica.')
+
+    def benchmark(self, *args, **options):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(20)]
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='', details={}, quantity=10 ** 6,
+                    sell_price=1000) for i in range(20))
+        machines = list(Machine.objects.values_list('pk', flat=True))
+        Order.objects.bulk_create(
+            Order(customer=farmers[i % len(farmers)], machine_id=machines[i % len(machines)]) for i in range(2000))
+
+        # The replica is a second file next to the benchmark database.
+        name = connection.settings_dict['NAME'].replace('.sqlite3', '_replica.sqlite3')
+        connections.databases[REPLICA] = {**connection.settings_dict, 'NAME': name}
+        options['max_lag'] = max(2.0, options['interval'] * 4)
+        try:
+            with override_settings(READ_REPLICAS=self.replicas([REPLICA], options)):
+                replicate(REPLICA)
+                self.check_routing(industry, farmers[0], machines[0])
+            for label, aliases in [('primary only', []), ('with replica', [REPLICA])]:
+                with override_settings(READ_REPLICAS=self.replicas(aliases, options)):
+                    replicate(REPLICA)
+                    self.run_workload(label, industry, farmers, machines, options)
+        finally:
+            connections.close_all()
+            del connections.databases[REPLICA]
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(name + suffix):
+                    os.remove(name + suffix)
+
+    def replicas(self, aliases, options):
+        return {'ALIASES': aliases, 'MAX_LAG': options['max_lag'], 'LAG_CHECK_INTERVAL': options['interval'] / 2}
+
+    def check_routing(self, industry, farmer, machine):
+        """Follow one order through both clients, counting the queries each database served."""
+        seller, buyer = api_client(industry), api_client(farmer)
+        failures = []
+
+        def step(label, func, expect, new_order=None, visible=None):
+            for alias in (DEFAULT_DB_ALIAS, REPLICA):
+                connections[alias].queries_log.clear()
+            with ExitStack() as stack:
+                captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in (DEFAULT_DB_ALIAS, REPLICA)}
+                response = func()
+            counts = {alias: len(queries) for alias, queries in captured.items()}
+            values = {'status': response.status_code, 'primary_queries': counts[DEFAULT_DB_ALIAS],
+                      'replica_queries': counts[REPLICA]}
+            # Credentials not yet in the authentication cache are checked on the primary.
+            if expect == REPLICA and (counts[REPLICA] == 0 or counts[DEFAULT_DB_ALIAS] > 1):
+                failures.append(f'{label} did not read from the replica')
+            if expect == DEFAULT_DB_ALIAS and counts[REPLICA]:
+                failures.append(f'{label} used the replica')
+            if new_order is not None:
+                seen = any(order['id'] == new_order for order in response.data['results'])
+                values['sees_new_order'] = seen
+                if seen != visible:
+                    failures.append(f'{label} {"missed" if visible else "saw"} the new order')
+            self.report(label, **values)
+            return response
+
+        orders = '/api/orders/'
+        step('list (seller)', lambda: seller.get(orders), REPLICA)
+        response = step('place order (buyer)',
+                        lambda: buyer.post(orders, {'machine': machine, 'quantity': 1}, format='json'),
+                        DEFAULT_DB_ALIAS)
+        new_order = response.data['id']
+        step('list after write (buyer)', lambda: buyer.get(orders), DEFAULT_DB_ALIAS, new_order, True)
+        step('list before copy (seller)', lambda: seller.get(orders), REPLICA, new_order, False)
+        replicate(REPLICA)
+        step('list after copy (seller)', lambda: seller.get(orders), REPLICA, new_order, True)
+
+        if failures:
+            raise CommandError('Routing: ' + ' | '.join(failures))
+
+    def run_workload(self, label, industry, farmers, machines, options):
+        counts = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0, 'replica_queries': 0, 'primary_queries': 0}
+        lags = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def tally(key, amount=1):
+            with lock:
+                counts[key] += amount
+
+        def worker(step, client):
+            primary, replica = QueryCounter(), QueryCounter()
+            try:
+                with connections[DEFAULT_DB_ALIAS].execute_wrapper(primary), \
+                        connections[REPLICA].execute_wrapper(replica):
+                    i = 0
+                    while time.perf_counter() < deadline:
+                        try:
+                            tally(step(client, i))
+                        except Exception as error:
+                            tally('locked' if is_locked(error) else 'errors')
+                        i += 1
+            finally:
+                tally('primary_queries', primary.count)
+                tally('replica_queries', replica.count)
+                connections.close_all()
+
+        def read(client, i):
+            path = '/api/orders/' if i % 2 else '/api/dashboard/'
+            response = client.get(path, {'status': Order.PENDING} if i % 2 else None)
+            return 'reads' if response.status_code == 200 else 'errors'
+
+        def write(client, i):
+            response = client.post('/api/orders/', {'machine': machines[i % len(machines)], 'quantity': 1},
+                                   format='json')
+            return 'writes' if response.status_code == 201 else 'errors'
+
+        def replication():
+            # Stand-in for a replication stream: sample the lag, then catch the replica up.
+            try:
+                while time.perf_counter() < deadline:
+                    time.sleep(options['interval'])
+                    lags.append(replica_lag(REPLICA))
+                    try:
+                        replicate(REPLICA)
+                    except Exception as error:
+                        tally('locked' if is_locked(error) else 'errors')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(read, api_client(industry)))
+                   for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(write, api_client(farmers[i % len(farmers)])))
+                    for i in range(options['writers'])]
+        threads.append(threading.Thread(target=replication))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['seconds']
+        known = [lag for lag in lags if lag is not None]
+        self.report(
+            f'{label}: mixed load', reads_per_s=f'{counts["reads"] / seconds:.0f}',
+            writes_per_s=f'{counts["writes"] / seconds:.0f}', locked=counts['locked'], other_errors=counts['errors'],
+            primary_queries=counts['primary_queries'], replica_queries=counts['replica_queries'])
+        self.report(
+            f'{label}: replica lag', copies=len(lags),
+            max_s=f'{max(known):.2f}' if known else '-',
+            mean_s=f'{sum(known) / len(known):.2f}' if known else '-')
@@ -0,0 +1,98 @@
+import copy
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+
+from app.availability import (Schedule, active_rentals, load_schedule,
+                              reserve_rental, schedule_cache)
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Machine, RentOrder, User
+from app.views import MachinesAvailabilityView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BenchmarkCommand):
+    help = 'Time rental overlap checks, next-free searches and the bulk availability page.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--bookings', type=int, default=5000, help='bookings of the busiest machine')
+        parser.add_argument('--machines', type=int, default=1000)
+
+    def benchmark(self, *args, **options):
+        owner = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        Machine.objects.bulk_create([
+            Machine(owner=owner, name=f'Tractor {i}', description='', rent_price=100, for_rent=True, quantity=3)
+            for i in range(options['machines'])
+        ])
+        machines = list(Machine.objects.order_by('pk'))
+        busiest = machines[0]
+
+        today = timezone.localdate()
+        day = datetime.timedelta(days=1)
+        bookings = []
+        # All three units booked in staggered, overlapping runs, with a one-day gap every 150 bookings.
+        for i in range(options['bookings']):
+            start = today + (i // 3) * 2 * day + (i % 3) * day + (i // 150) * day
+            bookings.append(RentOrder(customer=farmer, machine=busiest, num_of_days=3, start_date=start,
+                                      end_date=start + 3 * day))
+        for i, machine in enumerate(machines[1:]):
+            start = today + (i % 30) * day
+            bookings += [RentOrder(customer=farmer, machine=machine, num_of_days=5, start_date=start,
+                                   end_date=start + 5 * day) for _ in range(i % 4)]
+        RentOrder.objects.bulk_create(bookings, batch_size=2000)
+
+        start, end = today + 400 * day, today + 407 * day
+        repeat = options['repeat']
+
+        def sweep():
+            # What a check costs without the index: fetch the overlapping bookings and count day by day.
+            intervals = list(active_rentals().filter(machine=busiest, start_date__lt=end, end_date__gt=start)
+                             .values_list('start_date', 'end_date'))
+            return max(sum(1 for a, b in intervals if a <= start + i * day < b) for i in range((end - start).days))
+
+        self.report('overlap query + sweep', us=f'{measure(sweep, repeat)[0] * 1e6:.1f}',
+                    queries=measure(sweep, 1)[1])
+
+        schedule_cache.clear()
+        seconds, queries = measure(lambda: (schedule_cache.clear(), load_schedule(busiest.pk, 0)), repeat)
+        schedule = load_schedule(busiest.pk, 0)
+        self.report('schedule build', ms=f'{seconds * 1e3:.2f}', queries=queries, steps=len(schedule))
+        seconds, _ = measure(lambda: copy.copy(schedule).add(start, end), repeat)
+        self.report('schedule add booking', ms=f'{seconds * 1e3:.2f}', queries=0)
+        seconds, _ = measure(lambda: schedule.booked(start, end), repeat * 100)
+        self.report('schedule overlap check', us=f'{seconds * 1e6:.2f}', queries=0)
+        seconds, _ = measure(lambda: schedule.next_free(today, 7, busiest.quantity), repeat)
+        self.report('next free 7 days from today', us=f'{seconds * 1e6:.1f}',
+                    found=schedule.next_free(today, 7, busiest.quantity))
+
+        def book():
+            # Checked and rolled back, so every run sees the same bookings.
+            try:
+                with transaction.atomic():
+                    reserve_rental(busiest.pk, start, end)
+                    raise Rollback
+            except (Rollback, ValidationError):
+                pass
+
+        seconds, queries = measure(book, repeat)
+        self.report('reserve_rental (warm)', us=f'{seconds * 1e6:.1f}', queries=queries)
+
+        view = MachinesAvailabilityView.as_view()
+        path = f'/?start={start}&end={end}&page_size=200'
+        seconds, queries = measure(lambda: call_view(view, path, user=farmer), repeat)
+        self.report('bulk availability page=200', ms=f'{seconds * 1e3:.2f}', queries=queries)
+
+        def per_machine():
+            for machine in machines[:200]:
+                Schedule(active_rentals().filter(machine=machine, start_date__lt=end, end_date__gt=start)
+                         .values_list('start_date', 'end_date')).booked(start, end)
+
+        seconds, queries = measure(per_machine, repeat)
+        self.report('per-machine checks x200', ms=f'{seconds * 1e3:.2f}', queries=queries)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.db import connection
+
+from app.management.benchmark import BenchmarkCommand, call_view
+from app.models import Machine, Order, User
+from app.views import OrdersView
+
+
+class Command(BenchmarkCommand):
+    help = 'Place concurrent orders on one machine and check that stock is never oversold.'
+    threaded = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--buyers', type=int, default=100)
+        parser.add_argument('--stock', type=int, default=50)
+        parser.add_argument('--orders-per-buyer', type=int, default=3)
+
+    def benchmark(self, *args, **options):
+        seller = User.objects.create(username='seller', email='seller@example.com', is_industry=True)
+        User.objects.bulk_create(
+            User(username=f'buyer{i}', email=f'buyer{i}@example.com') for i in range(options['buyers']))
+        buyers = list(User.objects.filter(is_industry=False))
+        machine = Machine.objects.create(owner=seller, name='Tractor', description='Hot item', quantity=options['stock'])
+
+        view = OrdersView.as_view()
+        results = {'accepted': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(buyers))
+
+        def buy(buyer):
+            barrier.wait()
+            for _ in range(options['orders_per_buyer']):
+                try:
+                    response = call_view(view, '/api/orders/', 'post', buyer, {'machine': machine.pk, 'quantity': 1})
+                    outcome = 'accepted' if response.status_code == 201 else 'rejected'
+                except Exception:
+                    outcome = 'errors'
+                with lock:
+                    results[outcome] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=buy, args=(buyer,)) for buyer in buyers]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        machine.refresh_from_db()
+        ordered = sum(Order.objects.filter(machine=machine).values_list('quantity', flat=True))
+        attempts = sum(results.values())
+        self.report('concurrent orders', buyers=len(buyers), attempts=attempts, **results)
+        self.report('throughput', orders_per_s=f'{attempts / elapsed:.0f}', elapsed_s=f'{elapsed:.2f}')
+        self.report('stock', initial=options['stock'], ordered=ordered, remaining=machine.quantity,
+                    oversold=max(0, ordered - options['stock']))
@@ -0,0 +1,36 @@
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Residue, ResidueOrder, User
+from app.views import ResiduesView
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure GET /api/residues/ latency as residue order history grows.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--available', type=int, default=100)
+
+    def benchmark(self, *args, **options):
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password', location='Ludhiana')
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        Residue.objects.bulk_create(Residue(owner=farmer) for _ in range(options['available']))
+
+        view = ResiduesView.as_view()
+        seeded = 0
+        for size in sorted(options['sizes']):
+            self.seed_history(farmer, industry, size - seeded)
+            seeded = size
+
+            seconds, queries = measure(lambda: call_view(view, '/api/residues/', user=industry), options['repeat'])
+            self.report(f'{size} residue orders', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+
+    def seed_history(self, farmer, industry, count, batch_size=5000):
+        while count > 0:
+            batch = min(count, batch_size)
+            last_id = Residue.objects.order_by('-pk').values_list('pk', flat=True).first()
+            Residue.objects.bulk_create(Residue(owner=farmer, is_sold=True) for _ in range(batch))
+            sold = Residue.objects.filter(pk__gt=last_id).values_list('pk', flat=True)
+            ResidueOrder.objects.bulk_create(
+                ResidueOrder(customer=industry, residue_id=pk, status=ResidueOrder.ACCEPTED) for pk in sold)
+            count -= batch
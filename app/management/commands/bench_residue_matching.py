@@ -0,0 +1,115 @@
+import hashlib
+import random
+import time
+
+from app.management.benchmark import BenchmarkCommand
+from app.models import Residue, ResidueBid, ResidueOrder, User
+from app.order_book import Ask, Bid, OrderBook
+
+
+def generate_events(seed, count):
+    """
+    A reproducible stream of order book events for one residue type: new
+    lots and bids, repricing of either side (most events) and cancellations.
+    """
+    rng = random.Random(seed)
+    events = []
+    asks, bids = [], []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15 or not asks:
+            asks.append(i)
+            events.append(('ask', i, rng.randint(1, 50), rng.randint(50, 150), rng.randint(1, 20)))
+        elif roll < 0.25 or not bids:
+            bids.append(i)
+            events.append(('bid', i, rng.randint(51, 60), rng.randint(40, 140), rng.randint(5, 100)))
+        elif roll < 0.6:
+            events.append(('reprice ask', rng.choice(asks), rng.randint(50, 150)))
+        elif roll < 0.95:
+            events.append(('reprice bid', rng.choice(bids), rng.randint(40, 140)))
+        else:
+            events.append(('cancel ask', asks.pop(rng.randrange(len(asks)))))
+    return events
+
+
+def replay(events):
+    """Apply events to a fresh OrderBook, returning (seconds, matches)."""
+    book = OrderBook()
+    matches = []
+    start = time.perf_counter()
+    for event in events:
+        kind, key = event[0], event[1]
+        if kind == 'ask':
+            matches += book.add_ask(Ask(key, event[2], event[3], event[4]))
+        elif kind == 'bid':
+            matches += book.add_bid(Bid(key, event[2], event[3], event[4]))
+        elif kind == 'reprice ask' and key in book.asks:
+            ask = book.asks[key]
+            matches += book.add_ask(Ask(key, ask.owner_id, event[2], ask.quantity))
+        elif kind == 'reprice bid' and key in book.bids:
+            bid = book.bids[key]
+            matches += book.add_bid(Bid(key, bid.buyer_id, event[2], bid.remaining))
+        elif kind == 'cancel ask':
+            book.remove_ask(key)
+    return time.perf_counter() - start, matches
+
+
+class Command(BenchmarkCommand):
+    help = 'Replay a seeded stream of residue bids and lots through the order book and the database-backed engine.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--events', type=int, default=100000)
+        parser.add_argument('--db-events', type=int, default=1000)
+
+    def benchmark(self, *args, **options):
+        events = generate_events(options['seed'], options['events'])
+        digests = set()
+        for _ in range(2):
+            seconds, matches = replay(events)
+            digests.add(hashlib.sha1(repr(matches).encode()).hexdigest()[:12])
+        self.report(
+            'order book replay', events=len(events), events_per_s=f'{len(events) / seconds:,.0f}',
+            matches=len(matches), digest='/'.join(sorted(digests)))
+        if len(digests) != 1:
+            self.stderr.write('Replays of the same events produced different matches.')
+
+        events = generate_events(options['seed'], options['db_events'])
+        matches = self.replay_database(events)
+        if matches != len(replay(events)[1]):
+            self.stderr.write('The database-backed engine matched differently from the order book.')
+
+    def replay_database(self, events):
+        """The same kind of stream through the models, so every event locks, matches and records in a transaction."""
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(50)]
+        buyers = [User.objects.create_user(f'industry{i}', f'industry{i}@example.com', 'password', is_industry=True)
+                  for i in range(10)]
+        residues, bids = {}, {}
+
+        start = time.perf_counter()
+        for event in events:
+            kind, key = event[0], event[1]
+            if kind == 'ask':
+                residues[key] = Residue.objects.create(
+                    owner=farmers[event[2] % len(farmers)], type_of_residue=Residue.RICE_STRAW, price=event[3],
+                    quantity=event[4])
+            elif kind == 'bid':
+                bids[key] = ResidueBid.objects.create(
+                    buyer=buyers[event[2] % len(buyers)], type_of_residue=Residue.RICE_STRAW, max_price=event[3],
+                    quantity=event[4], remaining=event[4])
+            elif kind == 'reprice ask':
+                residues[key].price = event[2]
+                residues[key].save()
+            elif kind == 'reprice bid':
+                bids[key].max_price = event[2]
+                bids[key].save(update_fields=['max_price'])
+            elif kind == 'cancel ask' and not residues[key].residueorder_set.exists():
+                # Matched lots stay, as in replay(), where they are no longer in the book.
+                residues.pop(key).delete()
+        seconds = time.perf_counter() - start
+
+        matches = ResidueOrder.objects.count()
+        self.report('database-backed replay', events=len(events), events_per_s=f'{len(events) / seconds:,.0f}',
+                    matches=matches)
+        return matches
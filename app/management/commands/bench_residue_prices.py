@@ -0,0 +1,77 @@
+import datetime
+import random
+
+from django.utils import timezone
+
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Residue, ResidueOrder, User
+from app.rollups import Stats, rebuild
+from app.views import ResiduePricesView
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure residue price statistics from rollups against a scan of the lots as history grows.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--history-days', type=int, default=730)
+
+    def benchmark(self, *args, **options):
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password', location=location)
+                   for i, location in enumerate(['Ludhiana', 'Amritsar', 'Karnal', 'Chennai'])]
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        rng = random.Random(0)
+        view = ResiduePricesView.as_view()
+        path = '/?type=Rice Straw&days=30'
+        since = timezone.now() - datetime.timedelta(days=30)
+
+        def scan():
+            # What answering costs without rollups: every lot and sale of the window, aggregated in Python.
+            stats = Stats()
+            for price, quantity in Residue.objects.filter(type_of_residue=Residue.RICE_STRAW, created_at__gte=since) \
+                    .values_list('price', 'quantity'):
+                stats.add(price, quantity)
+            return stats.summary()
+
+        seeded = 0
+        for size in sorted(options['sizes']):
+            self.seed(farmers, industry, size - seeded, options['history_days'], rng)
+            seeded = size
+
+            start = timezone.now()
+            rows = rebuild()
+            rebuild_seconds = (timezone.now() - start).total_seconds()
+
+            seconds, queries = measure(lambda: call_view(view, path, user=industry), options['repeat'])
+            self.report(f'{size} lots, rollups', median_ms=f'{seconds * 1000:.2f}', queries=queries, rows=rows,
+                        rebuild_s=f'{rebuild_seconds:.1f}')
+            seconds, queries = measure(scan, options['repeat'])
+            self.report(f'{size} lots, scan', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+
+            def write():
+                Residue.objects.create(owner=farmers[0], type_of_residue=Residue.RICE_STRAW, price=100, quantity=5)
+
+            seconds, queries = measure(write, options['repeat'])
+            self.report(f'{size} lots, listing a lot', median_ms=f'{seconds * 1000:.2f}', queries=queries)
+
+    def seed(self, farmers, industry, count, history_days, rng, batch_size=5000):
+        now = timezone.now()
+        regions = {farmer.pk: region for farmer, region in zip(farmers, ['Punjab', 'Punjab', 'Haryana', 'Tamil Nadu'])}
+        while count > 0:
+            batch = min(count, batch_size)
+            last_id = Residue.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            lots = []
+            for _ in range(batch):
+                owner = rng.choice(farmers)
+                lots.append(Residue(
+                    owner=owner, region=regions[owner.pk], type_of_residue=rng.choice(Residue.CHOICES)[0],
+                    price=rng.randint(50, 500), quantity=rng.randint(1, 50),
+                    created_at=now - datetime.timedelta(minutes=rng.randint(0, history_days * 24 * 60))))
+            Residue.objects.bulk_create(lots)
+            sold = Residue.objects.filter(pk__gt=last_id).values_list('pk', 'created_at')[:batch // 3]
+            ResidueOrder.objects.bulk_create(
+                ResidueOrder(customer=industry, residue_id=pk, status=ResidueOrder.ACCEPTED,
+                             accepted_at=created_at + datetime.timedelta(days=1))
+                for pk, created_at in sold)
+            count -= batch
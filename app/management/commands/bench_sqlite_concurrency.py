@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import Machine, Order, User
+from app.sqlite import is_locked
+from app.views import DashboardView, OrderDetailView, OrdersView
+
+# What the database behaved like before app.sqlite: Django's sqlite3 backend
+# with SQLite's and Python's defaults.
+STOCK_PROFILE = {
+    'JOURNAL_MODE': 'delete',
+    'SYNCHRONOUS': 'full',
+    'BUSY_TIMEOUT': 5000,
+    'MMAP_SIZE': 0,
+    'CACHE_SIZE': -2000,
+    'TEMP_STORE': 'default',
+    'IMMEDIATE_TRANSACTIONS': False,
+    'RETRIES': 0,
+}
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Run order readers and writers in threads against an SQLite file with the stock settings and with '
+        'settings.SQLITE, reporting throughput and "database is locked" errors.'
+    )
+    threaded = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def benchmark(self, *args, **options):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(20)]
+        Machine.objects.bulk_create(
+            Machine(owner=industry, name=f'Machine {i}', description='', details={}, quantity=10 ** 6,
+                    sell_price=1000) for i in range(20))
+        machines = list(Machine.objects.values_list('pk', flat=True))
+        Order.objects.bulk_create(
+            Order(customer=farmers[i % len(farmers)], machine_id=machines[i % len(machines)]) for i in range(2000))
+
+        for label, profile in [('stock', STOCK_PROFILE), ('tuned', {})]:
+            with override_settings(SQLITE=profile):
+                # Journal mode changes need the only connection, and every new one gets the profile.
+                connections.close_all()
+                seconds, _ = measure(lambda: (connection.close(), connection.ensure_connection()), options['repeat'])
+                self.report(f'{label}: new connection', median_ms=f'{seconds * 1000:.2f}')
+                self.run_workload(label, industry, farmers, machines, options)
+                connections.close_all()
+
+    def run_workload(self, label, industry, farmers, machines, options):
+        counts = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def tally(key):
+            with lock:
+                counts[key] += 1
+
+        def worker(step):
+            try:
+                i = 0
+                while time.perf_counter() < deadline:
+                    try:
+                        tally(step(i))
+                    except Exception as error:
+                        tally('locked' if is_locked(error) else 'errors')
+                    i += 1
+            finally:
+                connection.close()
+
+        def read(i):
+            view = OrdersView.as_view() if i % 2 else DashboardView.as_view()
+            response = call_view(view, user=industry, data={'status': Order.PENDING} if i % 2 else None)
+            return 'reads' if response.status_code == 200 else 'errors'
+
+        def write(i):
+            # Placing an order, then its seller accepting or rejecting it: both read before they write.
+            farmer = farmers[i % len(farmers)]
+            response = call_view(OrdersView.as_view(), method='post', user=farmer,
+                                 data={'machine': machines[i % len(machines)], 'quantity': 1})
+            if response.status_code != 201:
+                return 'errors'
+            response = call_view(OrderDetailView.as_view(), method='patch', user=industry,
+                                 data={'status': Order.ACCEPTED if i % 2 else Order.REJECTED},
+                                 view_kwargs={'pk': response.data['id']})
+            return 'writes' if response.status_code == 200 else 'errors'
+
+        threads = [threading.Thread(target=worker, args=(read,)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(write,)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['seconds']
+        attempts = counts['writes'] + counts['locked']
+        self.report(
+            f'{label}: mixed load', reads_per_s=f'{counts["reads"] / seconds:.0f}',
+            writes_per_s=f'{counts["writes"] / seconds:.0f}', locked=counts['locked'],
+            locked_rate=f'{counts["locked"] / attempts:.1%}' if attempts else '-', other_errors=counts['errors'])
@@ -0,0 +1,185 @@
+import datetime
+import re
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app.dashboard import reconcile
+from app.management.benchmark import BenchmarkCommand, call_view, measure
+from app.models import (CartItem, Connection, Machine, Order, RentOrder,
+                        Residue, ResidueOrder, User)
+from app.views import (CartView, Connections, DashboardView, MachinesView,
+                       OrdersView, RentOrdersView, ResidueOrdersView,
+                       ResiduesView)
+
+# The schema before the composite index suite, migrated back to for the "before" timings.
+BASELINE_MIGRATION = '0031_order_counters'
+
+# A plan step that walks a whole table, "SCAN app_order", or a whole index,
+# "SCAN app_order USING [COVERING] INDEX <name>". Walking a partial index
+# only visits the rows the query asks for, so those are allowed.
+SCAN = re.compile(r'\bSCAN (app_\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def partial_indexes():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        return {name for name, in cursor.fetchall()}
+
+
+def full_scans(plan, partial):
+    scans = []
+    for line in plan:
+        match = SCAN.search(line)
+        if match and match.group(2) not in partial:
+            scans.append(line)
+    return scans
+
+
+def query_plans(func):
+    """Run `func` and return [(sql, plan lines)] for every SELECT it issued."""
+    # Once the bounded query log is full its length stops changing, and the
+    # context would capture nothing.
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+
+    plans = []
+    with connection.cursor() as cursor:
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+    return plans
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Capture EXPLAIN QUERY PLAN for the queries of the hot list endpoints on a large seeded dataset, fail '
+        'when one scans a whole table, and time the endpoints with and without the composite indexes. '
+        'app.tests.QueryPlanTests checks the plans on a small dataset in the test suite.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--no-baseline', action='store_true', help='Skip the timings without the indexes.')
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def benchmark(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plans are only checked on SQLite.')
+
+        industry, farmer = self.seed(options['rows'])
+        endpoints = {
+            'machines for sale (farmer)': (MachinesView.as_view(), farmer, {'for_sale': 'true'}),
+            'machines for rent (farmer)': (MachinesView.as_view(), farmer, {'for_rent': 'true'}),
+            'own machines (industry)': (MachinesView.as_view(), industry, {}),
+            'orders (industry)': (OrdersView.as_view(), industry, {'status': Order.PENDING}),
+            'orders (farmer)': (OrdersView.as_view(), farmer, {'status': Order.ACCEPTED}),
+            'rent orders (industry)': (RentOrdersView.as_view(), industry, {'status': RentOrder.PENDING}),
+            'residues (industry)': (ResiduesView.as_view(), industry, {'type_of_residue': Residue.RICE_HUSK}),
+            'residues (farmer)': (ResiduesView.as_view(), farmer, {}),
+            'residue orders (farmer)': (ResidueOrdersView.as_view(), farmer, {'status': ResidueOrder.PENDING}),
+            'cart (farmer)': (CartView.as_view(), farmer, {}),
+            'connections (farmer)': (Connections.as_view(), farmer, {}),
+            'dashboard (industry)': (DashboardView.as_view(), industry, {}),
+        }
+
+        # The baseline goes first: migrating rebuilds the altered tables, so
+        # both sets of timings run against freshly copied tables.
+        baselines = {}
+        if not options['no_baseline']:
+            call_command('migrate', 'app', BASELINE_MIGRATION, verbosity=0)
+            try:
+                for name, (view, user, data) in endpoints.items():
+                    statements = [sql for sql, _ in query_plans(lambda: call_view(view, user=user, data=data))]
+                    baselines[name] = self.time_endpoint(view, user, data, statements, options['repeat'])
+            finally:
+                call_command('migrate', 'app', verbosity=0)
+
+        failures = []
+        timings = {}
+        partial = partial_indexes()
+        for name, (view, user, data) in endpoints.items():
+            plans = query_plans(lambda: call_view(view, user=user, data=data))
+            for sql, plan in plans:
+                scans = full_scans(plan, partial)
+                if scans:
+                    failures.append(f'{name}: {"; ".join(scans)}')
+                if options['verbose_plans'] or scans:
+                    self.stdout.write(f'{name}: {sql}')
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+
+            timings[name] = self.time_endpoint(view, user, data, [sql for sql, _ in plans], options['repeat'])
+            if name in baselines:
+                timings[name].update({f'{key}_without_indexes': value for key, value in baselines[name].items()})
+
+        for name in endpoints:
+            self.report(name, **timings[name])
+
+        if failures:
+            raise CommandError('Full table scans: ' + ' | '.join(failures))
+
+    def time_endpoint(self, view, user, data, statements, repeat):
+        """Median milliseconds of a whole request and of its SQL statements alone."""
+        def run_statements():
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+                    cursor.fetchall()
+
+        request_seconds, _ = measure(lambda: call_view(view, user=user, data=data), repeat)
+        sql_seconds, _ = measure(run_statements, repeat)
+        return {'request_ms': f'{request_seconds * 1000:.2f}', 'sql_ms': f'{sql_seconds * 1000:.2f}'}
+
+    def seed(self, rows):
+        """
+        A marketplace of `rows` orders of each kind spread over many users,
+        so a user's slice is small and a scan costs far more than a search.
+        Returns the (industry user, farmer) the endpoints are called as.
+        """
+        industries = [User.objects.create_user(f'industry{i}', f'industry{i}@example.com', 'password',
+                                               is_industry=True) for i in range(20)]
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password') for i in range(200)]
+        Machine.objects.bulk_create(
+            Machine(owner=industries[i % len(industries)], name=f'Machine {i}', description='', details={},
+                    for_sale=i % 3 != 0, for_rent=i % 3 == 0, sell_price=1000, rent_price=50)
+            for i in range(rows // 10))
+        Machine.objects.bulk_create(
+            Machine(owner=farmers[i % len(farmers)], name=f'Rental {i}', description='', details={},
+                    for_sale=False, for_rent=True, rent_price=40)
+            for i in range(rows // 10))
+        machines = list(Machine.objects.values_list('pk', flat=True))
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        start_date = datetime.date(2026, 1, 1)
+
+        Order.objects.bulk_create(
+            (Order(customer=farmers[i % len(farmers)], machine_id=machines[i % len(machines)],
+                   status=statuses[i % len(statuses)], quantity=1 + i % 3) for i in range(rows)), batch_size=5000)
+        RentOrder.objects.bulk_create(
+            (RentOrder(customer=farmers[i % len(farmers)], machine_id=machines[i % len(machines)],
+                       status=statuses[i % len(statuses)], num_of_days=1 + i % 5,
+                       start_date=start_date, end_date=start_date + datetime.timedelta(days=1 + i % 5))
+             for i in range(rows)), batch_size=5000)
+        Residue.objects.bulk_create(
+            (Residue(owner=farmers[i % len(farmers)], type_of_residue=Residue.CHOICES[i % len(Residue.CHOICES)][0],
+                     price=100, quantity=1 + i % 9, is_sold=i % 4 == 0) for i in range(rows)), batch_size=5000)
+        ResidueOrder.objects.bulk_create(
+            (ResidueOrder(customer=industries[i % len(industries)], residue_id=residue_id,
+                          status=statuses[i % len(statuses)])
+             for i, residue_id in enumerate(Residue.objects.values_list('pk', flat=True).iterator())),
+            batch_size=5000)
+        for farmer in farmers:
+            CartItem.objects.bulk_create(
+                CartItem(cart=farmer.cart, machine_id=machines[(farmer.pk * 7 + i) % len(machines)]) for i in range(10))
+        Connection.objects.bulk_create(
+            Connection(user=farmer, peer=industry, source=Connection.ORDER, role=Connection.BUYER, count=1)
+            for farmer in farmers for industry in industries)
+        reconcile(fix=True)
+        return industries[0], farmers[0]
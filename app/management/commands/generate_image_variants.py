@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.images import generate_variants
+from app.models import Machine
+
+
+class Command(BaseCommand):
+    help = 'Generate resized and WebP variants for existing machine images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only machines without variants.')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        machines = Machine.objects.exclude(image='')
+        if options['missing']:
+            machines = machines.filter(image_variants={})
+        machine_ids = list(machines.values_list('pk', flat=True))
+
+        def generate(machine_id):
+            try:
+                generate_variants(machine_id)
+                return None
+            except Exception as error:
+                return f'machine {machine_id}: {error}'
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            errors = [error for error in executor.map(generate, machine_ids) if error]
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {len(machine_ids) - len(errors)} of {len(machine_ids)} machines.'))
@@ -0,0 +1,42 @@
+import json
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog_import import FORMATS, CatalogImport, detect_format
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import machines for an industry seller from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('owner', help='Username of the industry seller.')
+        parser.add_argument('file')
+        parser.add_argument('--images', help='Zip archive with the files named in the image column.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options['owner'], is_industry=True).first()
+        if owner is None:
+            raise CommandError(f'No industry user named {options["owner"]}.')
+
+        file_format = options['format'] or detect_format(options['file'])
+        if file_format is None:
+            raise CommandError('Could not tell the format from the file name, pass --format.')
+
+        try:
+            catalog_import = CatalogImport(owner, images=options['images'], chunk_size=options['chunk_size'])
+        except (OSError, zipfile.BadZipFile) as error:
+            raise CommandError(f'Could not open the image archive: {error}')
+
+        with open(options['file'], 'rb') as stream:
+            summary = catalog_import.run(stream, file_format)
+
+        for error in summary['errors']:
+            self.stderr.write(f'line {error["line"]}: {json.dumps(error["errors"])}')
+        if summary['errors_truncated']:
+            self.stderr.write(f'... {summary["failed"] - len(summary["errors"])} more rows failed.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {summary["created"]} machines, {summary["failed"]} rows failed.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from app.models import Connection, Order, RentOrder, ResidueOrder
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the connection edge table from accepted orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        sources = [
+            (Connection.ORDER, Order.objects.filter(status=Order.ACCEPTED), 'machine__owner'),
+            (Connection.RENT_ORDER, RentOrder.objects.filter(status=RentOrder.ACCEPTED), 'machine__owner'),
+            (Connection.RESIDUE_ORDER, ResidueOrder.objects.filter(status=ResidueOrder.ACCEPTED), 'residue__owner'),
+        ]
+
+        edges = []
+        for source, orders, seller in sources:
+            pairs = orders.values(seller, 'customer').annotate(count=Count('id')).order_by()
+            for pair in pairs.iterator():
+                seller_id, buyer_id, count = pair[seller], pair['customer'], pair['count']
+                edges.append(Connection(user_id=seller_id, peer_id=buyer_id, source=source, role=Connection.SELLER, count=count))
+                edges.append(Connection(user_id=buyer_id, peer_id=seller_id, source=source, role=Connection.BUYER, count=count))
+
+        with transaction.atomic():
+            Connection.objects.all().delete()
+            Connection.objects.bulk_create(edges, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(edges)} connection edges.'))
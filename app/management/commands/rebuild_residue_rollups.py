@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the residue price rollup table from residue lots and accepted residue orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} residue price rollups.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.dashboard import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Check the dashboard order counters against the orders, and with --fix correct the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        drifts = reconcile(fix=options['fix'])
+        for (user_id, source, status), stored, expected in drifts:
+            self.stdout.write(f'user {user_id} {source} {status}: counted {stored}, expected {expected}')
+
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS('All order counters match the orders.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {len(drifts)} order counters.'))
+        else:
+            raise CommandError(f'{len(drifts)} order counters drifted; run with --fix to correct them.')
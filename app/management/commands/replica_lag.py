@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.replicas import max_lag, replica_aliases, replica_lag
+
+
+class Command(BaseCommand):
+    help = 'Report how many seconds each read replica trails the primary, and fail when one is past READ_REPLICAS["MAX_LAG"].'
+
+    def handle(self, *args, **options):
+        limit = max_lag()
+        behind = []
+        for alias in replica_aliases():
+            lag = replica_lag(alias)
+            if lag is None:
+                self.stdout.write(f'{alias}: no heartbeat')
+                behind.append(alias)
+                continue
+            self.stdout.write(f'{alias}: {lag:.2f}s behind')
+            if lag > limit:
+                behind.append(alias)
+
+        if behind:
+            raise CommandError(f'Reads skip {", ".join(behind)}: lag unknown or over {limit}s.')
+        self.stdout.write(self.style.SUCCESS('All replicas serve reads.'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.replicas import replica_aliases, replicate
+
+
+class Command(BaseCommand):
+    help = (
+        'Stand-in for replication on SQLite: copy the primary database into the replica databases, once or every '
+        '--interval seconds, writing the heartbeat their lag is measured by.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replica aliases; READ_REPLICAS["ALIASES"] by default.')
+        parser.add_argument('--interval', type=float, default=0, help='Seconds between copies; 0 copies once.')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replica_aliases()
+        if not aliases:
+            raise CommandError('No replicas configured in READ_REPLICAS["ALIASES"].')
+
+        while True:
+            for alias in aliases:
+                start = time.perf_counter()
+                replicate(alias)
+                self.stdout.write(f'{alias}: copied in {(time.perf_counter() - start) * 1000:.1f}ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,180 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Least
+
+from app.order_book import Ask, Bid, OrderBook
+
+# Each process keeps its own copy of the books, by residue type, tagged with
+# the ResidueBook version they reflect. Changes lock the type's ResidueBook
+# row, reload the book if another process changed it since, and apply the
+# change and its matches in the same transaction.
+books = {}
+_lock = threading.RLock()
+
+
+def _point(latitude, longitude):
+    return None if latitude is None or longitude is None else (latitude, longitude)
+
+
+def _lots(type_of_residue):
+    """Lots of a type in the book: unsold, with no pending or accepted order."""
+    from app.models import Residue, ResidueOrder
+
+    claims = ResidueOrder.objects.filter(residue=OuterRef('pk'), status__in=ResidueOrder.ACTIVE_STATUSES)
+    return Residue.objects.filter(type_of_residue=type_of_residue, is_sold=False).exclude(Exists(claims))
+
+
+def _ask(row):
+    residue_id, owner_id, price, quantity, latitude, longitude = row
+    return Ask(residue_id, owner_id, price, quantity, _point(latitude, longitude))
+
+
+def _bid(row):
+    bid_id, buyer_id, max_price, remaining, latitude, longitude, radius_km = row
+    return Bid(bid_id, buyer_id, max_price, remaining, _point(latitude, longitude), radius_km)
+
+
+ASK_FIELDS = ['pk', 'owner_id', 'price', 'quantity', 'owner__latitude', 'owner__longitude']
+BID_FIELDS = ['pk', 'buyer_id', 'max_price', 'remaining', 'latitude', 'longitude', 'radius_km']
+
+
+def load_book(type_of_residue):
+    """Build a residue type's book from the database, without matching anything."""
+    from app.models import ResidueBid, ResidueOrder
+
+    book = OrderBook()
+    for row in _lots(type_of_residue).values_list(*ASK_FIELDS):
+        book.add_ask(_ask(row), match=False)
+    for row in ResidueBid.objects.filter(type_of_residue=type_of_residue, remaining__gt=0).values_list(*BID_FIELDS):
+        book.add_bid(_bid(row), match=False)
+    declined = ResidueOrder.objects.filter(bid__type_of_residue=type_of_residue, status=ResidueOrder.REJECTED)
+    book.declined.update(declined.values_list('bid_id', 'residue_id'))
+    return book
+
+
+def _book_for_update(type_of_residue):
+    """
+    Lock a residue type's book for the current transaction and return this
+    process's copy, reloaded if it is behind. The copy is marked stale until
+    the transaction commits, so a rollback makes the next change reload it.
+    """
+    from app.models import ResidueBook
+
+    version = ResidueBook.lock(type_of_residue)
+    with _lock:
+        book = books.get(type_of_residue)
+    if book is None or book.version != version - 1:
+        book = load_book(type_of_residue)
+
+    with _lock:
+        book.version = None
+        books[type_of_residue] = book
+    transaction.on_commit(lambda: setattr(book, 'version', version))
+    return book
+
+
+def _record(matches):
+    """Place a ResidueOrder for every match and take the lot's quantity off its bid."""
+    from app.models import ResidueBid, ResidueOrder
+
+    for match in matches:
+        ResidueOrder.objects.create(customer_id=match.buyer_id, residue_id=match.residue_id, bid_id=match.bid_id)
+        ResidueBid.objects.filter(pk=match.bid_id).update(remaining=F('remaining') - match.quantity)
+
+
+def _sync_lot(book, residue_id, type_of_residue):
+    row = _lots(type_of_residue).filter(pk=residue_id).values_list(*ASK_FIELDS).first()
+    with _lock:
+        if row is None:
+            book.remove_ask(residue_id)
+            return []
+        return book.add_ask(_ask(row))
+
+
+def _sync_bid(book, bid_id, type_of_residue):
+    from app.models import ResidueBid
+
+    bids = ResidueBid.objects.filter(pk=bid_id, type_of_residue=type_of_residue, remaining__gt=0)
+    row = bids.values_list(*BID_FIELDS).first()
+    with _lock:
+        if row is None:
+            book.remove_bid(bid_id)
+            return []
+        return book.add_bid(_bid(row))
+
+
+def list_lot(residue_id, previous_type=None):
+    """Bring a residue lot's place in the book up to date after it changed, and match it."""
+    from app.models import Residue
+
+    with transaction.atomic():
+        type_of_residue = Residue.objects.filter(pk=residue_id).values_list('type_of_residue', flat=True).first()
+        if previous_type and previous_type != type_of_residue:
+            unlist_lot(residue_id, previous_type)
+        if type_of_residue is not None:
+            _record(_sync_lot(_book_for_update(type_of_residue), residue_id, type_of_residue))
+
+
+def unlist_lot(residue_id, type_of_residue):
+    with transaction.atomic():
+        book = _book_for_update(type_of_residue)
+        with _lock:
+            book.remove_ask(residue_id)
+
+
+def list_bid(bid_id):
+    """Bring a bid's place in the book up to date after it changed, and match it. Bids never change type."""
+    from app.models import ResidueBid
+
+    with transaction.atomic():
+        type_of_residue = ResidueBid.objects.filter(pk=bid_id).values_list('type_of_residue', flat=True).first()
+        if type_of_residue is not None:
+            _record(_sync_bid(_book_for_update(type_of_residue), bid_id, type_of_residue))
+
+
+def unlist_bid(bid_id, type_of_residue):
+    with transaction.atomic():
+        book = _book_for_update(type_of_residue)
+        with _lock:
+            book.remove_bid(bid_id)
+
+
+def release_match(residue_order):
+    """
+    Undo a match whose order the seller rejected: the bid gets the lot's
+    quantity back, the pair is never matched again, and both sides go back
+    in the book to be matched elsewhere.
+    """
+    from app.models import ResidueBid
+
+    residue = residue_order.residue
+    with transaction.atomic():
+        book = _book_for_update(residue.type_of_residue)
+        with _lock:
+            book.declined.add((residue_order.bid_id, residue.pk))
+        ResidueBid.objects.filter(pk=residue_order.bid_id).update(
+            remaining=Least(F('quantity'), F('remaining') + residue.quantity))
+        _record(_sync_bid(book, residue_order.bid_id, residue.type_of_residue))
+        _record(_sync_lot(book, residue.pk, residue.type_of_residue))
+
+
+def book_depth(type_of_residue, levels=10):
+    """Best price levels of a residue type's book, from this process's copy when it is current."""
+    from app.models import ResidueBook
+
+    version = ResidueBook.current_version(type_of_residue)
+    with _lock:
+        book = books.get(type_of_residue)
+        if book is not None and book.version == version:
+            return book.depth(levels)
+
+    # Read after the version, so the book is at least as new as it.
+    book = load_book(type_of_residue)
+    book.version = version
+    with _lock:
+        current = books.get(type_of_residue)
+        if current is None or current.version is not None:
+            books[type_of_residue] = book
+        return book.depth(levels)
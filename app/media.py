@@ -0,0 +1,148 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, StreamingHttpResponse)
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Uploaded files and their variants carry the first 12 hex digits of their
+# SHA-256 before the extension, so their content never changes under a URL.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _option(name, default):
+    return getattr(settings, 'MEDIA_SERVING', {}).get(name, default)
+
+
+def content_hash(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def hashed_name(name, digest):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{digest}{extension}'
+
+
+@deconstructible
+class ContentHashedUploadTo:
+    """`upload_to` that stores files under `directory` with their content hash in the name."""
+
+    def __init__(self, directory, field_name):
+        self.directory = directory
+        self.field_name = field_name
+
+    def __call__(self, instance, filename):
+        file = getattr(instance, self.field_name)
+        digest = content_hash(file.chunks())
+        file.seek(0)
+        return posixpath.join(self.directory, hashed_name(filename, digest))
+
+    def __eq__(self, other):
+        return isinstance(other, ContentHashedUploadTo) and \
+            (self.directory, self.field_name) == (other.directory, other.field_name)
+
+
+def cache_control(name):
+    if HASHED_NAME.search(name):
+        return f'public, max-age={_option("IMMUTABLE_MAX_AGE", 31536000)}, immutable'
+    return f'public, max-age={_option("MAX_AGE", 3600)}'
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single `bytes=` range, None when the header
+    should be ignored (missing or multi-range), or raise ValueError when it
+    cannot be satisfied.
+    """
+    match = RANGE.match(header or '')
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, path):
+    """
+    Serve a file below MEDIA_ROOT. Honors If-Modified-Since and single
+    byte ranges, sends long-lived immutable cache headers for content-hashed
+    names, and in 'x-sendfile' or 'x-accel-redirect' mode hands the transfer
+    off to the front-end server instead of streaming it from the worker.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    if not full_path.is_file():
+        raise Http404('File does not exist')
+
+    stat = full_path.stat()
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(str(full_path))[0] or 'application/octet-stream'
+    mode = _option('MODE', 'django')
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = str(full_path)
+    elif mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = _option('ACCEL_REDIRECT_PREFIX', '/protected-media/') + path
+    else:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        else:
+            response = FileResponse(full_path.open('rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    return response
+
+
+def media_urlpatterns():
+    """URL patterns serving MEDIA_URL with serve_media, the counterpart of static()."""
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    return [re_path(rf'^{prefix}(?P<path>.*)$', serve_media)]
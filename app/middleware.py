@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from app.replicas import checking_lag, pin_after_write, replica_aliases, replica_reads_allowed, routing
+
+logger = logging.getLogger('app.queries')
+
+
+# Statements that only delimit transactions and savepoints. How many run
+# depends on how atomic blocks nest, not on the data a request touches.
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def is_transaction_control(sql):
+    return sql.lstrip().upper().startswith(TRANSACTION_CONTROL)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that tallies the statements run during a request.
+    A statement counts as a duplicate when the same SQL text, ignoring
+    parameters, already ran earlier in the request. Transaction control
+    statements and replica lag checks are not tallied.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = ''
+        self.duplicates = 0
+        self._seen = set()
+        # Async views run the independent queries of a request in parallel threads.
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if is_transaction_control(sql) or checking_lag():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.count += 1
+                self.duration += elapsed
+                if elapsed >= self.slowest_duration:
+                    self.slowest_duration = elapsed
+                    self.slowest_sql = sql
+                if sql in self._seen:
+                    self.duplicates += 1
+                else:
+                    self._seen.add(sql)
+
+    def install(self, stack):
+        """Record the queries of every connection of the current thread until `stack` closes."""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records query count, database time, the slowest statement and duplicate
+    statements for a sample of requests. The numbers are sent back in a
+    Server-Timing header and logged on the `app.queries` logger. Views may
+    declare `query_budgets`, a mapping of HTTP method to the maximum number
+    of queries, which is enforced when QUERY_INSTRUMENTATION['ENFORCE_BUDGETS']
+    is set.
+
+    Under ASGI the middleware runs on the event loop and only sees the
+    queries that async views run through app.async_views.in_thread, which
+    picks up the recorder from `request.query_recorder`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'QUERY_INSTRUMENTATION', {})
+        if not options.get('ENABLED', True):
+            raise MiddlewareNotUsed()
+
+        self.sample_rate = options.get('SAMPLE_RATE', 1.0)
+        self.enforce_budgets = options.get('ENFORCE_BUDGETS', False)
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Marks the instance as a coroutine function for Django's handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            recorder.install(stack)
+            response = self.get_response(request)
+        return self.process_recorded(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        request.query_recorder = QueryRecorder()
+        response = await self.get_response(request)
+        return self.process_recorded(request, response, request.query_recorder)
+
+    def is_sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def process_recorded(self, request, response, recorder):
+        db_ms = recorder.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.2f};desc="{recorder.count} queries, {recorder.duplicates} duplicates", '
+            f'db-slowest;dur={recorder.slowest_duration * 1000:.2f}'
+        )
+        logger.info(
+            '%s %s %s queries=%d db_ms=%.2f duplicates=%d slowest_ms=%.2f',
+            request.method, request.path, response.status_code, recorder.count, db_ms,
+            recorder.duplicates, recorder.slowest_duration * 1000,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status_code': response.status_code,
+                'query_count': recorder.count,
+                'db_ms': db_ms,
+                'duplicate_queries': recorder.duplicates,
+                'slowest_sql': recorder.slowest_sql,
+            },
+        )
+
+        budget = getattr(request, 'query_budget', None)
+        if self.enforce_budgets and budget is not None and recorder.count > budget:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ran {recorder.count} queries, budget is {budget}')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budgets = getattr(view_class, 'query_budgets', {})
+        request.query_budget = budgets.get(request.method)
+
+
+class ReadReplicaMiddleware:
+    """
+    Lets the ORM reads of GET, HEAD and OPTIONS requests go to read replicas
+    through app.replicas.ReadReplicaRouter. A request that writes reads the
+    rest of its data from the primary. Its user, or its session or address
+    when it is anonymous, keeps reading from the primary for
+    app.replicas.pin_seconds() so its next requests see the write too. Not
+    used without replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not replica_aliases():
+            raise MiddlewareNotUsed()
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        with routing(replica_reads_allowed(request)) as state:
+            response = self.get_response(request)
+        pin_after_write(request, state)
+        return response
+
+    async def __acall__(self, request):
+        # The routing state reaches the threads of app.async_views.in_thread
+        # through the context copied by sync_to_async.
+        with routing(replica_reads_allowed(request)) as state:
+            response = await self.get_response(request)
+        pin_after_write(request, state)
+        return response
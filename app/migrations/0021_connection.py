@@ -0,0 +1,49 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_connections(apps, schema_editor):
+    Connection = apps.get_model('app', 'Connection')
+    sources = [
+        ('order', apps.get_model('app', 'Order'), 'machine__owner'),
+        ('rent_order', apps.get_model('app', 'RentOrder'), 'machine__owner'),
+        ('residue_order', apps.get_model('app', 'ResidueOrder'), 'residue__owner'),
+    ]
+
+    edges = []
+    for source, model, seller in sources:
+        pairs = model.objects.filter(status='accepted').values(seller, 'customer').annotate(count=models.Count('id')).order_by()
+        for pair in pairs:
+            seller_id, buyer_id, count = pair[seller], pair['customer'], pair['count']
+            edges.append(Connection(user_id=seller_id, peer_id=buyer_id, source=source, role='seller', count=count))
+            edges.append(Connection(user_id=buyer_id, peer_id=seller_id, source=source, role='buyer', count=count))
+    Connection.objects.bulk_create(edges, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_alter_residue_type_of_residue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Connection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('order', 'Order'), ('rent_order', 'Rent Order'), ('residue_order', 'Residue Order')], max_length=30)),
+                ('role', models.CharField(choices=[('seller', 'Seller'), ('buyer', 'Buyer')], max_length=30)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connection_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='connection',
+            constraint=models.UniqueConstraint(fields=('user', 'source', 'role', 'peer'), name='unique_connection_edge'),
+        ),
+        migrations.RunPython(backfill_connections, migrations.RunPython.noop),
+    ]
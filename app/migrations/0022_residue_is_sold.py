@@ -0,0 +1,24 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+def backfill_is_sold(apps, schema_editor):
+    Residue = apps.get_model('app', 'Residue')
+    Residue.objects.filter(residueorder__status='accepted').update(is_sold=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_connection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='residue',
+            name='is_sold',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_is_sold, migrations.RunPython.noop),
+    ]
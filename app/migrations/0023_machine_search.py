@@ -0,0 +1,42 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:29
+
+import app.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def install_search(apps, schema_editor):
+    app.search.install_machine_search(schema_editor.connection)
+    app.search.rebuild_machine_search(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in app.search.UNINSTALL_STATEMENTS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_residue_is_sold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MachineSearch',
+            fields=[
+                ('machine', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='app.machine')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('details', models.TextField(null=True)),
+                ('document', app.search.FullTextField(db_column='app_machine_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'app_machine_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
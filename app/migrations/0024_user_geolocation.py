@@ -0,0 +1,43 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+from app.geo import geocode, grid_cell
+
+
+def geocode_users(apps, schema_editor):
+    User = apps.get_model('app', 'User')
+    users = []
+    for user in User.objects.only('pk', 'location').iterator():
+        point = geocode(user.location)
+        if point:
+            user.latitude, user.longitude = point
+            user.grid_cell = grid_cell(*point)
+            users.append(user)
+    User.objects.bulk_update(users, ['latitude', 'longitude', 'grid_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0023_machine_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocode_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0025_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:36
+
+import app.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0026_machine_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='machine',
+            name='image',
+            field=models.ImageField(upload_to=app.media.ContentHashedUploadTo('machine_images/', 'image')),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.9 on 2026-10-18 03:12
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+
+def backfill_dates(apps, schema_editor):
+    RentOrder = apps.get_model('app', 'RentOrder')
+    Machine = apps.get_model('app', 'Machine')
+    # Rent orders had no dates, and updated_at was overwritten by migration
+    # 0025, so there is nothing to place them by. They are backfilled as
+    # rentals that ended today, which availability leaves out.
+    today = timezone.localdate()
+    for num_of_days in RentOrder.objects.values_list('num_of_days', flat=True).distinct():
+        RentOrder.objects.filter(num_of_days=num_of_days).update(
+            start_date=today - datetime.timedelta(days=num_of_days), end_date=today)
+
+    # Rentals used to take a unit off the machine's quantity; now they have ended, the units go back.
+    active = Count('rentorder', filter=Q(rentorder__status__in=['pending', 'accepted']))
+    for machine_id, booked in Machine.objects.annotate(booked=active).filter(booked__gt=0).values_list('pk', 'booked'):
+        Machine.objects.filter(pk=machine_id).update(quantity=F('quantity') + booked)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0027_machine_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='rental_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rentorder',
+            name='start_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='rentorder',
+            name='end_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(backfill_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='rentorder',
+            name='start_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='rentorder',
+            name='end_date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='rentorder',
+            index=models.Index(fields=['machine', 'end_date'], name='app_rentord_machine_983767_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.9 on 2026-10-18 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_books(apps, schema_editor):
+    ResidueBook = apps.get_model('app', 'ResidueBook')
+    choices = ResidueBook._meta.get_field('type_of_residue').choices
+    ResidueBook.objects.bulk_create([ResidueBook(type_of_residue=value) for value, _ in choices])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0028_rent_order_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResidueBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_of_residue', models.CharField(choices=[('Rice Straw', 'Rice Straw'), ('Wheat Straw', 'Wheat Straw'), ('Rice Husk', 'Rice Husk'), ('Corn Stover', 'Corn Stover'), ('Forestry Residues', 'Forestry Residues'), ('Others', 'Others')], max_length=200, unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResidueBid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_of_residue', models.CharField(choices=[('Rice Straw', 'Rice Straw'), ('Wheat Straw', 'Wheat Straw'), ('Rice Husk', 'Rice Husk'), ('Corn Stover', 'Corn Stover'), ('Forestry Residues', 'Forestry Residues'), ('Others', 'Others')], max_length=200)),
+                ('max_price', models.IntegerField()),
+                ('quantity', models.IntegerField()),
+                ('remaining', models.IntegerField()),
+                ('location', models.TextField(blank=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('radius_km', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='residueorder',
+            name='bid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.residuebid'),
+        ),
+        migrations.AddIndex(
+            model_name='residuebid',
+            index=models.Index(fields=['type_of_residue', 'remaining'], name='app_residue_type_of_f60522_idx'),
+        ),
+        migrations.RunPython(create_books, migrations.RunPython.noop),
+    ]
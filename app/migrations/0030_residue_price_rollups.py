@@ -0,0 +1,79 @@
+# Generated by Django 3.2.9 on 2026-10-18 04:07
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+from app.geo import geocode_region
+from app.rollups import rebuild
+
+
+def backfill_residues(apps, schema_editor):
+    Residue = apps.get_model('app', 'Residue')
+    ResidueOrder = apps.get_model('app', 'ResidueOrder')
+    Residue.objects.update(created_at=F('updated_at'))
+    ResidueOrder.objects.filter(status='accepted').update(accepted_at=F('updated_at'))
+
+    residues = []
+    for residue in Residue.objects.select_related('owner').only('pk', 'owner__location').iterator():
+        residue.region = geocode_region(residue.owner.location) or ''
+        residues.append(residue)
+    Residue.objects.bulk_update(residues, ['region'], batch_size=1000)
+
+
+def rebuild_rollups(apps, schema_editor):
+    rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0029_residue_order_book'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResiduePriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('listed', 'Listed'), ('sold', 'Sold')], max_length=10)),
+                ('type_of_residue', models.CharField(choices=[('Rice Straw', 'Rice Straw'), ('Wheat Straw', 'Wheat Straw'), ('Rice Husk', 'Rice Husk'), ('Corn Stover', 'Corn Stover'), ('Forestry Residues', 'Forestry Residues'), ('Others', 'Others')], max_length=200)),
+                ('region', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('count', models.IntegerField()),
+                ('price_sum', models.BigIntegerField(default=0)),
+                ('price_min', models.IntegerField(null=True)),
+                ('price_max', models.IntegerField(null=True)),
+                ('price_sketch', models.JSONField(default=dict)),
+                ('quantity_sum', models.BigIntegerField(default=0)),
+                ('quantity_min', models.IntegerField(null=True)),
+                ('quantity_max', models.IntegerField(null=True)),
+                ('quantity_sketch', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='residue',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='residue',
+            name='region',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='residueorder',
+            name='accepted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='residue',
+            index=models.Index(fields=['type_of_residue', 'created_at'], name='app_residue_type_of_babe44_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='residuepricerollup',
+            constraint=models.UniqueConstraint(fields=('type_of_residue', 'region', 'day', 'kind'), name='unique_residue_rollup'),
+        ),
+        migrations.RunPython(backfill_residues, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.9 on 2026-10-18 04:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from app.dashboard import expected_counters
+
+
+def backfill_counters(apps, schema_editor):
+    OrderCounter = apps.get_model('app', 'OrderCounter')
+    OrderCounter.objects.bulk_create([
+        OrderCounter(user_id=user_id, source=source, status=status, count=count, units=units, revenue=revenue)
+        for (user_id, source, status), (count, units, revenue) in expected_counters(apps).items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0030_residue_price_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('order', 'Order'), ('rent_order', 'Rent Order'), ('residue_order', 'Residue Order')], max_length=30)),
+                ('status', models.CharField(max_length=30)),
+                ('count', models.IntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ordercounter',
+            constraint=models.UniqueConstraint(fields=('user', 'source', 'status'), name='unique_order_counter'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
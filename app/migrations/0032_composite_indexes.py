@@ -0,0 +1,72 @@
+# Generated by Django 3.2.9 on 2026-10-18 04:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0031_order_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cartitem',
+            name='cart',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.cart'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='machine',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.machine'),
+        ),
+        migrations.AlterField(
+            model_name='rentorder',
+            name='machine',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.machine'),
+        ),
+        migrations.AlterField(
+            model_name='residueorder',
+            name='residue',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.residue'),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'machine'], name='app_cartite_cart_id_2feb7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(condition=models.Q(('for_sale', True)), fields=['id'], name='app_machine_for_sale_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machine',
+            index=models.Index(condition=models.Q(('for_rent', True)), fields=['id'], name='app_machine_for_rent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'status'], name='app_order_custome_e2a01b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['machine', 'status'], name='app_order_machine_734a4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentorder',
+            index=models.Index(fields=['machine', 'status'], name='app_rentord_machine_44247d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='residue',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['type_of_residue', 'id'], name='app_residue_unsold_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='residueorder',
+            index=models.Index(fields=['residue', 'status'], name='app_residue_residue_931c1e_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+import app.search
+from django.db import migrations
+
+
+def reindex_search(apps, schema_editor):
+    # The index table is created IF NOT EXISTS, so it has to be dropped to
+    # pick up the prefix lengths.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in app.search.UNINSTALL_STATEMENTS:
+        schema_editor.execute(statement)
+    app.search.install_machine_search(schema_editor.connection)
+    app.search.rebuild_machine_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0033_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_search, migrations.RunPython.noop),
+    ]
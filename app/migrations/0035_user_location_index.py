@@ -0,0 +1,22 @@
+# Generated by Django 3.2.9 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0034_machine_search_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['grid_cell', 'latitude', 'longitude'], name='app_user_grid_ce_c0ab5c_idx'),
+        ),
+    ]
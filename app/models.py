@@ -1,69 +1,63 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
+from app.authentication import auth_cache, token_cache_key
+from app.cache import bump_catalog_version
+from app.dashboard import count_order, reprice_machine, reprice_residue
+from app.geo import geocode, geocode_region, grid_cell
+from app.images import schedule_variants
+from app.matching import list_bid, list_lot, release_match, unlist_bid, unlist_lot
+from app.media import ContentHashedUploadTo
+from app.rollups import local_day, residue_lots, update_cells
+from app.search import FTS_TABLE, FullTextField
+
+# Sent after an Order, RentOrder or ResidueOrder is created, changes status or
+# is deleted. `old_status` is None for new orders, `new_status` for deleted ones.
+order_status_changed = Signal()
+
 
 class User(AbstractUser):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=10)
     location = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Indexed with the location by the (grid_cell, latitude, longitude) index below
+    grid_cell = models.IntegerField(null=True, blank=True)
     is_industry = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
     first_name = None
     last_name = None
 
+    class Meta(AbstractUser.Meta):
+        # Covers the distinct locations app.geo.nearest_first reads per grid cell
+        indexes = [models.Index(fields=['grid_cell', 'latitude', 'longitude'])]
+
     def get_connections(self):
         if self.is_industry:
             return self.get_industry_connections()
         return self.get_farmer_connections()
 
     def get_industry_connections(self):
-        connections = set()
-
-        orders = Order.objects.filter(machine__owner=self)
-        for order in orders:
-            if order.status == Order.ACCEPTED:
-                connections.add(order.customer)
-
-        rent_orders = RentOrder.objects.filter(machine__owner=self)
-        for rent_order in rent_orders:
-            if rent_order.status == RentOrder.ACCEPTED:
-                connections.add(rent_order.customer)
-
-        residues_orders = ResidueOrder.objects.filter(customer=self)
-        for residue_order in residues_orders:
-            if residue_order.status == ResidueOrder.ACCEPTED:
-                connections.add(residue_order.residue.owner)
-
-        return connections
+        return self._get_connections(Connection.INDUSTRY_EDGES)
 
     def get_farmer_connections(self):
-        connections = set()
-
-        orders = Order.objects.filter(customer=self)
-        for order in orders:
-            if order.status == Order.ACCEPTED:
-                connections.add(order.machine.owner)
+        return self._get_connections(Connection.FARMER_EDGES)
 
-        rent_orders = RentOrder.objects.filter(customer=self)
-        for rent_order in rent_orders:
-            if rent_order.status == RentOrder.ACCEPTED:
-                connections.add(rent_order.machine.owner)
+    def _get_connections(self, edges):
+        edge_filter = models.Q()
+        for source, role in edges:
+            edge_filter |= models.Q(source=source, role=role)
 
-        rent_orders = RentOrder.objects.filter(machine__owner=self)
-        for rent_order in rent_orders:
-            if rent_order.status == RentOrder.ACCEPTED:
-                connections.add(rent_order.customer)
-
-        residues_orders = ResidueOrder.objects.filter(residue__owner=self)
-        for residue_order in residues_orders:
-            if residue_order.status == ResidueOrder.ACCEPTED:
-                connections.add(residue_order.customer)
-
-        return connections
+        peers = Connection.objects.filter(edge_filter, user=self).values('peer')
+        return User.objects.filter(pk__in=peers)
 
     def __str__(self):
         return self.username
@@ -83,12 +77,85 @@ class Machine(models.Model):
     sell_price = models.IntegerField(default=0)
     rent_price = models.IntegerField(default=0)
     discount = models.IntegerField(default=0)  # percentage
-    image = models.ImageField(upload_to='machine_images/')
+    image = models.ImageField(upload_to=ContentHashedUploadTo('machine_images/', 'image'))
+    # Resized copies of `image`, {"<width>": {"<format>": "<storage name>"}}, filled in by app.images
+    image_variants = models.JSONField(default=dict, blank=True)
+    # Incremented whenever the machine's rental bookings change; see app.availability
+    rental_version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # The catalog filters on a flag and pages by id, so these walk only
+        # the matching machines, already in page order.
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(for_sale=True), name='app_machine_for_sale_idx'),
+            models.Index(fields=['id'], condition=models.Q(for_rent=True), name='app_machine_for_rent_idx'),
+        ]
+
+    def get_sell_price(self):
+        return self.sell_price * (100 - self.discount) / 100
+
+    @classmethod
+    def reserve(cls, machine_id, quantity=1):
+        """Atomically take `quantity` units out of stock. Returns False when not enough are left."""
+        machines = cls.objects.filter(pk=machine_id, quantity__gte=quantity)
+        reserved = machines.update(quantity=F('quantity') - quantity, updated_at=timezone.now()) == 1
+        if reserved:
+            bump_catalog_version()
+        return reserved
+
+    @classmethod
+    def release(cls, machine_id, quantity=1):
+        cls.objects.filter(pk=machine_id).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+        bump_catalog_version()
+
+    @classmethod
+    def reserve_many(cls, quantities):
+        """
+        Take stock for several machines in one UPDATE. `quantities` maps machine
+        ids to units; returns False, leaving the caller to roll back, when any
+        of them is short.
+        """
+        in_stock = models.Q()
+        whens = []
+        for machine_id, quantity in quantities.items():
+            in_stock |= models.Q(pk=machine_id, quantity__gte=quantity)
+            whens.append(models.When(pk=machine_id, then=models.Value(quantity)))
+
+        machines = cls.objects.filter(in_stock)
+        taken = models.Case(*whens, output_field=models.IntegerField())
+        updated = machines.update(quantity=F('quantity') - taken, updated_at=timezone.now())
+        bump_catalog_version()
+        return updated == len(quantities)
+
+    @classmethod
+    def bump_rental_version(cls, machine_id):
+        cls.objects.filter(pk=machine_id).update(rental_version=F('rental_version') + 1)
+
+    @classmethod
+    def lock_rentals(cls, machine_id):
+        """Lock the machine's row until the transaction ends, leaving the rental version as it is."""
+        cls.objects.filter(pk=machine_id).update(rental_version=F('rental_version'))
 
     def __str__(self):
         return self.name
 
 
+class MachineSearch(models.Model):
+    """Row of the FTS5 machine index. The table and its triggers are managed by app.search."""
+    machine = models.OneToOneField(
+        Machine, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING, related_name='search')
+    name = models.TextField()
+    description = models.TextField()
+    details = models.TextField(null=True)
+    document = FullTextField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
+
 class Delivery(models.Model):
     seller = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="seller")
@@ -130,6 +197,24 @@ class Residue(models.Model):
     type_of_residue = models.CharField(choices=CHOICES, max_length=200, default=RICE_STRAW)
     price = models.IntegerField(default=0)
     quantity = models.IntegerField(default=1)
+    is_sold = models.BooleanField(default=False, db_index=True)
+    # State of the owner's location when the lot was listed, for price rollups
+    region = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['type_of_residue', 'created_at']),
+            # Lots on offer by type, in page order
+            models.Index(fields=['type_of_residue', 'id'], condition=models.Q(is_sold=False),
+                         name='app_residue_unsold_type_idx'),
+        ]
+
+    @classmethod
+    def refresh_sold_state(cls, residue_id):
+        accepted_orders = ResidueOrder.objects.filter(residue=models.OuterRef('pk'), status=ResidueOrder.ACCEPTED)
+        cls.objects.filter(pk=residue_id).update(is_sold=models.Exists(accepted_orders), updated_at=timezone.now())
 
     def __str__(self):
         return self.type_of_residue
@@ -146,10 +231,15 @@ class Order(models.Model):
         (REJECTED, 'Rejected'),
     ]
 
-    customer = models.ForeignKey(User, on_delete=models.CASCADE)
-    machine = models.ForeignKey(Machine, on_delete=models.CASCADE)
+    # Indexed by the (customer, status) and (machine, status) indexes below
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, db_index=False)
     quantity = models.IntegerField(default=1)
     status = models.CharField(choices=STATUS_CHOICES, max_length=30, default=PENDING)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['customer', 'status']), models.Index(fields=['machine', 'status'])]
 
     def __str__(self):
         return f'{self.customer.name} {self.machine.name} {self.quantity} {str(self.status)}'
@@ -166,10 +256,20 @@ class RentOrder(models.Model):
         (REJECTED, 'Rejected'),
     ]
 
+    # Rent orders in these states hold a unit of the machine for their dates.
+    ACTIVE_STATUSES = [PENDING, ACCEPTED]
+
     customer = models.ForeignKey(User, on_delete=models.CASCADE)
-    machine = models.ForeignKey(Machine, on_delete=models.CASCADE)
+    # Indexed by the (machine, end_date) and (machine, status) indexes below
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, db_index=False)
     status = models.CharField(choices=STATUS_CHOICES, max_length=30, default=PENDING)
     num_of_days = models.PositiveIntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()  # exclusive, start_date + num_of_days
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['machine', 'end_date']), models.Index(fields=['machine', 'status'])]
 
     def __str__(self):
         return f'{self.customer.name} {self.machine.name} {self.num_of_days} {str(self.status)}'
@@ -186,14 +286,108 @@ class ResidueOrder(models.Model):
         (REJECTED, 'Rejected'),
     ]
 
+    # Residue orders in these states take their lot off the order book.
+    ACTIVE_STATUSES = [PENDING, ACCEPTED]
+
     customer = models.ForeignKey(User, on_delete=models.CASCADE)
-    residue = models.ForeignKey(Residue, on_delete=models.CASCADE)
+    # Indexed by the (residue, status) index below
+    residue = models.ForeignKey(Residue, on_delete=models.CASCADE, db_index=False)
+    # The standing bid the matching engine placed this order for, if any
+    bid = models.ForeignKey('ResidueBid', null=True, blank=True, on_delete=models.SET_NULL)
     status = models.CharField(choices=STATUS_CHOICES, max_length=30, default=PENDING)
+    # When the order was last accepted; kept when it is rejected afterwards
+    accepted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['residue', 'status'])]
 
     def __str__(self):
         return f'{self.customer.name} {self.residue.type_of_residue} {str(self.status)}'
 
 
+class ResidueBid(models.Model):
+    """
+    A standing bid of an industry buyer for `quantity` units of a residue
+    type at up to `max_price`, compared with Residue.price. The matching
+    engine in app.matching places ResidueOrders for it and lowers
+    `remaining` as lots are matched.
+    """
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE)
+    type_of_residue = models.CharField(choices=Residue.CHOICES, max_length=200)
+    max_price = models.IntegerField()
+    quantity = models.IntegerField()
+    remaining = models.IntegerField()
+    location = models.TextField(blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Only lots whose seller lives this close to the location match; None matches any distance.
+    radius_km = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['type_of_residue', 'remaining'])]
+
+    def __str__(self):
+        return f'{self.buyer.name} {self.type_of_residue} {self.remaining}/{self.quantity} <= {self.max_price}'
+
+
+class ResiduePriceRollup(models.Model):
+    """
+    Price and quantity statistics of the residue lots of one type listed,
+    or sold, in one region on one day. Region '*' covers every region.
+    Kept up to date by app.rollups as lots and orders change.
+    """
+    LISTED = 'listed'
+    SOLD = 'sold'
+
+    KIND_CHOICES = [
+        (LISTED, 'Listed'),
+        (SOLD, 'Sold'),
+    ]
+
+    kind = models.CharField(choices=KIND_CHOICES, max_length=10)
+    type_of_residue = models.CharField(choices=Residue.CHOICES, max_length=200)
+    region = models.CharField(max_length=100)
+    day = models.DateField()
+    count = models.IntegerField()
+    price_sum = models.BigIntegerField(default=0)
+    price_min = models.IntegerField(null=True)
+    price_max = models.IntegerField(null=True)
+    price_sketch = models.JSONField(default=dict)
+    quantity_sum = models.BigIntegerField(default=0)
+    quantity_min = models.IntegerField(null=True)
+    quantity_max = models.IntegerField(null=True)
+    quantity_sketch = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['type_of_residue', 'region', 'day', 'kind'], name='unique_residue_rollup'),
+        ]
+
+
+class ResidueBook(models.Model):
+    """Version of each residue type's order book, bumped by every change that is matched."""
+    type_of_residue = models.CharField(choices=Residue.CHOICES, max_length=200, unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def lock(cls, type_of_residue):
+        """
+        Bump and return the book's version. The row stays locked until the
+        transaction ends, which serializes matching of the residue type.
+        """
+        books = cls.objects.filter(type_of_residue=type_of_residue)
+        if not books.update(version=F('version') + 1):
+            cls.objects.create(type_of_residue=type_of_residue, version=1)
+        return books.values_list('version', flat=True).get()
+
+    @classmethod
+    def current_version(cls, type_of_residue):
+        return cls.objects.filter(type_of_residue=type_of_residue).values_list('version', flat=True).first() or 0
+
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
@@ -202,14 +396,360 @@ class Cart(models.Model):
 
 
 class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
+    # Indexed by the (cart, machine) index below
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, db_index=False)
     machine = models.ForeignKey(Machine, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['cart', 'machine'])]
 
     def __str__(self):
         return self.machine.name + ' ' + str(self.quantity)
 
 
+class Connection(models.Model):
+    """
+    Denormalized edge between two users that share at least one accepted
+    order. `count` is the number of accepted orders backing the edge; the
+    row is removed when it drops to zero.
+    """
+    ORDER = 'order'
+    RENT_ORDER = 'rent_order'
+    RESIDUE_ORDER = 'residue_order'
+
+    SOURCE_CHOICES = [
+        (ORDER, 'Order'),
+        (RENT_ORDER, 'Rent Order'),
+        (RESIDUE_ORDER, 'Residue Order'),
+    ]
+
+    SELLER = 'seller'
+    BUYER = 'buyer'
+
+    ROLE_CHOICES = [
+        (SELLER, 'Seller'),
+        (BUYER, 'Buyer'),
+    ]
+
+    INDUSTRY_EDGES = [(ORDER, SELLER), (RENT_ORDER, SELLER), (RESIDUE_ORDER, BUYER)]
+    FARMER_EDGES = [(ORDER, BUYER), (RENT_ORDER, BUYER), (RENT_ORDER, SELLER), (RESIDUE_ORDER, SELLER)]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='connection_edges')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    source = models.CharField(choices=SOURCE_CHOICES, max_length=30)
+    role = models.CharField(choices=ROLE_CHOICES, max_length=30)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source', 'role', 'peer'], name='unique_connection_edge'),
+        ]
+
+    @classmethod
+    def shift(cls, source, seller_id, buyer_id, delta):
+        """Add `delta` accepted orders between a seller and a buyer, on both sides of the edge."""
+        with transaction.atomic():
+            cls._shift_edge(seller_id, buyer_id, source, cls.SELLER, delta)
+            cls._shift_edge(buyer_id, seller_id, source, cls.BUYER, delta)
+
+    @classmethod
+    def _shift_edge(cls, user_id, peer_id, source, role, delta):
+        lookup = {'user_id': user_id, 'peer_id': peer_id, 'source': source, 'role': role}
+        edges = cls.objects.filter(**lookup)
+        if delta > 0:
+            _, created = cls.objects.get_or_create(**lookup, defaults={'count': delta})
+            if not created:
+                edges.update(count=F('count') + delta)
+            return
+
+        edges.filter(count__lte=-delta).delete()
+        edges.update(count=F('count') + delta)
+
+    def __str__(self):
+        return f'{self.user} {self.role} {self.peer} ({self.source})'
+
+
+class OrderCounter(models.Model):
+    """
+    Running totals of one user's orders in one status, kept up to date by the
+    order receivers below in the same transaction as the order write, so the
+    dashboard reads a few rows instead of every order. Orders and rent orders
+    count for the machine's owner, residue orders for their buyer. `revenue`
+    is in hundredths of the price unit so discounted prices add up exactly.
+    app.dashboard.reconcile checks the counters against the orders.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_counters')
+    source = models.CharField(choices=Connection.SOURCE_CHOICES, max_length=30)
+    status = models.CharField(max_length=30)
+    count = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source', 'status'], name='unique_order_counter'),
+        ]
+
+    @classmethod
+    def shift(cls, user_id, source, status, count=0, units=0, revenue=0):
+        """Add to a counter. Only adding orders creates a missing row, so removals never recreate a deleted user's."""
+        lookup = {'user_id': user_id, 'source': source, 'status': status}
+        deltas = {'count': count, 'units': units, 'revenue': revenue}
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        with transaction.atomic():
+            if cls.objects.filter(**lookup).update(**changes) or count <= 0:
+                return
+            _, created = cls.objects.get_or_create(**lookup, defaults=deltas)
+            if not created:
+                cls.objects.filter(**lookup).update(**changes)
+
+    def __str__(self):
+        return f'{self.user} {self.source} {self.status}: {self.count}'
+
+
+class ReplicaHeartbeat(models.Model):
+    """
+    A single row app.replicas.beat rewrites on the primary. Replicas copy it
+    along with everything else, so its age on a replica is that replica's lag.
+    """
+    beat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'heartbeat {self.beat_at}'
+
+
+def _order_parties(instance):
+    if isinstance(instance, ResidueOrder):
+        return Connection.RESIDUE_ORDER, instance.residue.owner_id, instance.customer_id
+    if isinstance(instance, RentOrder):
+        return Connection.RENT_ORDER, instance.machine.owner_id, instance.customer_id
+    return Connection.ORDER, instance.machine.owner_id, instance.customer_id
+
+
+@receiver(post_init, sender=Order)
+@receiver(post_init, sender=RentOrder)
+@receiver(post_init, sender=ResidueOrder)
+def remember_order_status(sender, instance, **kwargs):
+    instance._saved_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=RentOrder)
+@receiver(post_save, sender=ResidueOrder)
+def send_order_status_changed_on_save(sender, instance, **kwargs):
+    old_status = instance._saved_status
+    instance._saved_status = instance.status
+
+    if old_status != instance.status:
+        order_status_changed.send(sender=sender, instance=instance, old_status=old_status, new_status=instance.status)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=RentOrder)
+@receiver(post_delete, sender=ResidueOrder)
+def send_order_status_changed_on_delete(sender, instance, **kwargs):
+    if instance._saved_status is not None:
+        order_status_changed.send(sender=sender, instance=instance, old_status=instance._saved_status, new_status=None)
+
+
+@receiver(order_status_changed)
+def update_connections(sender, instance, old_status, new_status, **kwargs):
+    was_accepted = old_status == sender.ACCEPTED
+    is_accepted = new_status == sender.ACCEPTED
+
+    if was_accepted != is_accepted:
+        source, seller_id, buyer_id = _order_parties(instance)
+        Connection.shift(source, seller_id, buyer_id, 1 if is_accepted else -1)
+
+
+@receiver(order_status_changed)
+def update_order_counters(sender, instance, old_status, new_status, **kwargs):
+    count_order(instance, old_status, new_status)
+
+
+@receiver(order_status_changed, sender=ResidueOrder)
+def update_residue_sold_state(sender, instance, old_status, new_status, **kwargs):
+    if (old_status == sender.ACCEPTED) != (new_status == sender.ACCEPTED):
+        Residue.refresh_sold_state(instance.residue_id)
+
+
+@receiver(order_status_changed, sender=ResidueOrder)
+def update_residue_book(sender, instance, old_status, new_status, **kwargs):
+    # Deleted orders go with their lot, bid or buyer; new matched orders were placed by the engine itself.
+    if new_status is None or (old_status is None and instance.bid_id is not None):
+        return
+    if (old_status in sender.ACTIVE_STATUSES) == (new_status in sender.ACTIVE_STATUSES):
+        return
+
+    if new_status not in sender.ACTIVE_STATUSES and instance.bid_id is not None:
+        release_match(instance)
+    else:
+        list_lot(instance.residue_id)
+
+
+@receiver(pre_save, sender=ResidueOrder)
+def stamp_residue_order_acceptance(sender, instance, **kwargs):
+    if instance.status == sender.ACCEPTED and instance._saved_status != sender.ACCEPTED:
+        instance.accepted_at = timezone.now()
+
+
+@receiver(order_status_changed, sender=ResidueOrder)
+def update_sold_rollups(sender, instance, old_status, new_status, **kwargs):
+    if (old_status == sender.ACCEPTED) != (new_status == sender.ACCEPTED) and instance.accepted_at:
+        residue = instance.residue
+        lot = (ResiduePriceRollup.SOLD, residue.type_of_residue, residue.region, local_day(instance.accepted_at),
+               residue.price, residue.quantity)
+        if new_status == sender.ACCEPTED:
+            update_cells(added=[lot])
+        else:
+            update_cells(removed=[lot])
+
+
+@receiver(order_status_changed, sender=RentOrder)
+def update_rental_version(sender, instance, old_status, new_status, **kwargs):
+    if (old_status in sender.ACTIVE_STATUSES) != (new_status in sender.ACTIVE_STATUSES):
+        Machine.bump_rental_version(instance.machine_id)
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+def invalidate_machine_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_init, sender=Machine)
+def remember_machine_image(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._saved_image = getattr(image, 'name', image) if instance.pk else None
+
+
+@receiver(post_init, sender=Machine)
+def remember_machine_prices(sender, instance, **kwargs):
+    fields = instance.__dict__
+    prices = (fields.get('sell_price'), fields.get('rent_price'), fields.get('discount'))
+    instance._saved_prices = prices if instance.pk and None not in prices else None
+
+
+@receiver(post_save, sender=Machine)
+def update_machine_order_counters(sender, instance, **kwargs):
+    prices = (instance.sell_price, instance.rent_price, instance.discount)
+    if instance._saved_prices not in (None, prices):
+        reprice_machine(instance, instance._saved_prices)
+    instance._saved_prices = prices
+
+
+@receiver(post_save, sender=Machine)
+def generate_image_variants(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance._saved_image:
+        schedule_variants(instance.pk)
+    instance._saved_image = instance.image.name
+
+
+@receiver(post_init, sender=Residue)
+def remember_residue_terms(sender, instance, **kwargs):
+    fields = instance.__dict__
+    saved = instance.pk is not None
+    instance._saved_type = fields.get('type_of_residue') if saved else None
+    instance._saved_terms = (fields.get('price'), fields.get('quantity')) if saved else None
+
+
+@receiver(pre_save, sender=Residue)
+def set_residue_region(sender, instance, **kwargs):
+    if instance.pk is None and not instance.region:
+        instance.region = geocode_region(instance.owner.location) or ''
+
+
+@receiver(post_save, sender=Residue)
+def update_residue_order_counters(sender, instance, **kwargs):
+    # Runs before update_residue_rollups, which moves _saved_terms on.
+    saved = instance._saved_terms
+    if saved is not None and None not in saved and saved != (instance.price, instance.quantity):
+        reprice_residue(instance, saved)
+
+
+@receiver(post_save, sender=Residue)
+def update_residue_rollups(sender, instance, created, **kwargs):
+    terms = (instance.price, instance.quantity)
+    if created:
+        update_cells(added=[(ResiduePriceRollup.LISTED, instance.type_of_residue, instance.region,
+                             local_day(instance.created_at), *terms)])
+    elif instance.type_of_residue != instance._saved_type or terms != instance._saved_terms:
+        saved_type = instance._saved_type or instance.type_of_residue
+        added, removed = residue_lots(
+            instance, [(instance.type_of_residue, *terms), (saved_type, *instance._saved_terms)])
+        update_cells(added=added, removed=removed)
+    instance._saved_terms = terms
+
+
+@receiver(post_delete, sender=Residue)
+def drop_residue_rollups(sender, instance, **kwargs):
+    # Sales of the lot are dropped as its orders are deleted.
+    update_cells(removed=[(ResiduePriceRollup.LISTED, instance.type_of_residue, instance.region,
+                           local_day(instance.created_at), instance.price, instance.quantity)])
+
+
+@receiver(post_save, sender=Residue)
+def match_residue(sender, instance, **kwargs):
+    list_lot(instance.pk, instance._saved_type)
+    instance._saved_type = instance.type_of_residue
+
+
+@receiver(post_delete, sender=Residue)
+def unlist_residue(sender, instance, **kwargs):
+    unlist_lot(instance.pk, instance.type_of_residue)
+
+
+@receiver(pre_save, sender=ResidueBid)
+def geocode_bid_location(sender, instance, **kwargs):
+    point = geocode(instance.location)
+    instance.latitude, instance.longitude = point or (None, None)
+
+
+@receiver(post_save, sender=ResidueBid)
+def match_bid(sender, instance, **kwargs):
+    list_bid(instance.pk)
+
+
+@receiver(post_delete, sender=ResidueBid)
+def unlist_residue_bid(sender, instance, **kwargs):
+    unlist_bid(instance.pk, instance.type_of_residue)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def geocode_user_location(sender, instance, **kwargs):
+    point = geocode(instance.location)
+    instance.latitude, instance.longitude = point or (None, None)
+    instance.grid_cell = grid_cell(*point) if point else None
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_user_location(sender, instance, **kwargs):
+    instance._saved_location = instance.__dict__.get('location') if instance.pk else None
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_catalog_on_location_change(sender, instance, created, **kwargs):
+    # Catalog pages filter by ?owner__location= and sort ?near= by the
+    # owners' locations. A new user owns no machines yet.
+    if not created and instance.location != instance._saved_location:
+        bump_catalog_version()
+    instance._saved_location = instance.location
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_credentials(sender, instance, **kwargs):
+    # Covers password changes, deactivation and deletion.
+    auth_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    auth_cache.invalidate(token_cache_key(instance.key))
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
@@ -0,0 +1,154 @@
+import bisect
+from collections import namedtuple
+
+from app.geo import haversine_km
+
+# A lot matched to a bid: the whole lot goes to the bid at the lot's price.
+Match = namedtuple('Match', ['bid_id', 'buyer_id', 'residue_id', 'price', 'quantity'])
+
+
+class Ask:
+    """A residue lot on offer. Lots are sold whole; `point` is the seller's (latitude, longitude) or None."""
+    __slots__ = ('residue_id', 'owner_id', 'price', 'quantity', 'point')
+
+    def __init__(self, residue_id, owner_id, price, quantity, point=None):
+        self.residue_id = residue_id
+        self.owner_id = owner_id
+        self.price = price
+        self.quantity = quantity
+        self.point = point
+
+    @property
+    def key(self):
+        return (self.price, self.residue_id)
+
+
+class Bid:
+    """
+    A standing bid for up to `remaining` units at no more than `max_price`
+    per unit, for lots within `radius_km` of `point` when both are set.
+    """
+    __slots__ = ('bid_id', 'buyer_id', 'max_price', 'remaining', 'point', 'radius_km')
+
+    def __init__(self, bid_id, buyer_id, max_price, remaining, point=None, radius_km=None):
+        self.bid_id = bid_id
+        self.buyer_id = buyer_id
+        self.max_price = max_price
+        self.remaining = remaining
+        self.point = point
+        self.radius_km = radius_km
+
+    @property
+    def key(self):
+        return (-self.max_price, self.bid_id)
+
+
+class OrderBook:
+    """
+    Bids and asks for one residue type, with price-time priority: asks are
+    kept sorted by (price, id) and bids by (-max price, id), so the best
+    counterparty is always at the front and older entries win ties. Each
+    side is a sorted key list searched with bisect, next to a dict by id, so
+    entries are found, repriced and removed without scanning the book, and
+    matching walks from the best price only as far as prices cross.
+
+    Adding an entry matches it against the other side first. An ask goes to
+    the best bid that can take the whole lot; a bid takes the cheapest lots
+    it can until it is filled or runs out of lots at its price. Pairs in
+    `declined` (bid id, residue id), whose order the seller rejected, are
+    never matched again.
+    """
+
+    def __init__(self):
+        self.asks = {}
+        self.bids = {}
+        self.declined = set()
+        self._ask_keys = []
+        self._bid_keys = []
+        # Version of the database state the book reflects, or None; see app.matching
+        self.version = None
+
+    def __len__(self):
+        return len(self.asks) + len(self.bids)
+
+    def add_ask(self, ask, match=True):
+        """Add or replace an ask, returning the matches it made."""
+        self.remove_ask(ask.residue_id)
+        if match:
+            for key in self._bid_keys:
+                bid = self.bids[key[1]]
+                if bid.max_price < ask.price:
+                    break
+                if self.can_match(bid, ask):
+                    return [self._fill(bid, ask)]
+
+        self.asks[ask.residue_id] = ask
+        bisect.insort(self._ask_keys, ask.key)
+        return []
+
+    def remove_ask(self, residue_id):
+        ask = self.asks.pop(residue_id, None)
+        if ask is not None:
+            del self._ask_keys[bisect.bisect_left(self._ask_keys, ask.key)]
+        return ask
+
+    def add_bid(self, bid, match=True):
+        """Add or replace a bid, returning the matches it made."""
+        self.remove_bid(bid.bid_id)
+        matches = []
+        if match:
+            for key in self._ask_keys:
+                if bid.remaining <= 0 or key[0] > bid.max_price:
+                    break
+                ask = self.asks[key[1]]
+                if self.can_match(bid, ask):
+                    matches.append(self._fill(bid, ask))
+            for made in matches:
+                self.remove_ask(made.residue_id)
+
+        if bid.remaining > 0:
+            self.bids[bid.bid_id] = bid
+            bisect.insort(self._bid_keys, bid.key)
+        return matches
+
+    def remove_bid(self, bid_id):
+        bid = self.bids.pop(bid_id, None)
+        if bid is not None:
+            del self._bid_keys[bisect.bisect_left(self._bid_keys, bid.key)]
+        return bid
+
+    def can_match(self, bid, ask):
+        if ask.quantity > bid.remaining or bid.buyer_id == ask.owner_id:
+            return False
+        if (bid.bid_id, ask.residue_id) in self.declined:
+            return False
+        if bid.point is None or ask.point is None or bid.radius_km is None:
+            return True
+        return haversine_km(*bid.point, *ask.point) <= bid.radius_km
+
+    def _fill(self, bid, ask):
+        # The ask is not in the book yet, or is removed by the caller after iterating.
+        bid.remaining -= ask.quantity
+        if bid.remaining <= 0 and bid.bid_id in self.bids:
+            self.remove_bid(bid.bid_id)
+        return Match(bid.bid_id, bid.buyer_id, ask.residue_id, ask.price, ask.quantity)
+
+    def depth(self, levels=10):
+        """The best `levels` price levels of each side as {'price', 'quantity', 'orders'} dicts."""
+        return {
+            'bids': self._levels(((-key[0], self.bids[key[1]].remaining) for key in self._bid_keys), levels),
+            'asks': self._levels(((key[0], self.asks[key[1]].quantity) for key in self._ask_keys), levels),
+        }
+
+    @staticmethod
+    def _levels(entries, limit):
+        levels = []
+        for price, quantity in entries:
+            if levels and levels[-1]['price'] == price:
+                levels[-1]['quantity'] += quantity
+                levels[-1]['orders'] += 1
+            elif len(levels) == limit:
+                break
+            else:
+                levels.append({'price': price, 'quantity': quantity, 'orders': 1})
+        return levels
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opaque cursor pagination over the primary key. Pages are fetched with an
+    indexed `id < cursor` filter and never run a COUNT, so deep pages cost the
+    same as the first one.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('has_more', self.has_next),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['has_more'] = {'type': 'boolean'}
+        return response_schema
+
+
+class SearchRankPagination(KeysetPagination):
+    """
+    Cursor pagination over full-text search results, ordered by their bm25
+    `search_rank` with the id breaking ties. The cursor holds both, so a
+    page starts with one (search_rank, id) comparison however many matches
+    share a rank; DRF's position and offset cursor stops at 1000 ties.
+    """
+    ordering = ('search_rank', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(f'-{field}' for field in self.ordering) if reverse else self.ordering)
+        if position is not None:
+            rank, pk = position
+            if reverse:
+                queryset = queryset.filter(Q(search_rank__lt=rank) | Q(search_rank=rank, id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(search_rank__gt=rank) | Q(search_rank=rank, id__gt=pk))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        self.has_next = position is not None if reverse else has_following
+        self.has_previous = has_following if reverse else position is not None
+        return self.page
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            rank, pk = cursor.position.split('_')
+            return cursor._replace(position=(float(rank), int(pk)))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.position_of(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.position_of(self.page[0])))
+
+    @staticmethod
+    def position_of(machine):
+        return f'{machine.search_rank!r}_{machine.pk}'
+
+
+class NearestPagination(KeysetPagination):
+    """Cursor pagination over the `near_key` annotation of radius queries, nearest first."""
+    ordering = 'near_key'
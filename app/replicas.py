@@ -0,0 +1,232 @@
+import contextvars
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger('app.replicas')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the current request; None outside requests, which keeps
+# management commands, signals fired by them and migrations on the primary.
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+# Set while a replica's lag is read, so request query counts can leave the
+# check out: it runs once per LAG_CHECK_INTERVAL, on whichever request comes.
+_checking_lag = contextvars.ContextVar('replica_checking_lag', default=False)
+
+# {alias: (monotonic time checked, lag in seconds or None)}, per process
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def _option(name, default):
+    return getattr(settings, 'READ_REPLICAS', {}).get(name, default)
+
+
+def replica_aliases():
+    return list(_option('ALIASES', []))
+
+
+def max_lag():
+    """Seconds a replica may trail the primary and still serve reads."""
+    return _option('MAX_LAG', 5)
+
+
+def pin_seconds():
+    """
+    How long a client's reads stay on the primary after it wrote. A replica
+    serving reads trailed the primary by at most MAX_LAG seconds when it was
+    last checked, LAG_CHECK_INTERVAL seconds ago at most, so after this long
+    every replica in use has the write.
+    """
+    return max_lag() + _option('LAG_CHECK_INTERVAL', 1)
+
+
+class RoutingState:
+    def __init__(self, replica_reads):
+        self.replica_reads = replica_reads
+        self.replica = None
+        self.wrote = False
+        # Set by authenticated() once the request's user is known
+        self.user_id = None
+
+
+@contextmanager
+def routing(replica_reads):
+    """Route the ORM reads of the block, a request, to a replica when `replica_reads` is set and nothing was written."""
+    state = RoutingState(replica_reads)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, e.g. to build something cached past the replicas' lag."""
+    state = _routing.get()
+    if state is None:
+        yield
+        return
+    replica_reads, state.replica_reads = state.replica_reads, False
+    try:
+        yield
+    finally:
+        state.replica_reads = replica_reads
+
+
+def beat():
+    """Record the time on the primary. The heartbeat's age on a replica is that replica's lag."""
+    from app.models import ReplicaHeartbeat
+
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+
+
+def replica_lag(alias):
+    """Seconds since the heartbeat a replica holds was written, or None when it has none or cannot be read."""
+    from app.models import ReplicaHeartbeat
+
+    token = _checking_lag.set(True)
+    try:
+        beat_at = ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('beat_at', flat=True).first()
+    except DatabaseError as error:
+        logger.warning('Replica %s cannot be read: %s', alias, error)
+        return None
+    finally:
+        _checking_lag.reset(token)
+    if beat_at is None:
+        return None
+    return max((timezone.now() - beat_at).total_seconds(), 0.0)
+
+
+def checking_lag():
+    """Whether the current statement reads a replica's heartbeat for healthy_replicas()."""
+    return _checking_lag.get()
+
+
+def healthy_replicas():
+    """Replicas that trailed the primary by at most MAX_LAG seconds when last checked."""
+    now = time.monotonic()
+    interval = _option('LAG_CHECK_INTERVAL', 1)
+    limit = max_lag()
+    healthy = []
+    for alias in replica_aliases():
+        with _lags_lock:
+            checked_at, lag = _lags.get(alias, (None, None))
+        if checked_at is None or now - checked_at >= interval:
+            lag = replica_lag(alias)
+            with _lags_lock:
+                _lags[alias] = (now, lag)
+        if lag is not None and lag <= limit:
+            healthy.append(alias)
+    return healthy
+
+
+def replicate(alias):
+    """
+    Stand-in for replication between SQLite files: write a heartbeat, then
+    copy the primary over the replica `alias` with SQLite's online backup
+    API, which gives the replica a consistent snapshot while both are in use.
+    Every call copies the whole database.
+    """
+    beat()
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ValueError('Only SQLite databases can be replicated by copying.')
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+def user_pin_key(user_id):
+    return f'read-replicas:pin:user:{user_id}'
+
+
+def client_pin_key(request):
+    """
+    Cache key of the client behind `request` before it is authenticated:
+    its session, or else its address. Credentials would not do, as they
+    change when a client registers, gets a token or changes its password.
+    """
+    client = request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.META.get('REMOTE_ADDR')
+    if not client:
+        return None
+    return 'read-replicas:pin:client:' + hashlib.sha1(client.encode()).hexdigest()
+
+
+def replica_reads_allowed(request):
+    """Reads of safe requests go to a replica, unless the client wrote within pin_seconds()."""
+    key = client_pin_key(request)
+    return request.method in SAFE_METHODS and not (key and cache.get(key))
+
+
+def authenticated(user_id):
+    """
+    Record the user the current request was authenticated as. Their reads
+    stay on the primary for pin_seconds() after any of their requests wrote,
+    whichever client and credentials it came with.
+    """
+    state = _routing.get()
+    if state is None:
+        return
+    state.user_id = user_id
+    if state.replica_reads and cache.get(user_pin_key(user_id)):
+        state.replica_reads = False
+
+
+def pin_after_write(request, state):
+    """Keep the reads of the user, or of the anonymous client, that wrote on the primary for pin_seconds()."""
+    if not state.wrote:
+        return
+    key = user_pin_key(state.user_id) if state.user_id is not None else client_pin_key(request)
+    if key:
+        cache.set(key, True, math.ceil(pin_seconds()))
+
+
+class ReadReplicaRouter:
+    """
+    Sends the reads of a request to one of READ_REPLICAS['ALIASES'] while the
+    request may use replicas (see app.middleware.ReadReplicaMiddleware) and
+    everything else to the primary. A request sticks to the replica it first
+    read from. Once it writes, or inside a transaction, the rest of its reads
+    go to the primary, so a request reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        # A session written by the previous request, as on login, has to be there for the next one.
+        if state is None or not state.replica_reads or state.wrote or model._meta.app_label == 'sessions' \
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            replicas = healthy_replicas()
+            state.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        # Always named explicitly: with no answer Django writes an instance
+        # back to the database it was read from, which may be a replica.
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database is a copy of the primary, so instances read from any
+        # of them relate, including ones cached per process like app.authentication's users.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db not in replica_aliases()
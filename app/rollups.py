@@ -0,0 +1,271 @@
+import datetime
+import math
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.utils import timezone
+
+# Relative accuracy of quantiles read from a QuantileSketch.
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+
+QUANTILES = [0.25, 0.5, 0.75, 0.9]
+# Rollup rows over every region of a residue type and day
+ALL_REGIONS = '*'
+MAX_DAYS = 365
+
+
+class QuantileSketch:
+    """
+    Mergeable log-bucketed histogram (DDSketch): a value v > 0 falls in
+    bucket ceil(log(v) / log(GAMMA)), and every quantile read back is within
+    ALPHA of a value of the right rank. Values up to 0 share one bucket.
+    Buckets are kept by string key so the sketch stores as JSON as is.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(buckets or {})
+
+    @staticmethod
+    def _key(value):
+        return '0' if value <= 0 else str(math.ceil(math.log(value, GAMMA)) + 1)
+
+    def add(self, value, count=1):
+        key = self._key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def remove(self, value, count=1):
+        key = self._key(value)
+        remaining = self.buckets.get(key, 0) - count
+        if remaining > 0:
+            self.buckets[key] = remaining
+        else:
+            self.buckets.pop(key, None)
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q):
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(int(key) for key in self.buckets):
+            seen += self.buckets[str(index)]
+            if seen > rank:
+                return 0.0 if index == 0 else 2 * GAMMA ** (index - 1) / (GAMMA + 1)
+
+
+class Stats:
+    """Count, sum, extremes and quantile sketch of residue lot prices and quantities."""
+    MEASURES = ['price', 'quantity']
+
+    def __init__(self):
+        self.count = 0
+        self.sums = {measure: 0 for measure in self.MEASURES}
+        self.minimums = {measure: None for measure in self.MEASURES}
+        self.maximums = {measure: None for measure in self.MEASURES}
+        self.sketches = {measure: QuantileSketch() for measure in self.MEASURES}
+
+    def add(self, price, quantity):
+        self.count += 1
+        for measure, value in zip(self.MEASURES, (price, quantity)):
+            self.sums[measure] += value
+            self.minimums[measure] = value if self.minimums[measure] is None else min(self.minimums[measure], value)
+            self.maximums[measure] = value if self.maximums[measure] is None else max(self.maximums[measure], value)
+            self.sketches[measure].add(value)
+
+    def remove(self, price, quantity):
+        """
+        Take a lot back out. Returns False, leaving the stats as they were,
+        when the lot may hold an extreme, which only the remaining lots can
+        tell, or its values are unknown; the stats then have to be
+        recomputed from the lots.
+        """
+        values = dict(zip(self.MEASURES, (price, quantity)))
+        if self.count <= 1 or None in values.values() or any(
+                values[measure] in (self.minimums[measure], self.maximums[measure]) for measure in self.MEASURES):
+            return False
+        self.count -= 1
+        for measure, value in values.items():
+            self.sums[measure] -= value
+            self.sketches[measure].remove(value)
+        return True
+
+    def add_rollup(self, rollup):
+        """Merge in a ResiduePriceRollup row."""
+        self.count += rollup.count
+        for measure in self.MEASURES:
+            self.sums[measure] += getattr(rollup, f'{measure}_sum')
+            for extremes, pick, field in ((self.minimums, min, 'min'), (self.maximums, max, 'max')):
+                value = getattr(rollup, f'{measure}_{field}')
+                extremes[measure] = value if extremes[measure] is None else pick(extremes[measure], value)
+            self.sketches[measure].merge(QuantileSketch(getattr(rollup, f'{measure}_sketch')))
+
+    def fields(self):
+        """Values of the ResiduePriceRollup columns."""
+        values = {'count': self.count}
+        for measure in self.MEASURES:
+            values.update({
+                f'{measure}_sum': self.sums[measure],
+                f'{measure}_min': self.minimums[measure],
+                f'{measure}_max': self.maximums[measure],
+                f'{measure}_sketch': self.sketches[measure].buckets,
+            })
+        return values
+
+    def summary(self):
+        summary = {'count': self.count}
+        for measure in self.MEASURES:
+            sketch = self.sketches[measure]
+            low, high = self.minimums[measure], self.maximums[measure]
+            summary[measure] = {
+                'min': low,
+                'max': high,
+                'mean': self.sums[measure] / self.count if self.count else None,
+                # Bucket estimates are clamped to the exact extremes.
+                **{f'p{round(q * 100)}': None if not self.count else round(min(max(sketch.quantile(q), low), high), 2)
+                   for q in QUANTILES},
+            }
+        return summary
+
+
+def during(field, day):
+    """Lookups for `field` falling on `day` in the current time zone, usable with an index on it."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return {f'{field}__gte': start, f'{field}__lt': start + datetime.timedelta(days=1)}
+
+
+def cell_rows(kind, type_of_residue, region, day):
+    """(price, quantity) of the lots a rollup cell covers: listed that day, or sold that day for SOLD cells."""
+    from app.models import Residue, ResidueOrder, ResiduePriceRollup
+
+    if kind == ResiduePriceRollup.LISTED:
+        rows = Residue.objects.filter(type_of_residue=type_of_residue, **during('created_at', day))
+        fields = ['price', 'quantity']
+        region_field = 'region'
+    else:
+        rows = ResidueOrder.objects.filter(
+            status=ResidueOrder.ACCEPTED, residue__type_of_residue=type_of_residue, **during('accepted_at', day))
+        fields = ['residue__price', 'residue__quantity']
+        region_field = 'residue__region'
+    if region != ALL_REGIONS:
+        rows = rows.filter(**{region_field: region})
+    return rows.values_list(*fields)
+
+
+def update_cells(added=(), removed=()):
+    """
+    Merge lots into the rollup cells they count in and take lots out of
+    them, each lot a (kind, type, region, day, price, quantity) tuple. Every
+    lot also counts in its all-regions row. A row moves by the lot's own
+    values, without reading the other lots of its day, unless a lot taken
+    out may hold the row's minimum or maximum; that row is recomputed from
+    its lots. Call it once the lots are saved. Rows are locked first so
+    concurrent updates of a cell take turns.
+    """
+    from app.models import ResiduePriceRollup
+
+    changes = {}
+    for sign, lots in ((-1, removed), (1, added)):
+        for kind, type_of_residue, region, day, price, quantity in lots:
+            for cell_region in (region, ALL_REGIONS):
+                changes.setdefault((kind, type_of_residue, cell_region, day), []).append((sign, price, quantity))
+
+    with transaction.atomic():
+        for (kind, type_of_residue, region, day), cell_changes in sorted(changes.items()):
+            key = {'kind': kind, 'type_of_residue': type_of_residue, 'region': region, 'day': day}
+            rollup, _ = ResiduePriceRollup.objects.get_or_create(**key, defaults={'count': 0})
+            rollup = ResiduePriceRollup.objects.select_for_update().get(pk=rollup.pk)
+
+            stats = Stats()
+            stats.add_rollup(rollup)
+            for sign, price, quantity in cell_changes:
+                if sign > 0:
+                    stats.add(price, quantity)
+                elif not stats.remove(price, quantity):
+                    # The saved lots already hold every change of the cell.
+                    stats = Stats()
+                    for lot_price, lot_quantity in cell_rows(kind, type_of_residue, region, day):
+                        stats.add(lot_price, lot_quantity)
+                    break
+            if stats.count:
+                ResiduePriceRollup.objects.filter(pk=rollup.pk).update(**stats.fields())
+            else:
+                rollup.delete()
+
+
+def local_day(moment):
+    return timezone.localtime(moment).date()
+
+
+def residue_lots(residue, terms):
+    """
+    Lots a residue counts as under each of `terms`, (type, price, quantity)
+    tuples: its listing, and each of its sales.
+    """
+    from app.models import ResidueOrder, ResiduePriceRollup
+
+    accepted = residue.residueorder_set.filter(status=ResidueOrder.ACCEPTED).values_list('accepted_at', flat=True)
+    cells = [(ResiduePriceRollup.LISTED, local_day(residue.created_at))]
+    cells += [(ResiduePriceRollup.SOLD, local_day(moment)) for moment in accepted if moment]
+    return [[(kind, type_of_residue, residue.region, day, price, quantity) for kind, day in cells]
+            for type_of_residue, price, quantity in terms]
+
+
+def summarize(type_of_residue, region=ALL_REGIONS, days=30, today=None):
+    """
+    Listed and sold price and quantity statistics of a residue type over
+    the last `days` days, merged from at most `days` rollup rows per kind
+    with one query.
+    """
+    from app.models import ResiduePriceRollup
+
+    today = today or timezone.localdate()
+    rollups = ResiduePriceRollup.objects.filter(
+        type_of_residue=type_of_residue, region=region, day__gt=today - datetime.timedelta(days=days),
+        day__lte=today)
+    stats = {kind: Stats() for kind, _ in ResiduePriceRollup.KIND_CHOICES}
+    for rollup in rollups:
+        stats[rollup.kind].add_rollup(rollup)
+    return {kind: kind_stats.summary() for kind, kind_stats in stats.items()}
+
+
+def rebuild(batch_size=2000, apps=None):
+    """
+    Recompute every rollup row from scratch, streaming lots in cell order.
+    Migrations pass their `apps` to use the models as of that migration.
+    Returns the number of rows.
+    """
+    from app import models
+
+    apps = apps or django_apps
+    Residue = apps.get_model('app', 'Residue')
+    ResidueOrder = apps.get_model('app', 'ResidueOrder')
+    ResiduePriceRollup = apps.get_model('app', 'ResiduePriceRollup')
+    sources = [
+        (models.ResiduePriceRollup.LISTED, Residue.objects.all(), '', ['price', 'quantity']),
+        (models.ResiduePriceRollup.SOLD, ResidueOrder.objects.filter(status=models.ResidueOrder.ACCEPTED), 'residue__',
+         ['residue__price', 'residue__quantity']),
+    ]
+    with transaction.atomic():
+        ResiduePriceRollup.objects.all().delete()
+        created = 0
+        for kind, rows, prefix, fields in sources:
+            moment_field = 'created_at' if kind == models.ResiduePriceRollup.LISTED else 'accepted_at'
+            cells = {}
+            rows = rows.values_list(f'{prefix}type_of_residue', f'{prefix}region', moment_field, *fields)
+            for type_of_residue, region, moment, price, quantity in rows.iterator(chunk_size=batch_size):
+                if moment is None:
+                    continue
+                day = local_day(moment)
+                for cell_region in (region, ALL_REGIONS):
+                    cells.setdefault((type_of_residue, cell_region, day), Stats()).add(price, quantity)
+            ResiduePriceRollup.objects.bulk_create([
+                ResiduePriceRollup(kind=kind, type_of_residue=type_of_residue, region=region, day=day, **stats.fields())
+                for (type_of_residue, region, day), stats in cells.items()
+            ], batch_size=batch_size)
+            created += len(cells)
+    return created
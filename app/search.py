@@ -0,0 +1,102 @@
+import re
+
+from django.db import models
+
+# Full-text index over Machine.name, description and the keys and values of
+# the details JSON, kept in sync with app_machine by triggers. SQLite only.
+FTS_TABLE = 'app_machine_fts'
+
+# Token prefix lengths with their own index entries. A prefix query of one of
+# these lengths reads one doclist instead of merging the doclists of every
+# token it matches, which for common prefixes is most of the cost.
+PREFIX_LENGTHS = '2 3 4 5 6 7 8'
+
+FLATTEN_DETAILS = (
+    "(SELECT group_concat(CASE WHEN typeof(key) = 'text' THEN key || ' ' ELSE '' END || coalesce(atom, ''), ' ') "
+    "FROM json_tree({row}.details))"
+)
+
+INSERT_ROW = (
+    f'INSERT INTO {FTS_TABLE}(rowid, name, description, details) '
+    f'VALUES (new.id, new.name, new.description, {FLATTEN_DETAILS.format(row="new")});'
+)
+
+DELETE_ROW = f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id;'
+
+INSTALL_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, description, details, "
+    f"prefix='{PREFIX_LENGTHS}')",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON app_machine BEGIN {INSERT_ROW} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description, details ON app_machine '
+    f'BEGIN {DELETE_ROW} {INSERT_ROW} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON app_machine BEGIN {DELETE_ROW} END',
+]
+
+UNINSTALL_STATEMENTS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+REBUILD_STATEMENTS = [
+    f'DELETE FROM {FTS_TABLE}',
+    f'INSERT INTO {FTS_TABLE}(rowid, name, description, details) '
+    f'SELECT id, name, description, {FLATTEN_DETAILS.format(row="app_machine")} FROM app_machine',
+]
+
+
+def install_machine_search(connection):
+    """
+    Create the index table and its triggers when they are missing. SQLite
+    drops triggers whenever a migration rebuilds app_machine, so this also
+    runs after every migrate.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in INSTALL_STATEMENTS:
+            cursor.execute(statement)
+
+
+def rebuild_machine_search(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in REBUILD_STATEMENTS:
+            cursor.execute(statement)
+
+
+class FullTextField(models.TextField):
+    """The hidden column named after an FTS5 table, used as the left side of MATCH."""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def to_match_query(text):
+    """
+    Turn free text into an FTS5 query that ANDs a prefix match for every
+    word, so user input can never produce an FTS5 syntax error.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search_machines(machines, text):
+    """
+    Restrict a Machine queryset to `text` matches, annotated with their bm25
+    `search_rank`. Every match is ranked, so the cost grows with the number
+    of matches; pages are cut with a keyset on (search_rank, id), see
+    app.pagination.SearchRankPagination.
+    """
+    query = to_match_query(text)
+    if not query:
+        return machines.none()
+    return machines.filter(search__document__match=query).annotate(search_rank=models.F('search__rank'))
@@ -1,8 +1,14 @@
+import datetime
+
 from django.contrib.auth import password_validation
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
 
+from app.availability import MAX_RENTAL_DAYS
+from app.geo import MAX_RADIUS_KM
 from app.models import (Bookmark, CartItem, Delivery, Machine, Order,
-                        RentOrder, Residue, ResidueOrder, User)
+                        RentOrder, Residue, ResidueBid, ResidueOrder, User)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,17 +26,35 @@ class UserUpdateSerializer(serializers.ModelSerializer):
                   'phone', 'is_industry', 'location']
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Machine.image_variants with storage names turned into URLs."""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        urls = {}
+        for width, names in variants.items():
+            urls[width] = {}
+            for image_format, name in names.items():
+                url = default_storage.url(name)
+                urls[width][image_format] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
 class MachineSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Machine
-        fields = ['id', 'owner', 'name', 'description', 'details', 'quantity', 'warranty', 'guarantee', 'loyalty', 'for_sale', 'for_rent', 'sell_price', 'rent_price', 'discount', 'image']
+        fields = ['id', 'owner', 'name', 'description', 'details', 'quantity', 'warranty', 'guarantee', 'loyalty', 'for_sale', 'for_rent', 'sell_price', 'rent_price', 'discount', 'image', 'image_variants']
         read_only_fields = ['id', 'owner']
 
 
 class RentMachineSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Machine
-        fields = ['id', 'owner', 'name', 'description', 'rent_price', 'discount', 'image']
+        fields = ['id', 'owner', 'name', 'description', 'rent_price', 'discount', 'image', 'image_variants']
         read_only_fields = ['id', 'owner']
 
 
@@ -67,6 +91,11 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'customer', 'machine', 'quantity', 'status']
         read_only_fields = ['id', 'customer']
 
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError('quantity should be a positive integer')
+        return value
+
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     customer = UserSerializer()
@@ -89,8 +118,23 @@ class OrderCustomerSerializer(serializers.ModelSerializer):
 class RentOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = RentOrder
-        fields = ['id', 'customer', 'machine', 'num_of_days', 'status']
-        read_only_fields = ['id', 'customer']
+        fields = ['id', 'customer', 'machine', 'num_of_days', 'start_date', 'end_date', 'status']
+        read_only_fields = ['id', 'customer', 'end_date']
+
+    def validate_num_of_days(self, value):
+        if not 1 <= value <= MAX_RENTAL_DAYS:
+            raise serializers.ValidationError('num_of_days should be between 1 and {}'.format(MAX_RENTAL_DAYS))
+        return value
+
+    def validate_start_date(self, value):
+        if value < timezone.localdate():
+            raise serializers.ValidationError('start_date should not be in the past')
+        return value
+
+    def validate(self, data):
+        if 'start_date' in data and 'num_of_days' in data:
+            data['end_date'] = data['start_date'] + datetime.timedelta(days=data['num_of_days'])
+        return data
 
 
 class ResidueOrderCreateSerializer(serializers.ModelSerializer):
@@ -106,7 +150,35 @@ class ResidueOrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ResidueOrder
-        fields = ['id', 'customer', 'residue', 'status']
+        fields = ['id', 'customer', 'residue', 'bid', 'status']
+
+
+class ResidueBidSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResidueBid
+        fields = ['id', 'buyer', 'type_of_residue', 'max_price', 'quantity', 'remaining', 'location', 'radius_km',
+                  'created_at']
+        read_only_fields = ['id', 'buyer', 'remaining', 'created_at']
+
+    def validate_type_of_residue(self, value):
+        if self.instance is not None and value != self.instance.type_of_residue:
+            raise serializers.ValidationError('type_of_residue of a bid cannot change')
+        return value
+
+    def validate_max_price(self, value):
+        if value < 0:
+            raise serializers.ValidationError('max_price should not be negative')
+        return value
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError('quantity should be a positive integer')
+        return value
+
+    def validate_radius_km(self, value):
+        if value is not None and not 0 < value <= MAX_RADIUS_KM:
+            raise serializers.ValidationError('radius_km should be between 0 and {}'.format(MAX_RADIUS_KM))
+        return value
 
 
 class CartItemCreateSerializer(serializers.ModelSerializer):
@@ -116,6 +188,15 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
         write_only_fields = ['cart']
 
 
+class CartItemInputSerializer(serializers.Serializer):
+    machine = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartItemBatchSerializer(serializers.Serializer):
+    items = serializers.ListField(child=CartItemInputSerializer())
+
+
 class CartItemDetailSerializer(serializers.ModelSerializer):
     machine = MachineSerializer()
 
@@ -0,0 +1,55 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+# Applied to every new connection by app.sqlite.base, in this order
+PRAGMAS = [
+    ('journal_mode', 'JOURNAL_MODE', 'wal'),
+    ('synchronous', 'SYNCHRONOUS', 'normal'),
+    ('busy_timeout', 'BUSY_TIMEOUT', 5000),
+    ('mmap_size', 'MMAP_SIZE', 256 * 1024 * 1024),
+    ('cache_size', 'CACHE_SIZE', -64 * 1024),
+    ('temp_store', 'TEMP_STORE', 'memory'),
+]
+
+
+def _option(name, default):
+    return getattr(settings, 'SQLITE', {}).get(name, default)
+
+
+def pragmas():
+    """(pragma, value) pairs for a new connection, from settings.SQLITE."""
+    return [(pragma, _option(name, default)) for pragma, name, default in PRAGMAS]
+
+
+def immediate_transactions():
+    return _option('IMMEDIATE_TRANSACTIONS', True)
+
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def retry_when_locked(func):
+    """
+    Run `func` again after a random pause, doubling each time from
+    SQLITE['RETRY_BACKOFF'] seconds, when SQLite still reports the database
+    locked after its busy timeout. Only calls outside a transaction retry;
+    one that failed inside an outer transaction cannot be resumed.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or connection.in_atomic_block or attempt >= _option('RETRIES', 3):
+                    raise
+            delay = _option('RETRY_BACKOFF', 0.05) * 2 ** attempt
+            time.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+    return wrapper
@@ -0,0 +1,29 @@
+from django.db.backends.sqlite3 import base
+
+from app.sqlite import immediate_transactions, pragmas
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The stock SQLite backend set up for concurrent requests. Every new
+    connection gets the pragmas of settings.SQLITE: a write-ahead log, so
+    readers and the writer do not block each other, relaxed syncing, memory
+    mapping, a larger page cache and a busy timeout.
+
+    Transactions begin IMMEDIATE, taking the write lock up front. With the
+    default deferred BEGIN, two transactions that read and then write both
+    hold read locks when they try to write, and SQLite fails one of them
+    with "database is locked" at once instead of letting it wait.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in pragmas():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if immediate_transactions():
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
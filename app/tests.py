@@ -0,0 +1,980 @@
+import base64
+import csv
+import datetime
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app import matching, rollups
+from app.authentication import AuthCache, auth_cache
+from app.availability import schedule_cache
+from app.catalog_import import CatalogImport
+from app.dashboard import reconcile
+from app.geo import haversine_km, nearest_first
+from app.images import variant_formats
+from app.management.benchmark import call_view
+from app.management.commands.check_query_plans import Command as CheckQueryPlans
+from app.management.commands.check_query_plans import full_scans, partial_indexes, query_plans
+from app.middleware import QueryBudgetExceeded, is_transaction_control
+from app.models import (CartItem, Connection, Machine, Order, RentOrder, Residue, ResidueBid, ResidueOrder,
+                        ResiduePriceRollup, User)
+from app.order_book import Ask, Bid, Match, OrderBook
+from app.replicas import replicate
+from app.search import search_machines
+from app.views import CartView, MachinesView, OrdersView, RentOrdersView, ResidueOrdersView, ResiduesView
+
+
+def query_budget(path, method='GET'):
+    """The budget the view behind `path` declares for `method`, as QueryInstrumentationMiddleware reads it."""
+    func = resolve(path).func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    return view_class.query_budgets[method]
+
+
+def budgeted(queries):
+    """Captured statements as query budgets count them, leaving out transaction control."""
+    return len([query for query in queries if not is_transaction_control(query['sql'])])
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.machine = Machine.objects.create(owner=self.industry, name='Tractor', description='', quantity=3)
+
+    def order(self, quantity):
+        client = APIClient()
+        client.force_authenticate(self.farmer)
+        return client.post('/api/orders/', {'machine': self.machine.pk, 'quantity': quantity}, format='json')
+
+    def set_status(self, order_id, status):
+        client = APIClient()
+        client.force_authenticate(self.industry)
+        return client.put(f'/api/orders/{order_id}', {'status': status}, format='json')
+
+    def stock(self):
+        return Machine.objects.values_list('quantity', flat=True).get(pk=self.machine.pk)
+
+    def test_orders_take_stock_until_it_runs_out(self):
+        first = self.order(2)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(self.stock(), 1)
+
+        response = self.order(2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('machine', response.data)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_rejecting_releases_stock_and_unrejecting_takes_it_again(self):
+        order_id = self.order(2).data['id']
+        self.assertEqual(self.set_status(order_id, Order.REJECTED).status_code, 200)
+        self.assertEqual(self.stock(), 3)
+
+        # The released units went to another order meanwhile.
+        self.assertEqual(self.order(2).status_code, 201)
+        self.assertEqual(self.set_status(order_id, Order.PENDING).status_code, 400)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.REJECTED)
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.farmer.auth_token.key}')
+        auth_cache.clear()
+
+    def fill_cart(self, lines):
+        Machine.objects.bulk_create(
+            Machine(owner=self.industry, name=f'Machine {i}', description='', details={}, quantity=10,
+                    sell_price=1000) for i in range(lines))
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.farmer.cart, machine=machine, quantity=2) for machine in Machine.objects.all())
+
+    def test_checkout_queries_do_not_grow_with_cart_lines(self):
+        # The first checkout also creates the customer's order counter, so it
+        # runs every statement the view's budget allows for.
+        self.fill_cart(50)
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/checkout')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(budgeted(queries), query_budget('/api/cart/checkout', 'POST'))
+        self.assertEqual(len(response.data['items']), 50)
+        self.assertEqual(Order.objects.filter(customer=self.farmer).count(), 50)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.farmer).exists())
+        self.assertEqual(set(Machine.objects.values_list('quantity', flat=True)), {8})
+
+    def test_malformed_cart_bodies_are_rejected(self):
+        machine = Machine.objects.create(owner=self.industry, name='Tractor', description='')
+        for body in [[{'machine': machine.pk}], 5, 'items', {}, {'items': {'machine': machine.pk}},
+                     {'items': [{'quantity': 1}]}, {'items': [5]}]:
+            with self.subTest(body=body):
+                response = self.client.post('/api/cart/', body, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.post('/api/cart/', {'items': [{'machine': machine.pk}]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CartItem.objects.get().machine, machine)
+
+
+class QueryBudgetTests(TestCase):
+    """Endpoints stay within their views' query_budgets however many rows there are."""
+
+    def setUp(self):
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.machines = [Machine.objects.create(owner=self.industry, name=f'Machine {i}', description='',
+                                                for_rent=True, rent_price=50) for i in range(10)]
+
+    def seed(self, count):
+        machines = self.machines
+        last_residue = Residue.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Order.objects.bulk_create(Order(customer=self.farmer, machine=machines[i % len(machines)]) for i in range(count))
+        RentOrder.objects.bulk_create(
+            RentOrder(customer=self.farmer, machine=machines[i % len(machines)], num_of_days=1, start_date='2026-01-01',
+                      end_date='2026-01-02') for i in range(count))
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.farmer.cart, machine=machines[i % len(machines)]) for i in range(count))
+        Residue.objects.bulk_create(Residue(owner=self.farmer) for _ in range(count))
+        ResidueOrder.objects.bulk_create(
+            ResidueOrder(customer=self.industry, residue_id=pk)
+            for pk in Residue.objects.filter(pk__gt=last_residue).values_list('pk', flat=True))
+
+    def count_queries(self, path, user, method='GET', data=None, expected_status=200):
+        """Queries of a whole token-authenticated request, with the credentials not yet cached."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        auth_cache.clear()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(method, path, data=None if data is None else json.dumps(data),
+                                      content_type='application/json')
+        self.assertEqual(response.status_code, expected_status)
+        return budgeted(queries)
+
+    def test_list_endpoints_stay_within_budget(self):
+        endpoints = [
+            ('/api/orders/', self.industry),
+            ('/api/orders/', self.farmer),
+            ('/api/rent-orders/', self.industry),
+            ('/api/rent-orders/', self.farmer),
+            ('/api/residues/', self.industry),
+            ('/api/residue-orders/', self.farmer),
+            ('/api/residue-orders/', self.industry),
+            ('/api/cart/', self.farmer),
+            ('/api/dashboard/', self.industry),
+            ('/api/connections/', self.farmer),
+        ]
+        seeded = 0
+        for size in [10, 1000, 10000]:
+            self.seed(size - seeded)
+            seeded = size
+            for path, user in endpoints:
+                with self.subTest(path=path, user=user.username, rows=size):
+                    self.assertLessEqual(self.count_queries(path, user), query_budget(path))
+
+    def test_exceeding_a_budget_fails_the_request(self):
+        with mock.patch.dict(CartView.query_budgets, {'GET': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.count_queries('/api/cart/', self.farmer)
+
+    def test_cart_writes_stay_within_budget(self):
+        buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        Machine.objects.bulk_create(
+            Machine(owner=self.industry, name=f'Stocked {i}', description='', quantity=10 ** 6, sell_price=1000)
+            for i in range(50))
+        items = [{'machine': pk, 'quantity': 1}
+                 for pk in Machine.objects.filter(name__startswith='Stocked').values_list('pk', flat=True)]
+        seeded = 0
+        for size in [10, 1000, 10000]:
+            self.seed(size - seeded)
+            seeded = size
+            with self.subTest(rows=size):
+                # The second batch adds to the lines the first one created.
+                for _ in range(2):
+                    self.assertLessEqual(
+                        self.count_queries('/api/cart/', buyer, 'POST', {'items': items}, 201),
+                        query_budget('/api/cart/', 'POST'))
+                self.assertLessEqual(
+                    self.count_queries('/api/cart/checkout', buyer, 'POST', expected_status=201),
+                    query_budget('/api/cart/checkout', 'POST'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.machine = Machine.objects.create(owner=self.industry, name='Tractor', description='', for_sale=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.farmer)
+        cache.clear()
+
+    def test_matching_etag_gets_304_until_the_object_changes(self):
+        for path, client in [('/api/machines/', self.client), (f'/api/machines/{self.machine.pk}', self.client),
+                             ('/api/machines/', APIClient())]:
+            with self.subTest(path=path, anonymous=client is not self.client):
+                etag = client.get(path)['ETag']
+                response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.content)
+
+                self.machine.name = f'Tractor {etag}'
+                self.machine.save()
+                response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_the_representation(self):
+        own = self.client.get('/api/machines/', {'own': 'true'})['ETag']
+        self.assertNotEqual(self.client.get('/api/machines/')['ETag'], own)
+        self.assertEqual(self.client.get('/api/machines/', HTTP_IF_NONE_MATCH=f'"other", {own}').status_code, 200)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS={'WIDTHS': [160, 320], 'WORKERS': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+
+    def upload(self, color):
+        output = io.BytesIO()
+        Image.new('RGB', (400, 200), color).save(output, 'PNG')
+        return SimpleUploadedFile(f'{color}.png', output.getvalue(), content_type='image/png')
+
+    def test_variants_are_generated_after_commit_and_replaced_with_the_image(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            machine = Machine.objects.create(owner=self.industry, name='Tractor', description='',
+                                             image=self.upload('red'))
+        machine.refresh_from_db()
+        self.assertEqual(set(machine.image_variants), {'160', '320'})
+        for width, names in machine.image_variants.items():
+            self.assertEqual(set(names), set(variant_formats()))
+            with default_storage.open(names['jpeg']) as variant:
+                self.assertEqual(Image.open(variant).size, (int(width), int(width) // 2))
+
+        client = APIClient()
+        client.force_authenticate(self.industry)
+        response = client.get(f'/api/machines/{machine.pk}')
+        self.assertEqual(response.data['image_variants']['320']['jpeg'],
+                         'http://testserver' + default_storage.url(machine.image_variants['320']['jpeg']))
+
+        old_names = {name for names in machine.image_variants.values() for name in names.values()}
+        with self.captureOnCommitCallbacks(execute=True):
+            machine.image = self.upload('blue')
+            machine.save()
+        machine.refresh_from_db()
+        new_names = {name for names in machine.image_variants.values() for name in names.values()}
+        self.assertFalse(old_names & new_names)
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+        self.assertTrue(all(default_storage.exists(name) for name in new_names))
+
+
+class MediaServingTests(TestCase):
+    name = 'machine_images/tractor.0123456789ab.jpg'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.data = bytes(range(256)) * 4
+        self.path = os.path.join(media_root, self.name)
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as file:
+            file.write(self.data)
+
+    def get(self, **extra):
+        return self.client.get(f'/media/{self.name}', **extra)
+
+    def test_byte_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(response['Content-Range'], 'bytes 1014-1023/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+        response = self.get(HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    def test_front_end_server_handoff(self):
+        with override_settings(MEDIA_SERVING={'MODE': 'x-sendfile'}):
+            response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], self.path)
+        self.assertFalse(response.content)
+
+        with override_settings(MEDIA_SERVING={'MODE': 'x-accel-redirect', 'ACCEL_REDIRECT_PREFIX': '/protected/'}):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.name}')
+        self.assertFalse(response.content)
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        auth_cache.clear()
+
+    def token_lookups(self):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return len([query for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_token_is_looked_up_once(self):
+        self.assertEqual(self.token_lookups(), 1)
+        self.assertEqual(self.token_lookups(), 0)
+
+    def test_revoked_token_and_deactivated_user_are_rejected_while_cached(self):
+        self.assertEqual(self.token_lookups(), 1)
+        self.user.auth_token.delete()
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.token_lookups(), 1)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+    def test_changed_password_drops_cached_basic_credentials(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'farmer:password').decode())
+        self.assertEqual(client.get('/api/orders/').status_code, 200)
+        self.user.set_password('n3w-passw0rd!')
+        self.user.save()
+        self.assertEqual(client.get('/api/orders/').status_code, 401)
+
+    @override_settings(AUTH_CACHE={'TTL': 60, 'MAX_SIZE': 2})
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        entries = AuthCache()
+        with mock.patch('app.authentication.time.monotonic', return_value=1000):
+            entries.set('a', 1, 'A')
+            entries.set('b', 2, 'B')
+            self.assertEqual(entries.get('a'), 'A')
+            entries.set('c', 3, 'C')
+            self.assertIsNone(entries.get('b'))
+            self.assertEqual((entries.get('a'), entries.get('c')), ('A', 'C'))
+        with mock.patch('app.authentication.time.monotonic', return_value=1061):
+            self.assertIsNone(entries.get('a'))
+
+
+class NearestFirstTests(TestCase):
+    def test_owners_within_radius_nearest_first(self):
+        ludhiana = (30.901, 75.857)
+        locations = ['Ludhiana', 'Moga', 'Jalandhar', 'Barnala', 'Amritsar', 'Chennai', '']
+        owners = [User.objects.create_user(f'owner{i}', f'owner{i}@example.com', 'password', location=location)
+                  for i, location in enumerate(locations * 3)]
+        for owner in owners:
+            Machine.objects.create(owner=owner, name=owner.location, description='')
+
+        expected = sorted(
+            (haversine_km(*ludhiana, owner.latitude, owner.longitude), owner.pk) for owner in owners
+            if owner.latitude is not None and haversine_km(*ludhiana, owner.latitude, owner.longitude) <= 80)
+        with self.assertNumQueries(2):
+            machines = list(nearest_first(Machine.objects.all(), ludhiana, 80).order_by('near_key'))
+
+        self.assertEqual([machine.owner_id for machine in machines], [pk for _, pk in expected])
+        self.assertEqual({machine.name for machine in machines}, {'Ludhiana', 'Moga', 'Jalandhar', 'Barnala'})
+
+    def test_anonymous_catalog_follows_owners_that_move(self):
+        cache.clear()
+        owners = [User.objects.create_user(location, f'{location}@example.com', 'password', location=location)
+                  for location in ['Ludhiana', 'Jalandhar', 'Amritsar']]
+        for owner in owners:
+            Machine.objects.create(owner=owner, name=owner.username, description='', for_sale=True)
+
+        def nearest():
+            response = APIClient().get('/api/machines/', {'near': '30.901,75.857', 'radius_km': 200})
+            return [machine['name'] for machine in response.data['results']]
+
+        self.assertEqual(nearest(), ['Ludhiana', 'Jalandhar', 'Amritsar'])
+        owners[0].location = 'Amritsar'
+        owners[0].save()
+        self.assertEqual(nearest(), ['Jalandhar', 'Ludhiana', 'Amritsar'])
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS={'WIDTHS': [160], 'WORKERS': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.industry)
+
+    def images(self, *names):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as images:
+            for name in names:
+                image = io.BytesIO()
+                Image.new('RGB', (200, 100), 'green').save(image, 'PNG')
+                images.writestr(name, image.getvalue())
+        return SimpleUploadedFile('images.zip', archive.getvalue(), content_type='application/zip')
+
+    def import_catalog(self, name, content, images=None):
+        data = {'file': SimpleUploadedFile(name, content.encode())}
+        if images is not None:
+            data['images'] = images
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/machines/import', data, format='multipart')
+
+    def test_csv_rows_are_created_and_invalid_rows_reported_by_line(self):
+        content = (
+            'name,description,sell_price,details,image\n'
+            'Tractor,Red,1000,"{""hp"": 45}",tractor.png\n'
+            ',No name,1000,,tractor.png\n'
+            'Tiller,Green,oops,,tractor.png\n'
+            'Harrow,Blue,500,not json,tractor.png\n'
+            'Seeder,Yellow,700,,missing.png\n'
+            'Rotavator,Grey,800,,tractor.png\n'
+        )
+        response = self.import_catalog('catalog.csv', content, self.images('tractor.png'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 4))
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4, 5, 6])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        self.assertIn('details', response.data['errors'][2]['errors'])
+        self.assertIn('image', response.data['errors'][3]['errors'])
+
+        machines = Machine.objects.filter(owner=self.industry).order_by('pk')
+        self.assertEqual([machine.name for machine in machines], ['Tractor', 'Rotavator'])
+        self.assertEqual(machines[0].details, {'hp': 45})
+        self.assertTrue(all(machine.image and machine.image_variants for machine in machines))
+
+    def test_ndjson_is_inserted_in_chunks(self):
+        lines = [json.dumps({'name': f'Machine {i}', 'description': 'Used', 'image': 'machine.png'}) for i in range(5)]
+        lines.insert(2, '[1, 2]')
+        chunks = []
+        insert = CatalogImport.insert
+
+        def record_chunk(catalog_import, pending):
+            chunks.append(len(pending))
+            insert(catalog_import, pending)
+
+        catalog_import = CatalogImport(self.industry, images=self.images('machine.png'), chunk_size=2)
+        with mock.patch.object(CatalogImport, 'insert', record_chunk):
+            result = catalog_import.run(io.BytesIO('\n'.join(lines).encode()), 'ndjson')
+
+        self.assertEqual(chunks, [2, 2, 1])
+        self.assertEqual((result['created'], result['failed']), (5, 1))
+        self.assertEqual(result['errors'], [{'line': 3, 'errors': {'non_field_errors': ['Expected a JSON object.']}}])
+        # Later chunks reuse the image the first chunk stored.
+        images = list(Machine.objects.filter(owner=self.industry).order_by('pk').values_list('image', flat=True))
+        self.assertEqual(images[2:], [images[0]] * 3)
+
+    def test_only_industry_sellers_import(self):
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.client.force_authenticate(farmer)
+        response = self.import_catalog('catalog.ndjson', '{"name": "Tractor", "description": ""}\n')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Machine.objects.exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password', location='Pune')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        machine = Machine.objects.create(owner=self.industry, name='Tractor, red', description='', quantity=100)
+        for customer, status in [(self.farmer, Order.PENDING)] * 4 + [(self.farmer, Order.ACCEPTED), (other, Order.PENDING)]:
+            Order.objects.create(customer=customer, machine=machine, status=status)
+        RentOrder.objects.create(customer=self.farmer, machine=machine, num_of_days=2,
+                                 start_date=datetime.date(2026, 3, 1), end_date=datetime.date(2026, 3, 3))
+
+    def export(self, user, path, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(path, params)
+
+    def test_csv_streams_the_filtered_orders_in_chunks(self):
+        with mock.patch('app.export.CHUNK_SIZE', 2):
+            response = self.export(self.industry, '/api/orders/export.csv', status=Order.PENDING)
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.csv"')
+        # The header, the first row on its own, then CHUNK_SIZE rows at a time.
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [1, 1, 2, 2])
+        rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['status'] for row in rows}, {Order.PENDING})
+        self.assertEqual({row['machine_name'] for row in rows}, {'Tractor, red'})
+        self.assertEqual(sorted(row['customer_username'] for row in rows), ['farmer'] * 4 + ['other'])
+
+    def test_ndjson_holds_the_users_own_history(self):
+        response = self.export(self.industry, '/api/rent-orders/export.ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['start_date'], '2026-03-01')
+        self.assertEqual((rows[0]['customer_username'], rows[0]['customer_location']), ('farmer', 'Pune'))
+
+        response = self.export(self.farmer, '/api/orders/export.ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['customer_username'] for row in rows], ['farmer'] * 5)
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self.export(self.farmer, '/api/orders/export.xlsx').status_code, 404)
+
+
+class RentalBookingTests(TestCase):
+    def setUp(self):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.machine = Machine.objects.create(owner=industry, name='Tractor', description='', quantity=1,
+                                              for_rent=True, rent_price=50)
+        self.client = APIClient()
+        self.client.force_authenticate(self.farmer)
+        schedule_cache.clear()
+
+    def book(self, start, days):
+        return self.client.post('/api/rent-orders/', {'machine': self.machine.pk, 'start_date': start,
+                                                      'num_of_days': days}, format='json')
+
+    def test_booking_bumps_version_once_and_keeps_schedule_cached(self):
+        start = timezone.localdate() + datetime.timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.book(start, 3).status_code, 201)
+
+        self.machine.refresh_from_db()
+        self.assertEqual(self.machine.rental_version, 1)
+        schedule = schedule_cache.get(self.machine.pk, 1)
+        self.assertIsNotNone(schedule)
+        self.assertEqual(schedule.booked(start, start + datetime.timedelta(days=3)), 1)
+        self.assertEqual(schedule.booked(start + datetime.timedelta(days=3), start + datetime.timedelta(days=5)), 0)
+
+        # Checked against the cached schedule, without loading the bookings.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.book(start + datetime.timedelta(days=2), 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse([query for query in queries if 'app_rentorder' in query['sql']])
+
+
+class OrderBookTests(TestCase):
+    def test_price_time_priority(self):
+        book = OrderBook()
+        book.add_bid(Bid(1, buyer_id=10, max_price=100, remaining=20), match=False)
+        book.add_bid(Bid(2, buyer_id=11, max_price=120, remaining=20), match=False)
+        book.add_bid(Bid(3, buyer_id=12, max_price=120, remaining=20), match=False)
+
+        # The highest bid wins, and the older of two equal bids.
+        self.assertEqual(book.add_ask(Ask(1, owner_id=20, price=90, quantity=15)), [Match(2, 11, 1, 90, 15)])
+        # Bid 2 has 5 units left, too few for the whole lot.
+        self.assertEqual(book.add_ask(Ask(2, owner_id=20, price=90, quantity=10)), [Match(3, 12, 2, 90, 10)])
+        # No bid reaches the price, so the lot waits in the book.
+        self.assertEqual(book.add_ask(Ask(3, owner_id=20, price=130, quantity=1)), [])
+        self.assertEqual(book.depth()['asks'], [{'price': 130, 'quantity': 1, 'orders': 1}])
+
+    def test_bid_takes_the_cheapest_lots_it_can(self):
+        book = OrderBook()
+        for residue_id, price, quantity in [(1, 50, 5), (2, 40, 8), (3, 45, 4), (4, 60, 1)]:
+            book.add_ask(Ask(residue_id, owner_id=20, price=price, quantity=quantity), match=False)
+        book.declined.add((1, 3))
+
+        matches = book.add_bid(Bid(1, buyer_id=10, max_price=55, remaining=14))
+        self.assertEqual([(match.residue_id, match.price) for match in matches], [(2, 40), (1, 50)])
+        self.assertEqual(set(book.asks), {3, 4})
+        self.assertEqual(book.bids[1].remaining, 1)
+
+    def test_radius_and_own_lots(self):
+        book = OrderBook()
+        book.add_ask(Ask(1, owner_id=10, price=10, quantity=1), match=False)
+        book.add_ask(Ask(2, owner_id=20, price=10, quantity=1, point=(13.08, 80.27)), match=False)
+        book.add_ask(Ask(3, owner_id=20, price=10, quantity=1, point=(30.90, 75.85)), match=False)
+
+        matches = book.add_bid(Bid(1, buyer_id=10, max_price=10, remaining=5, point=(30.90, 75.86), radius_km=50))
+        self.assertEqual([match.residue_id for match in matches], [3])
+
+
+class ResidueMatchingTests(TestCase):
+    def setUp(self):
+        matching.books.clear()
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.industry)
+
+    def test_standing_bid_places_orders_and_rejection_frees_the_lot(self):
+        cheap = Residue.objects.create(owner=self.farmer, type_of_residue=Residue.RICE_HUSK, price=100, quantity=10)
+        Residue.objects.create(owner=self.farmer, type_of_residue=Residue.RICE_HUSK, price=150, quantity=10)
+        response = self.client.post('/api/residue-bids/', {
+            'type_of_residue': Residue.RICE_HUSK, 'max_price': 120, 'quantity': 15}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        order = ResidueOrder.objects.get()
+        self.assertEqual((order.customer, order.residue, order.bid_id), (self.industry, cheap, response.data['id']))
+        bid = ResidueBid.objects.get()
+        self.assertEqual(bid.remaining, 5)
+
+        # A lot listed later is matched as it arrives.
+        small = Residue.objects.create(owner=self.farmer, type_of_residue=Residue.RICE_HUSK, price=110, quantity=5)
+        self.assertTrue(ResidueOrder.objects.filter(residue=small, bid=bid).exists())
+        bid.refresh_from_db()
+        self.assertEqual(bid.remaining, 0)
+
+        farmer = APIClient()
+        farmer.force_authenticate(self.farmer)
+        response = farmer.put(f'/api/residue-orders/{order.pk}', {'status': ResidueOrder.REJECTED}, format='json')
+        self.assertEqual(response.status_code, 200)
+        bid.refresh_from_db()
+        self.assertEqual(bid.remaining, 10)
+        # The rejected pair is not matched again, so the lot is back on offer.
+        self.assertEqual(ResidueOrder.objects.filter(residue=cheap).count(), 1)
+        depth = self.client.get('/api/residues/book', {'type': Residue.RICE_HUSK}).data
+        self.assertEqual([level['price'] for level in depth['asks']], [100, 150])
+        self.assertEqual(depth['bids'], [{'price': 120, 'quantity': 10, 'orders': 1}])
+
+
+class ResidueRollupTests(TestCase):
+    def rollups(self):
+        return sorted(ResiduePriceRollup.objects.values_list(
+            'kind', 'type_of_residue', 'region', 'day', 'count', 'price_sum', 'price_min', 'price_max', 'price_sketch',
+            'quantity_sum', 'quantity_min', 'quantity_max', 'quantity_sketch'))
+
+    def test_merged_rollups_match_a_rebuild(self):
+        industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmers = [User.objects.create_user(f'farmer{i}', f'farmer{i}@example.com', 'password', location=location)
+                   for i, location in enumerate(['Ludhiana', 'Karnal'])]
+        residues = [Residue.objects.create(owner=farmers[i % 2], type_of_residue=Residue.RICE_STRAW,
+                                           price=100 + 10 * i, quantity=1 + i) for i in range(8)]
+        orders = [ResidueOrder.objects.create(customer=industry, residue=residue) for residue in residues[:5]]
+        for order in orders:
+            order.status = ResidueOrder.ACCEPTED
+            order.save()
+
+        orders[0].status = ResidueOrder.REJECTED
+        orders[0].save()
+        residues[2].price = 300
+        residues[2].save()
+        residues[3].type_of_residue = Residue.WHEAT_STRAW
+        residues[3].save()
+        residues[7].delete()
+        residues[4].delete()
+
+        merged = self.rollups()
+        self.assertTrue(merged)
+        rollups.rebuild()
+        self.assertEqual(merged, self.rollups())
+
+
+class QuantileSketchTests(TestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        self.values = [round(generator.lognormvariate(6, 1.5), 2) for _ in range(5000)]
+
+    def test_quantiles_are_within_alpha_of_the_exact_ones(self):
+        sketch = rollups.QuantileSketch()
+        for value in self.values:
+            sketch.add(value)
+
+        ordered = sorted(self.values)
+        for q in [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1]:
+            with self.subTest(q=q):
+                exact = ordered[math.floor(q * (len(ordered) - 1))]
+                self.assertLessEqual(abs(sketch.quantile(q) - exact), rollups.ALPHA * exact * (1 + 1e-9))
+
+    def test_merged_and_removed_sketches_match_one_built_at_once(self):
+        whole = rollups.QuantileSketch()
+        for value in self.values:
+            whole.add(value)
+
+        first, second = rollups.QuantileSketch(), rollups.QuantileSketch()
+        for value in self.values[:2500]:
+            first.add(value)
+        for value in self.values[2500:]:
+            second.add(value)
+        first.merge(rollups.QuantileSketch(json.loads(json.dumps(second.buckets))))
+        self.assertEqual(first.buckets, whole.buckets)
+
+        for value in self.values[2500:]:
+            whole.remove(value)
+        second = rollups.QuantileSketch()
+        for value in self.values[:2500]:
+            second.add(value)
+        self.assertEqual(whole.buckets, second.buckets)
+        self.assertIsNone(rollups.QuantileSketch().quantile(0.5))
+
+
+REPLICA = 'replica'
+
+
+class ReadYourWritesTests(TransactionTestCase):
+    """
+    A replica copied before the client registered, so it lags by everything
+    the client does. The primary's default connection is not wrapped in a
+    transaction here, which would keep every read on the primary.
+    """
+
+    def setUp(self):
+        connections.databases[REPLICA] = {**connection.settings_dict, 'NAME': 'file:replica?mode=memory&cache=shared'}
+        replicate(REPLICA)
+        settings = override_settings(READ_REPLICAS={'ALIASES': [REPLICA], 'MAX_LAG': 60, 'LAG_CHECK_INTERVAL': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        auth_cache.clear()
+
+    def tearDown(self):
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+
+    def replica_queries(self, request):
+        connections[REPLICA].queries_log.clear()
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = request()
+        return response, len(queries)
+
+    def test_register_then_read_with_new_token(self):
+        client = APIClient()
+        response = client.post('/api/register/', {
+            'username': 'farmer', 'email': 'farmer@example.com', 'password': 'password', 'name': 'Farmer',
+            'is_industry': False, 'phone': '', 'location': 'Pune'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        token = client.post('/api/token/', {'username': 'farmer', 'password': 'password'}).data['token']
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        # Pinned to the primary by the registration.
+        response, replica_queries = self.replica_queries(lambda: client.get('/api/profile/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'farmer')
+        self.assertEqual(replica_queries, 0)
+
+        # Once the pin expires the token is still checked on the primary, and the rest is read from the replica.
+        cache.clear()
+        auth_cache.clear()
+        response, replica_queries = self.replica_queries(lambda: client.get('/api/orders/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica_queries, 0)
+
+    def test_read_with_changed_password(self):
+        user = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        response = client.put('/api/users/change-password', {
+            'old_password': 'password', 'new_password1': 'n3w-passw0rd!', 'new_password2': 'n3w-passw0rd!'})
+        self.assertEqual(response.status_code, 200)
+
+        # Another client, with the new password: the user's own pin keeps it on the primary.
+        credentials = base64.b64encode(b'farmer:n3w-passw0rd!').decode()
+        client = APIClient(REMOTE_ADDR='10.0.0.2')
+        client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+        response, replica_queries = self.replica_queries(lambda: client.get('/api/orders/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica_queries, 0)
+
+
+class MachineSearchTests(TestCase):
+    def test_old_relevant_match_ranks_first_among_many(self):
+        owner = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        relevant = Machine.objects.create(owner=owner, name='Tractor', description='tractor tractor tractor')
+        Machine.objects.bulk_create(
+            Machine(owner=owner, name=f'Machine {i}', description=f'a tractor with {i} hours and a long description')
+            for i in range(1500))
+
+        self.assertEqual(search_machines(Machine.objects.all(), 'tractor').count(), 1501)
+        client = APIClient()
+        client.force_authenticate(farmer)
+        response = client.get('/api/machines/', {'q': 'tractor'})
+        self.assertEqual(response.data['results'][0]['id'], relevant.pk)
+
+        # Most matches share one rank, so pages are cut by (rank, id).
+        pages = []
+        path = '/api/machines/?q=tractor&page_size=200'
+        while path:
+            response = client.get(path)
+            pages.append([machine['id'] for machine in response.data['results']])
+            path = response.data['next']
+        self.assertEqual(len({pk for page in pages for pk in page}), 1501)
+        previous = client.get(response.data['previous'])
+        self.assertEqual([machine['id'] for machine in previous.data['results']], pages[-2])
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """The async views of the ASGI entry point answer as the sync views of WSGI do."""
+
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.lessor = User.objects.create_user('lessor', 'lessor@example.com', 'password')
+        self.machine = Machine.objects.create(owner=self.industry, name='Tractor', description='')
+        Residue.objects.create(owner=self.farmer, price=100)
+        for peer, source in [(self.industry, Connection.ORDER), (self.lessor, Connection.RENT_ORDER)]:
+            Connection.objects.create(user=self.farmer, peer=peer, source=source, role=Connection.BUYER, count=1)
+            Connection.objects.create(user=peer, peer=self.farmer, source=source, role=Connection.SELLER, count=1)
+        auth_cache.clear()
+
+    def get(self, path, user, **extra):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        return client.get(path, **extra)
+
+    def async_get(self, path, user=None, **headers):
+        """GET from the ASGI URLs. AsyncClient sends its extra arguments as raw header names."""
+        if user is not None:
+            headers['authorization'] = f'Token {user.auth_token.key}'
+
+        async def get():
+            return await AsyncClient().get(path, **headers)
+
+        with override_settings(ROOT_URLCONF='project.asgi_urls'):
+            return async_to_sync(get)()
+
+    def test_responses_match_the_sync_views(self):
+        for path, user in [('/api/machines/', self.farmer), (f'/api/machines/{self.machine.pk}', self.farmer),
+                           ('/api/residues/', self.industry), ('/api/connections/', self.farmer),
+                           ('/api/connections/', self.industry)]:
+            with self.subTest(path=path, user=user.username):
+                self.assertEqual(resolve(path, 'project.asgi_urls').func.view_class.__module__, 'app.async_views')
+                expected = self.get(path, user)
+                response = self.async_get(path, user)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_connections_gather_their_sources(self):
+        response = self.async_get('/api/connections/', self.farmer)
+        self.assertEqual(sorted(user['username'] for user in response.json()), ['industry', 'lessor'])
+
+    def test_conditional_get_and_authentication(self):
+        etag = self.async_get('/api/residues/', self.industry)['ETag']
+        self.assertEqual(self.async_get('/api/residues/', self.industry, **{'if-none-match': etag}).status_code, 304)
+        self.assertEqual(self.async_get('/api/connections/').status_code, 401)
+
+
+def index_name(model, fields):
+    return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+
+class DashboardCounterTests(TestCase):
+    def setUp(self):
+        self.industry = User.objects.create_user('industry', 'industry@example.com', 'password', is_industry=True)
+        self.farmer = User.objects.create_user('farmer', 'farmer@example.com', 'password')
+        self.machine = Machine.objects.create(owner=self.industry, name='Tractor', description='', quantity=10,
+                                              sell_price=1000, discount=10)
+        self.seller = APIClient()
+        self.seller.force_authenticate(self.industry)
+        self.buyer = APIClient()
+        self.buyer.force_authenticate(self.farmer)
+
+    def orders(self):
+        response = self.seller.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reconcile(), [])
+        return {status: (totals['count'], totals['units'], totals['revenue'])
+                for status, totals in response.data[Connection.ORDER].items()}, response.data['stock']
+
+    def order(self, quantity):
+        response = self.buyer.post('/api/orders/', {'machine': self.machine.pk, 'quantity': quantity}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def set_status(self, order_id, status):
+        response = self.seller.put(f'/api/orders/{order_id}', {'status': status}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_counters_follow_status_changes_deletes_and_repricing(self):
+        first, second = self.order(2), self.order(1)
+        self.assertEqual(self.orders(), ({Order.PENDING: (2, 3, 2700.0), Order.ACCEPTED: (0, 0, 0),
+                                          Order.REJECTED: (0, 0, 0)}, 7))
+
+        self.set_status(first, Order.ACCEPTED)
+        self.set_status(second, Order.REJECTED)
+        self.assertEqual(self.orders(), ({Order.PENDING: (0, 0, 0), Order.ACCEPTED: (1, 2, 1800.0),
+                                          Order.REJECTED: (1, 1, 900.0)}, 8))
+
+        self.machine.refresh_from_db()
+        self.machine.discount = 0
+        self.machine.save()
+        Order.objects.get(pk=second).delete()
+        self.assertEqual(self.orders(), ({Order.PENDING: (0, 0, 0), Order.ACCEPTED: (1, 2, 2000.0),
+                                          Order.REJECTED: (0, 0, 0)}, 8))
+
+    def test_checked_out_carts_are_counted(self):
+        CartItem.objects.create(cart=self.farmer.cart, machine=self.machine, quantity=4)
+        self.assertEqual(self.buyer.post('/api/cart/checkout').status_code, 201)
+        counters, stock = self.orders()
+        self.assertEqual((counters[Order.PENDING], stock), ((1, 4, 3600.0), 6))
+
+
+# The seed creates 220 users, which the default hasher would take most of the run for.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryPlanTests(TestCase):
+    """
+    The hot list queries search the composite and partial indexes rather
+    than scanning their tables. check_query_plans runs the same check, with
+    timings, on a large dataset.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.industry, cls.farmer = CheckQueryPlans().seed(1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_their_indexes(self):
+        endpoints = [
+            (MachinesView, self.farmer, {'for_sale': 'true'}, 'app_machine_for_sale_idx'),
+            (MachinesView, self.farmer, {'for_rent': 'true'}, 'app_machine_for_rent_idx'),
+            (OrdersView, self.industry, {'status': Order.PENDING}, index_name(Order, ['machine', 'status'])),
+            (OrdersView, self.farmer, {'status': Order.ACCEPTED}, index_name(Order, ['customer', 'status'])),
+            (RentOrdersView, self.industry, {'status': RentOrder.PENDING}, index_name(RentOrder, ['machine', 'status'])),
+            (ResiduesView, self.industry, {'type_of_residue': Residue.RICE_HUSK}, 'app_residue_unsold_type_idx'),
+            (ResidueOrdersView, self.farmer, {'status': ResidueOrder.PENDING},
+             index_name(ResidueOrder, ['residue', 'status'])),
+            (CartView, self.farmer, {}, index_name(CartItem, ['cart', 'machine'])),
+        ]
+        partial = partial_indexes()
+        for view_class, user, data, index in endpoints:
+            with self.subTest(view=view_class.__name__, user=user.username, data=data):
+                plans = query_plans(lambda: call_view(view_class.as_view(), user=user, data=data))
+                plan = [line for _, lines in plans for line in lines]
+                self.assertTrue(any(re.search(rf'USING (COVERING )?INDEX {index}\b', line) for line in plan), plan)
+                self.assertEqual(full_scans(plan, partial), [])
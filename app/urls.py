@@ -1,14 +1,20 @@
-from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path
 from rest_framework.authtoken import views as auth_views
 
+from app.media import media_urlpatterns
 from app.views import (CartCheckoutView, CartItemView, CartView,
-                       ChangePasswordView, Connections, MachineDetailView,
-                       MachinesView, OrderDetailView, OrdersView, ProfileView,
-                       RentOrderDetailView, RentOrdersView, ResidueDetailView,
-                       ResidueOrderDetailView, ResidueOrdersView, ResiduesView,
-                       ResidueTypeView, UsersView, registerUser)
+                       ChangePasswordView, Connections, DashboardView,
+                       MachineAvailabilityView, MachineDetailView,
+                       MachineImportView, MachinesAvailabilityView,
+                       MachinesView, OrderDetailView, OrdersExportView,
+                       OrdersView, ProfileView,
+                       RentOrderDetailView, RentOrdersExportView,
+                       RentOrdersView, ResidueBidDetailView,
+                       ResidueBidsView, ResidueBookView, ResidueDetailView,
+                       ResiduePricesView,
+                       ResidueOrderDetailView, ResidueOrdersExportView,
+                       ResidueOrdersView, ResiduesView, ResidueTypeView,
+                       UsersView, registerUser)
 
 urlpatterns = [
     path('register/', registerUser.as_view(), name='register'),
@@ -17,20 +23,32 @@ urlpatterns = [
     path('profile/', ProfileView.as_view(), name='profile'),
     path('machines/', MachinesView.as_view(), name='machines'),
     path('machines/<int:pk>', MachineDetailView.as_view(), name='machine'),
+    path('machines/import', MachineImportView.as_view(), name='machine-import'),
+    path('machines/availability', MachinesAvailabilityView.as_view(), name='machines-availability'),
+    path('machines/<int:pk>/availability', MachineAvailabilityView.as_view(), name='machine-availability'),
     path('residues/', ResiduesView.as_view(), name='residues'),
     path('residues/type', ResidueTypeView.as_view(), name='residue-type'),
+    path('residues/book', ResidueBookView.as_view(), name='residue-book'),
+    path('residues/prices', ResiduePricesView.as_view(), name='residue-prices'),
+    path('residue-bids/', ResidueBidsView.as_view(), name='residue-bids'),
+    path('residue-bids/<int:pk>', ResidueBidDetailView.as_view(), name='residue-bid'),
     path('residues/<int:pk>', ResidueDetailView.as_view(), name='residue'),
     path('cart/', CartView.as_view(), name='cart'),
     path('cart-items/<int:pk>', CartItemView.as_view(), name='cart-items'),
     path('cart/checkout', CartCheckoutView.as_view(), name='cart-checkout'),
     path('orders/', OrdersView.as_view(), name='orders'),
     path('orders/<int:pk>', OrderDetailView.as_view(), name='order-detail'),
+    path('orders/export.<str:file_format>', OrdersExportView.as_view(), name='orders-export'),
     path('rent-orders/', RentOrdersView.as_view(), name='rent-orders'),
     path('rent-orders/<int:pk>', RentOrderDetailView.as_view(), name='rent-order'),
+    path('rent-orders/export.<str:file_format>', RentOrdersExportView.as_view(), name='rent-orders-export'),
     path('residue-orders/', ResidueOrdersView.as_view(), name='residue-orders'),
     path('residue-orders/<int:pk>', ResidueOrderDetailView.as_view(), name='residue-order'),
+    path('residue-orders/export.<str:file_format>', ResidueOrdersExportView.as_view(),
+         name='residue-orders-export'),
     path('connections/', Connections.as_view(), name='connections'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+] + media_urlpatterns()
 
 urlpatterns += [
     path('token/', auth_views.obtain_auth_token)
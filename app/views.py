@@ -1,26 +1,109 @@
+import datetime
+import zipfile
+
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, status
 from rest_framework.generics import UpdateAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from app.models import (CartItem, Machine, Order, RentOrder, Residue,
-                        ResidueOrder, User)
-from app.permissions import IsFarmer
-from app.serializers import (CartItemCreateSerializer,
+                        ResidueBid, ResidueOrder, User)
+from app.availability import (MAX_WINDOW_DAYS, bulk_booked, load_schedule,
+                              reserve_rental, sync_rental)
+from app.cache import get_or_build_catalog
+from app.catalog_import import FORMATS as IMPORT_FORMATS
+from app.catalog_import import CatalogImport, detect_format
+from app.conditional import ConditionalGetMixin, etag_matches, not_modified
+from app.dashboard import count_new_orders, dashboard
+from app.export import CUSTOMER_COLUMNS, ExportMixin
+from app.geo import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, nearest_first
+from app.matching import book_depth
+from app.pagination import NearestPagination, SearchRankPagination
+from app.permissions import IsFarmer, IsIndustry
+from app.replicas import primary
+from app.rollups import ALL_REGIONS
+from app.rollups import MAX_DAYS as MAX_ROLLUP_DAYS
+from app.rollups import summarize
+from app.search import search_machines
+from app.sqlite import retry_when_locked
+from app.serializers import (CartItemBatchSerializer,
                              CartItemDetailSerializer,
                              CartItemUpdateSerializer,
                              ChangePasswordSerializer, MachineSerializer,
                              OrderCustomerSerializer, OrderDetailSerializer,
                              OrderSerializer, RentMachineSerializer,
-                             RentOrderSerializer, ResidueCreateSerializer,
+                             RentOrderSerializer, ResidueBidSerializer,
+                             ResidueCreateSerializer,
                              ResidueOrderCreateSerializer,
                              ResidueOrderSerializer, ResidueSerializer,
                              UserSerializer, UserUpdateSerializer)
 
 
+def reserve_stock(machine_id, quantity=1):
+    if not Machine.reserve(machine_id, quantity):
+        raise ValidationError({'machine': ['Not enough stock left for this machine.']})
+
+
+def sync_stock(order, new_status, quantity=1):
+    """Release stock when an order gets rejected and take it again when it is un-rejected."""
+    if new_status == order.REJECTED and order.status != order.REJECTED:
+        Machine.release(order.machine_id, quantity)
+    elif order.status == order.REJECTED and new_status != order.REJECTED:
+        reserve_stock(order.machine_id, quantity)
+
+
+def get_near_point(request):
+    """Parse `?near=<latitude>,<longitude>&radius_km=<km>` into (point, radius_km), or None."""
+    near = request.query_params.get('near')
+    if not near:
+        return None
+
+    try:
+        latitude, longitude = (float(value) for value in near.split(','))
+        radius_km = float(request.query_params.get('radius_km', DEFAULT_RADIUS_KM))
+    except ValueError:
+        raise ValidationError({'near': ['expected near=<latitude>,<longitude> and a numeric radius_km']})
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': ['latitude or longitude out of range']})
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': ['radius_km should be between 0 and {}'.format(MAX_RADIUS_KM)]})
+    return (latitude, longitude), radius_km
+
+
+def get_date_window(request):
+    """
+    Parse `?start=<date>&end=<date>&days=<n>` into (start, end, days). The
+    window starts today by default and is `days` long unless `end` is given;
+    `days` defaults to the window length.
+    """
+    params = request.query_params
+    try:
+        start_date = parse_date(params.get('start', '')) or timezone.localdate()
+        days = int(params['days']) if 'days' in params else None
+        end_date = parse_date(params.get('end', '')) or start_date + datetime.timedelta(days=days or 1)
+    except ValueError:
+        raise ValidationError({'start': ['expected start and end as YYYY-MM-DD dates and a whole number of days']})
+
+    if not 0 < (end_date - start_date).days <= MAX_WINDOW_DAYS:
+        raise ValidationError({'end': [
+            'end should be after start and at most {} days from it'.format(MAX_WINDOW_DAYS)]})
+    if days is None:
+        days = (end_date - start_date).days
+    if not 0 < days <= MAX_WINDOW_DAYS:
+        raise ValidationError({'days': ['days should be between 1 and {}'.format(MAX_WINDOW_DAYS)]})
+    return start_date, end_date, days
+
+
 class registerUser(APIView):
     permission_classes = [AllowAny]
 
@@ -37,7 +120,7 @@ class registerUser(APIView):
         return Response(serializer.data)
 
 
-class UsersView(generics.RetrieveAPIView):
+class UsersView(ConditionalGetMixin, generics.RetrieveAPIView):
     def get_permissions(self):
         method = self.request.method
         if method == 'GET':
@@ -81,8 +164,10 @@ class ChangePasswordView(UpdateAPIView):
         return Response(status=status.HTTP_200_OK)
 
 
-class MachinesView(generics.ListCreateAPIView):
+class MachinesView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [AllowAny]
+    # Authentication, the page, and for ?near= the owners' locations
+    query_budgets = {'GET': 3}
     serializer_class = MachineSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['for_rent', 'for_sale', 'owner__location', 'discount', 'name']
@@ -103,7 +188,42 @@ class MachinesView(generics.ListCreateAPIView):
                 return MachineSerializer
             return RentMachineSerializer
 
+    @property
+    def pagination_class(self):
+        if self.request.query_params.get('near'):
+            return NearestPagination
+        if self.request.query_params.get('q'):
+            return SearchRankPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+
+        def build():
+            # From the primary: the page is cached under the catalog version
+            # the latest write set, so it must already include that write.
+            with primary():
+                response = self.render_list(*self.load_list())
+            return {'data': response.data, 'etag': response['ETag']}
+
+        page = get_or_build_catalog(request, build)
+        if etag_matches(request, page['etag']):
+            return not_modified(page['etag'])
+        return Response(page['data'], headers={'ETag': page['etag']})
+
     def get_queryset(self):
+        machines = self.get_base_queryset()
+        query = self.request.query_params.get('q')
+        if query:
+            machines = search_machines(machines, query)
+
+        near = get_near_point(self.request)
+        if near:
+            machines = nearest_first(machines, *near)
+        return machines
+
+    def get_base_queryset(self):
         user = self.request.user
         if user.is_anonymous:
             return Machine.objects.filter(for_sale=True)
@@ -123,7 +243,90 @@ class MachinesView(generics.ListCreateAPIView):
             serializer.save(owner=self.request.user, for_sale=False, for_rent=True)
 
 
-class MachineDetailView(generics.RetrieveUpdateDestroyAPIView):
+class MachineImportView(APIView):
+    """
+    Bulk-create machines from a CSV or NDJSON `file`, with their images in an
+    optional `images` zip archive. Invalid rows are reported, not fatal.
+    """
+    permission_classes = [IsAuthenticated, IsIndustry]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'format': ['expected one of {}'.format(', '.join(IMPORT_FORMATS))]})
+
+        images = request.FILES.get('images')
+        try:
+            catalog_import = CatalogImport(request.user, images=images)
+        except zipfile.BadZipFile:
+            raise ValidationError({'images': ['expected a zip archive']})
+        return Response(catalog_import.run(upload, file_format))
+
+
+class MachineAvailabilityView(APIView):
+    """
+    Booking state of a rental machine for a date window: the most units
+    booked on any day, the periods a unit is free, and the first date from
+    `start` on when a unit is free for `days` days (the window length by
+    default).
+    """
+    permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
+
+    def get(self, request, pk):
+        start_date, end_date, days = get_date_window(request)
+        capacity, version = get_object_or_404(
+            Machine.objects.filter(for_rent=True).values_list('quantity', 'rental_version'), pk=pk)
+        schedule = load_schedule(pk, version)
+
+        booked = schedule.booked(start_date, end_date)
+        next_free = schedule.next_free(start_date, days, capacity)
+        if next_free is not None:
+            next_free = {'start': next_free, 'end': next_free + datetime.timedelta(days=days)}
+        return Response({
+            'machine': pk,
+            'quantity': capacity,
+            'start': start_date,
+            'end': end_date,
+            'booked': booked,
+            'free': booked < capacity,
+            'free_periods': [
+                {'start': start, 'end': end} for start, end in schedule.free_periods(start_date, end_date, capacity)
+            ],
+            'next_free': next_free,
+        })
+
+
+class MachinesAvailabilityView(generics.ListAPIView):
+    """Units booked and free in a date window for every rental machine, a page at a time."""
+    permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
+
+    def get_queryset(self):
+        return Machine.objects.filter(for_rent=True).values('id', 'name', 'quantity')
+
+    def list(self, request, *args, **kwargs):
+        start_date, end_date, _ = get_date_window(request)
+        machines = self.paginate_queryset(self.get_queryset())
+        booked = bulk_booked([machine['id'] for machine in machines], start_date, end_date)
+        return self.get_paginated_response([
+            {
+                'machine': machine['id'],
+                'name': machine['name'],
+                'quantity': machine['quantity'],
+                'booked': booked[machine['id']],
+                'free': max(machine['quantity'] - booked[machine['id']], 0),
+            }
+            for machine in machines
+        ])
+
+
+class MachineDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = MachineSerializer
 
@@ -157,7 +360,8 @@ class MachineDetailView(generics.RetrieveUpdateDestroyAPIView):
         partial = kwargs.pop('partial', False)
         serializer = self.get_serializer(machine, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
@@ -169,8 +373,9 @@ class MachineDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class OrdersView(generics.ListCreateAPIView):
+class OrdersView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
 
     def get_serializer_class(self):
         method = self.request.method
@@ -189,16 +394,16 @@ class OrdersView(generics.ListCreateAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_industry:
-            return Order.objects.filter(machine__owner=user)
+            return Order.objects.filter(machine__owner=user).select_related('customer', 'machine')
 
-        return Order.objects.filter(customer=user)
+        return Order.objects.filter(customer=user).select_related('machine')
 
+    @retry_when_locked
     def perform_create(self, serializer):
         machine = serializer.validated_data['machine']
-        machine.quantity -= 1
-        machine.save()
-
-        serializer.save(customer=self.request.user)
+        with transaction.atomic():
+            reserve_stock(machine.pk, serializer.validated_data.get('quantity', 1))
+            serializer.save(customer=self.request.user)
 
 
 class OrderDetailView(generics.UpdateAPIView):
@@ -206,9 +411,10 @@ class OrderDetailView(generics.UpdateAPIView):
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
 
+    @retry_when_locked
     def update(self, request, *args, **kwargs):
-        machine = self.get_object().machine
-        if machine.owner != request.user:
+        order = self.get_object()
+        if order.machine.owner != request.user:
             return Response(status=status.HTTP_403_FORBIDDEN)
 
         try:
@@ -216,16 +422,27 @@ class OrderDetailView(generics.UpdateAPIView):
         except KeyError:
             raise ValidationError()
 
-        order = self.get_object()
-        serializer = self.get_serializer(order, data=data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            order = self.get_queryset().select_for_update().get(pk=order.pk)
+            serializer = self.get_serializer(order, data=data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            sync_stock(order, serializer.validated_data['status'], order.quantity)
+            serializer.save()
 
         return Response(serializer.data)
 
 
-class RentOrdersView(generics.ListCreateAPIView):
+class OrdersExportView(ExportMixin, OrdersView):
+    export_filename = 'orders'
+    export_columns = [
+        'id', 'status', 'quantity', 'updated_at', 'machine_id', 'machine__name', 'machine__sell_price',
+        'machine__discount', 'machine__owner_id',
+    ] + CUSTOMER_COLUMNS
+
+
+class RentOrdersView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
     serializer_class = RentOrderSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status']
@@ -234,12 +451,20 @@ class RentOrdersView(generics.ListCreateAPIView):
         user = self.request.user
         return RentOrder.objects.filter(machine__owner=user)
 
+    @retry_when_locked
     def perform_create(self, serializer):
-        machine = serializer.validated_data['machine']
-        machine.quantity -= 1
-        machine.save()
+        data = serializer.validated_data
+        with transaction.atomic():
+            reserve_rental(data['machine'].pk, data['start_date'], data['end_date'])
+            serializer.save(customer=self.request.user)
+
 
-        serializer.save(customer=self.request.user)
+class RentOrdersExportView(ExportMixin, RentOrdersView):
+    export_filename = 'rent-orders'
+    export_columns = [
+        'id', 'status', 'num_of_days', 'start_date', 'end_date', 'updated_at', 'machine_id', 'machine__name', 'machine__rent_price',
+        'machine__discount', 'machine__owner_id',
+    ] + CUSTOMER_COLUMNS
 
 
 class RentOrderDetailView(generics.UpdateAPIView):
@@ -251,6 +476,7 @@ class RentOrderDetailView(generics.UpdateAPIView):
     def get_queryset(self):
         return RentOrder.objects.filter(machine__owner=self.request.user)
 
+    @retry_when_locked
     def update(self, request, *args, **kwargs):
         rent_order = self.get_object()
         if rent_order.machine.owner != request.user:
@@ -261,15 +487,19 @@ class RentOrderDetailView(generics.UpdateAPIView):
         except KeyError:
             raise ValidationError()
 
-        serializer = self.get_serializer(rent_order, data=data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            rent_order = self.get_queryset().select_for_update().get(pk=rent_order.pk)
+            serializer = self.get_serializer(rent_order, data=data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            sync_rental(rent_order, serializer.validated_data['status'])
+            serializer.save()
 
         return Response(serializer.data)
 
 
-class ResiduesView(generics.ListCreateAPIView):
+class ResiduesView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
 
     def get_permissions(self):
         permission_classes = [IsAuthenticated]
@@ -285,14 +515,22 @@ class ResiduesView(generics.ListCreateAPIView):
             return ResidueSerializer
         return ResidueCreateSerializer
 
+    @property
+    def pagination_class(self):
+        if self.request.query_params.get('near'):
+            return NearestPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+
     def get_queryset(self):
         user = self.request.user
-        sold_residues = [order.residue.id for order in ResidueOrder.objects.all() if order.status == ResidueOrder.ACCEPTED]
-        residues = Residue.objects.exclude(pk__in=sold_residues)
+        residues = Residue.objects.filter(is_sold=False).select_related('owner')
+        if not user.is_industry:
+            residues = residues.filter(owner=user)
 
-        if user.is_industry:
-            return residues
-        return residues.filter(owner=user)
+        near = get_near_point(self.request)
+        if near:
+            residues = nearest_first(residues, *near)
+        return residues
 
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['type_of_residue']
@@ -307,9 +545,89 @@ class ResidueTypeView(APIView):
         return Response(types)
 
 
-class ResidueDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ResidueBookView(APIView):
+    """Best bid and ask price levels for a residue type, `?type=<type>&levels=<n>`."""
+    permission_classes = [IsAuthenticated]
+    # The book version, plus lots, bids and declined pairs when the book has to be loaded
+    query_budgets = {'GET': 4}
+
+    def get(self, request):
+        type_of_residue = request.query_params.get('type')
+        if type_of_residue not in dict(Residue.CHOICES):
+            raise ValidationError({'type': ['expected one of {}'.format(', '.join(dict(Residue.CHOICES)))]})
+        try:
+            levels = min(int(request.query_params.get('levels', 10)), 100)
+        except ValueError:
+            raise ValidationError({'levels': ['levels should be a whole number']})
+
+        return Response({'type': type_of_residue, **book_depth(type_of_residue, levels)})
+
+
+class ResiduePricesView(APIView):
+    """
+    Listed and sold price and quantity statistics of a residue type over the
+    last `days` days, `?type=<type>&region=<state>&days=<n>`, read from the
+    daily rollups so the cost does not grow with the trade history.
+    """
     permission_classes = [IsAuthenticated]
-    queryset = Residue.objects.all()
+    query_budgets = {'GET': 1}
+
+    def get(self, request):
+        type_of_residue = request.query_params.get('type')
+        if type_of_residue not in dict(Residue.CHOICES):
+            raise ValidationError({'type': ['expected one of {}'.format(', '.join(dict(Residue.CHOICES)))]})
+        region = request.query_params.get('region') or ALL_REGIONS
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if not 0 < days <= MAX_ROLLUP_DAYS:
+            raise ValidationError({'days': ['days should be between 1 and {}'.format(MAX_ROLLUP_DAYS)]})
+
+        return Response({
+            'type': type_of_residue,
+            'region': region,
+            'days': days,
+            **summarize(type_of_residue, region, days),
+        })
+
+
+class ResidueBidsView(generics.ListCreateAPIView):
+    """Standing bids of the industry user, matched against residue lots as either side changes."""
+    permission_classes = [IsAuthenticated, IsIndustry]
+    query_budgets = {'GET': 1}
+    serializer_class = ResidueBidSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['type_of_residue']
+
+    def get_queryset(self):
+        return ResidueBid.objects.filter(buyer=self.request.user)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        quantity = serializer.validated_data['quantity']
+        location = serializer.validated_data.get('location') or user.location
+        serializer.save(buyer=user, remaining=quantity, location=location)
+
+
+class ResidueBidDetailView(generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated, IsIndustry]
+    serializer_class = ResidueBidSerializer
+
+    def get_queryset(self):
+        return ResidueBid.objects.filter(buyer=self.request.user)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            bid = self.get_queryset().select_for_update().get(pk=serializer.instance.pk)
+            quantity = serializer.validated_data.get('quantity', bid.quantity)
+            # Units already matched stay matched; the bid only grows or shrinks by the difference.
+            serializer.save(remaining=max(bid.remaining + quantity - bid.quantity, 0))
+
+
+class ResidueDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    permission_classes = [IsAuthenticated]
+    queryset = Residue.objects.select_related('owner')
 
     def get_serializer_class(self):
         method = self.request.method
@@ -325,7 +643,8 @@ class ResidueDetailView(generics.RetrieveUpdateDestroyAPIView):
         partial = kwargs.pop('partial', False)
         serializer = self.get_serializer(residue, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data)
 
     def delete(self, request, **kwargs):
@@ -337,8 +656,9 @@ class ResidueDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ResidueOrdersView(generics.ListCreateAPIView):
+class ResidueOrdersView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
 
     def get_serializer_class(self):
         method = self.request.method
@@ -351,10 +671,20 @@ class ResidueOrdersView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return ResidueOrder.objects.filter(residue__owner=user)
+        return ResidueOrder.objects.filter(residue__owner=user).select_related('residue__owner', 'customer')
 
+    @retry_when_locked
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
+        with transaction.atomic():
+            serializer.save(customer=self.request.user)
+
+
+class ResidueOrdersExportView(ExportMixin, ResidueOrdersView):
+    export_filename = 'residue-orders'
+    export_columns = [
+        'id', 'status', 'updated_at', 'residue_id', 'residue__type_of_residue', 'residue__price',
+        'residue__quantity', 'residue__owner_id',
+    ] + CUSTOMER_COLUMNS
 
 
 class ResidueOrderDetailView(generics.UpdateAPIView):
@@ -365,6 +695,7 @@ class ResidueOrderDetailView(generics.UpdateAPIView):
         user = self.request.user
         return ResidueOrder.objects.filter(residue__owner=user)
 
+    @retry_when_locked
     def update(self, request, *args, **kwargs):
         residue_order = self.get_object()
         if residue_order.residue.owner != request.user:
@@ -377,12 +708,28 @@ class ResidueOrderDetailView(generics.UpdateAPIView):
 
         serializer = self.get_serializer(residue_order, data=data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data)
 
 
+class DashboardView(APIView):
+    """
+    Order counts, units and revenue by status for orders and rent orders of
+    the user's machines and the user's residue orders, plus stock left,
+    read from OrderCounter rather than from the orders.
+    """
+    permission_classes = [IsAuthenticated, IsIndustry]
+    # Authentication, the counters and the stock sum
+    query_budgets = {'GET': 3}
+
+    def get(self, request):
+        return Response(dashboard(request.user))
+
+
 class Connections(APIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2}
 
     def get(self, request, *args, **kwargs):
         user = request.user
@@ -391,34 +738,44 @@ class Connections(APIView):
         return Response(serializer.data)
 
 
-class CartView(generics.ListCreateAPIView):
+class CartView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    query_budgets = {'GET': 2, 'POST': 6}
     serializer_class = CartItemDetailSerializer
 
     def get_queryset(self):
         user = self.request.user
-        return CartItem.objects.filter(cart__user=user)
+        return CartItem.objects.filter(cart__user=user).select_related('machine')
 
     def post(self, request, *args, **kwargs):
         cart = self.request.user.cart
-        items = request.data['items']
+        serializer = CartItemBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        for item in items:
-            existing_item = CartItem.objects.filter(machine__id=item['machine'])
-            if len(existing_item) > 0:
-                existing_item[0].quantity += item['quantity']
-                existing_item[0].save()
-                continue
-
-            item['cart'] = cart.id
-            serializer = CartItemCreateSerializer(data=item)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+        quantities = {}
+        for item in serializer.validated_data['items']:
+            quantities[item['machine']] = quantities.get(item['machine'], 0) + item['quantity']
+
+        machine_ids = set(Machine.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+        missing = sorted(set(quantities) - machine_ids)
+        if missing:
+            raise ValidationError({'machine': ['invalid machine ids: {}'.format(missing)]})
+
+        now = timezone.now()
+        existing_items = list(CartItem.objects.filter(cart=cart, machine_id__in=machine_ids))
+        for item in existing_items:
+            item.quantity += quantities.pop(item.machine_id, 0)
+            item.updated_at = now
+
+        with transaction.atomic():
+            CartItem.objects.bulk_update(existing_items, ['quantity', 'updated_at'])
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, machine_id=machine_id, quantity=quantity) for machine_id, quantity in quantities.items())
 
         return Response(status=status.HTTP_201_CREATED)
 
 
-class CartItemView(generics.RetrieveUpdateDestroyAPIView):
+class CartItemView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CartItemDetailSerializer
 
@@ -447,11 +804,43 @@ class CartItemView(generics.RetrieveUpdateDestroyAPIView):
 
 class CartCheckoutView(APIView):
     permission_classes = [IsAuthenticated]
+    # Authentication, the cart, the stock UPDATE, the order INSERT, the
+    # counter UPDATE, SELECT and INSERT, and the cart DELETE
+    query_budgets = {'POST': 8}
 
-    def get(self, request, *args, **kwargs):
-        cart = request.user.cart
-        for item in cart.get_items():
-            Order.objects.create(customer=request.user, machine=item.machine, quantity=item.quantity)
-            item.delete()
+    @retry_when_locked
+    def post(self, request, *args, **kwargs):
+        items = list(CartItem.objects.filter(cart__user=request.user).select_related('machine'))
+        if not items:
+            return Response({'items': ['cart is empty']}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(status=status.HTTP_200_OK)
+        quantities = {}
+        for item in items:
+            quantities[item.machine_id] = quantities.get(item.machine_id, 0) + item.quantity
+
+        errors = {item.id: ['only {} left in stock'.format(item.machine.quantity)]
+                  for item in items if quantities[item.machine_id] > item.machine.quantity}
+        if errors:
+            return Response({'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if not Machine.reserve_many(quantities):
+                raise ValidationError({'items': ['stock changed during checkout, please try again']})
+
+            orders = Order.objects.bulk_create(
+                [Order(customer=request.user, machine=item.machine, quantity=item.quantity) for item in items])
+            count_new_orders(orders)
+            CartItem.objects.filter(pk__in=[item.id for item in items]).delete()
+
+        summary = [{
+            'machine': item.machine_id,
+            'name': item.machine.name,
+            'quantity': item.quantity,
+            'price': item.machine.get_sell_price(),
+            'total': item.machine.get_sell_price() * item.quantity,
+        } for item in items]
+        return Response({
+            'items': summary,
+            'total_quantity': sum(line['quantity'] for line in summary),
+            'total_price': sum(line['total'] for line in summary),
+        }, status=status.HTTP_201_CREATED)
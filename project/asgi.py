@@ -2,15 +2,65 @@
 ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed through ``project.asgi_urls``, which serves the
+read-heavy endpoints with async views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
+
+class StreamingASGIHandler(ASGIHandler):
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Django 3.2 iterates streaming responses on the event loop, where
+        # exports cannot query the database and file reads block. Every part
+        # is produced in one dedicated thread instead, which also closes the
+        # response so its database connection is released there.
+        headers = [(header.encode('ascii'), value.encode('latin1')) for header, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                    for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-stream') as executor:
+            try:
+                parts = iter(response)
+                while True:
+                    part = await loop.run_in_executor(executor, next, parts, None)
+                    if part is None:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body'})
+            finally:
+                await loop.run_in_executor(executor, response.close)
+
+
+class AsyncViewsASGIHandler(StreamingASGIHandler):
+    urlconf = 'project.asgi_urls'
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = self.urlconf
+        return request, error_response
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return AsyncViewsASGIHandler()
+
+
 application = get_asgi_application()
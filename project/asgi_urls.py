@@ -0,0 +1,11 @@
+"""
+URL configuration of the ASGI entry point: the project URLs with the
+read-heavy endpoints of app.async_urls in front.
+"""
+from django.urls import include, path
+
+from project.urls import urlpatterns as project_urlpatterns
+
+urlpatterns = [
+    path('api/', include('app.async_urls')),
+] + project_urlpatterns
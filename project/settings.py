@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.QueryInstrumentationMiddleware',
+    'app.middleware.ReadReplicaMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,9 +86,54 @@ WSGI_APPLICATION = 'project.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 with the SQLITE settings below
+        'ENGINE': 'app.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Seconds a connection is kept across requests instead of reopened
+        'CONN_MAX_AGE': 600,
+    },
+    # Read replicas are copies of 'default' listed in READ_REPLICAS, e.g. an
+    # SQLite file kept in sync by `manage.py replicate_sqlite replica`:
+    # 'replica': {
+    #     'ENGINE': 'app.sqlite',
+    #     'NAME': BASE_DIR / 'db-replica.sqlite3',
+    #     'CONN_MAX_AGE': 600,
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+# Reads of GET requests go to the replicas; writes, and reads after a write,
+# go to 'default'
+DATABASE_ROUTERS = ['app.replicas.ReadReplicaRouter']
+
+READ_REPLICAS = {
+    # Aliases in DATABASES holding copies of 'default'
+    'ALIASES': [],
+    # Seconds a replica may trail the primary before reads skip it. A client
+    # that wrote reads from the primary for MAX_LAG + LAG_CHECK_INTERVAL.
+    'MAX_LAG': 5,
+    # Seconds between checks of a replica's lag, per process
+    'LAG_CHECK_INTERVAL': 1,
+}
+
+SQLITE = {
+    # Write-ahead log: readers do not block the writer or each other
+    'JOURNAL_MODE': 'wal',
+    # Sync at checkpoints only. With WAL a power loss can drop the last
+    # commits but does not corrupt the database.
+    'SYNCHRONOUS': 'normal',
+    # Milliseconds a statement waits for a lock before "database is locked"
+    'BUSY_TIMEOUT': 5000,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    # Page cache per connection, in KiB when negative
+    'CACHE_SIZE': -64 * 1024,
+    'TEMP_STORE': 'memory',
+    # BEGIN IMMEDIATE, so transactions wait for the write lock up front
+    'IMMEDIATE_TRANSACTIONS': True,
+    # Extra attempts of write requests that still find the database locked,
+    # after random pauses doubling from RETRY_BACKOFF seconds
+    'RETRIES': 3,
+    'RETRY_BACKOFF': 0.05,
 }
 
 
@@ -134,11 +182,92 @@ MEDIA_URL = '/media/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+MEDIA_SERVING = {
+    # 'django' streams files from the worker with Range support; 'x-sendfile'
+    # (Apache, lighttpd) and 'x-accel-redirect' (nginx) hand the transfer to
+    # the front-end server.
+    'MODE': 'django',
+    # nginx internal location aliased to MEDIA_ROOT, used by 'x-accel-redirect'
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+    # Cache lifetime of content-hashed files, which never change under a URL
+    'IMMUTABLE_MAX_AGE': 60 * 60 * 24 * 365,
+    'MAX_AGE': 60 * 60,
+}
+
+# Resized copies of uploaded machine images, generated off the request path
+IMAGE_VARIANTS = {
+    'WIDTHS': [320, 640, 1280],
+    'QUALITY': 80,
+    # Size of the worker thread pool; 0 generates variants synchronously after commit
+    'WORKERS': 2,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'app.authentication.CachedBasicAuthentication',
+        'app.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.KeysetPagination',
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Per-process cache of verified tokens and Basic credentials. Saving or
+# deleting a user or deleting a token invalidates it in the current process;
+# other processes pick the change up after TTL seconds.
+AUTH_CACHE = {
+    'TTL': 60,
+    'MAX_SIZE': 10000,
+}
+
+# Per-process cache of machine rental schedules, checked against
+# Machine.rental_version so it is never stale
+RENTAL_AVAILABILITY = {
+    'MAX_CACHED_SCHEDULES': 1000,
+}
+
+QUERY_INSTRUMENTATION = {
+    'ENABLED': True,
+    # Fraction of requests that get instrumented
+    'SAMPLE_RATE': 1.0,
+    # Raise QueryBudgetExceeded when a view runs more queries than its query_budgets
+    # allow. Always on under the test runner so a view outgrowing its budget fails
+    # the suite.
+    'ENFORCE_BUDGETS': 'test' in sys.argv[1:2],
+}
+
+# Anonymous machine catalog responses. Use a shared cache backend (Redis,
+# Memcached) in production so invalidation and single-flight rebuilds span
+# every worker process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CATALOG_CACHE = {
+    # Seconds a cached page is served without rebuilding
+    'TIMEOUT': 300,
+    # Seconds a stale page may still be served while another request rebuilds it
+    'STALE_TIMEOUT': 3600,
+    # Seconds before an abandoned rebuild lock expires
+    'LOCK_TIMEOUT': 10,
+    # Seconds a request waits for a concurrent rebuild when nothing is cached yet
+    'WAIT_TIMEOUT': 2,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'app.queries': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}